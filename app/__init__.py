@@ -6,39 +6,82 @@ import os
 db = SQLAlchemy()
 login_manager = LoginManager()
 
-def create_app():
-    app = Flask(__name__)
+def create_app(config=None, instance_path=None):
+    app = Flask(__name__, instance_path=instance_path)
     
     # Configuration
-    app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///spequip.db'
+    from app.database import load_database_config, engine_options, configure_engine
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+    load_database_config(app.config)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PROFILER_ENABLED'] = os.environ.get('SPEQUIP_PROFILER') == '1'
+    # Reverse proxies in front of the app whose X-Forwarded-* headers are trusted
+    app.config['PROXY_FIX_X_FOR'] = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    app.config['PROXY_FIX_X_PROTO'] = int(os.environ.get('PROXY_FIX_X_PROTO', 0))
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO']:
+        # request.remote_addr (the login throttle's key) becomes the client's address
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=app.config['PROXY_FIX_X_PROTO'])
     
     # Initialize extensions
+    from app.search import product_search
+    from app.profiler import profiler
+    from app.cache import cart_counts, fragment_cache, user_cache
+    from app.images import product_images
+    from app.assets import assets
+    from app.passwords import passwords, login_throttle
+    from app.facets import catalog_facets
+    from app.jobs import jobs
+    from app.compression import compression
     db.init_app(app)
+    configure_engine(app)
+    product_search.init_app(app)
+    profiler.init_app(app)
+    cart_counts.init_app(app)
+    fragment_cache.init_app(app)
+    user_cache.init_app(app)
+    product_images.init_app(app)
+    assets.init_app(app)
+    passwords.init_app(app)
+    login_throttle.init_app(app)
+    catalog_facets.init_app(app)
+    jobs.init_app(app)
+    compression.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
     login_manager.login_message = 'Please log in to access this page.'
     
-    # User loader for Flask-Login
-    from app.models import User, CartItem
-    
+    # User loader for Flask-Login (served from the user cache)
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.load(int(user_id))
     
-    # Context processor for cart count
+    # Context processor for cart count (served from the cart count cache)
     @app.context_processor
     def inject_cart_count():
         from flask_login import current_user
         if current_user.is_authenticated:
-            cart_count = CartItem.query.filter_by(user_id=current_user.id).count()
+            cart_count = cart_counts.get(current_user.id)
         else:
             cart_count = 0
         return dict(cart_count=cart_count)
     
+    # Links between keyset-paginated pages
+    from app.pagination import page_url
+    app.add_template_global(page_url)
+    
     # Register blueprints
     from app.routes import main
+    from app.api import cart_api
     app.register_blueprint(main)
+    app.register_blueprint(cart_api)
+    
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
     
     return app
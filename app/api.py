@@ -0,0 +1,203 @@
+from flask import Blueprint, jsonify, request
+from flask_login import current_user
+from app import db
+from app.models import Product, CartItem
+from app.cache import cart_counts
+
+cart_api = Blueprint('cart_api', __name__, url_prefix='/api/cart')
+
+TAX_RATE = 0.08  # Same rate the cart page shows
+
+
+class CartAPIError(Exception):
+    def __init__(self, message, status=400, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.errors = errors
+
+
+@cart_api.errorhandler(CartAPIError)
+def handle_cart_api_error(error):
+    body = {'success': False, 'error': error.message}
+    if error.errors:
+        body['errors'] = error.errors
+    return jsonify(body), error.status
+
+
+@cart_api.before_request
+def require_login():
+    # JSON clients get a 401 instead of the login page redirect
+    if not current_user.is_authenticated:
+        return jsonify({'success': False, 'error': 'Login required'}), 401
+
+
+def _payload():
+    """Request fields from a JSON object body or a form post."""
+    if not request.is_json:
+        return request.form
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise CartAPIError('Expected a JSON object')
+    return data
+
+
+def _whole_number(value, message):
+    """An int from a JSON number or form string; 1.7 or true is refused, not truncated."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise CartAPIError(message)
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise CartAPIError(message)
+
+
+def _quantity(value, minimum=1):
+    quantity = _whole_number(value, 'Quantity must be a whole number')
+    if quantity < minimum:
+        raise CartAPIError(f'Quantity must be at least {minimum}')
+    return quantity
+
+
+def _line(item):
+    product = item.product
+    return {
+        'id': item.id,
+        'product_id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'quantity': item.quantity,
+        'stock_quantity': product.stock_quantity,
+        'line_total': round(product.price * item.quantity, 2),
+    }
+
+
+def _totals(user_id):
+    """Cart totals in one aggregate query; also refreshes the cached badge count."""
+    count, units, subtotal = db.session.execute(
+        db.select(db.func.count(CartItem.id),
+                  db.func.coalesce(db.func.sum(CartItem.quantity), 0),
+                  db.func.coalesce(db.func.sum(CartItem.quantity * Product.price), 0))
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.user_id == user_id)
+    ).one()
+    cart_counts.set(user_id, count)
+    subtotal = round(subtotal, 2)
+    tax = round(subtotal * TAX_RATE, 2)
+    return {'count': count, 'units': units, 'subtotal': subtotal,
+            'tax': tax, 'total': round(subtotal + tax, 2)}
+
+
+def _cart_item(id):
+    item = CartItem.query.options(db.joinedload(CartItem.product)) \
+        .filter_by(id=id, user_id=current_user.id).first()
+    if item is None:
+        raise CartAPIError('Cart item not found', status=404)
+    return item
+
+
+def _check_stock(product, quantity):
+    if (product.stock_quantity or 0) < quantity:
+        raise CartAPIError(f'Only {product.stock_quantity or 0} of {product.name} in stock')
+
+
+@cart_api.route('', methods=['GET'])
+def summary():
+    items = CartItem.query.options(db.joinedload(CartItem.product)) \
+        .filter_by(user_id=current_user.id).order_by(CartItem.id).all()
+    return jsonify({'success': True, 'items': [_line(item) for item in items],
+                    'totals': _totals(current_user.id)})
+
+
+@cart_api.route('/items', methods=['POST'])
+def add_item():
+    data = _payload()
+    quantity = _quantity(data.get('quantity', 1))
+    product = db.session.get(Product, _whole_number(data.get('product_id'), 'A product_id is required'))
+    if product is None:
+        raise CartAPIError('Product not found', status=404)
+    _check_stock(product, quantity)
+
+    item = CartItem.query.filter_by(user_id=current_user.id, product_id=product.id).first()
+    if item:
+        item.quantity += quantity
+    else:
+        item = CartItem(user_id=current_user.id, product_id=product.id, quantity=quantity)
+        db.session.add(item)
+    db.session.flush()
+    line = _line(item)  # Serialized before commit() expires the objects
+    db.session.commit()
+    return jsonify({'success': True, 'line': line, 'totals': _totals(current_user.id)}), 201
+
+
+@cart_api.route('/items/<int:id>', methods=['PATCH'])
+def update_item(id):
+    item = _cart_item(id)
+    quantity = _quantity(_payload().get('quantity'))
+    _check_stock(item.product, quantity)
+    item.quantity = quantity
+    line = _line(item)
+    db.session.commit()
+    return jsonify({'success': True, 'line': line, 'totals': _totals(current_user.id)})
+
+
+@cart_api.route('/items/<int:id>', methods=['DELETE'])
+def remove_item(id):
+    item = _cart_item(id)
+    db.session.delete(item)
+    db.session.commit()
+    return jsonify({'success': True, 'removed': [id], 'totals': _totals(current_user.id)})
+
+
+@cart_api.route('/batch', methods=['POST'])
+def batch_update():
+    """Set the quantity of several lines at once; a quantity of 0 removes the line.
+
+    Body: {"updates": [{"id": <cart item id>, "quantity": <n>}, ...]}. Every
+    update is checked before any is applied, so the batch succeeds or fails
+    as a whole. A malformed entry or a line listed twice fails the whole
+    request; per-line problems are reported under "errors" by line id.
+    """
+    updates = _payload().get('updates')
+    if not isinstance(updates, list) or not updates:
+        raise CartAPIError('Expected a non-empty "updates" list')
+
+    quantities = {}
+    errors = {}
+    seen = set()
+    for update in updates:
+        if not isinstance(update, dict) or 'id' not in update or 'quantity' not in update:
+            raise CartAPIError('Each update needs an "id" and a "quantity"')
+        id = _whole_number(update['id'], 'Each update needs a whole-number "id"')
+        if id in seen:
+            raise CartAPIError(f'Cart item {id} is listed more than once')
+        seen.add(id)
+        try:
+            quantities[id] = _quantity(update['quantity'], minimum=0)
+        except CartAPIError as e:
+            errors[str(id)] = e.message
+
+    items = {item.id: item for item in CartItem.query.options(db.joinedload(CartItem.product))
+             .filter(CartItem.id.in_(quantities), CartItem.user_id == current_user.id)}
+    for id, quantity in quantities.items():
+        item = items.get(id)
+        if item is None:
+            errors[str(id)] = 'Cart item not found'
+        elif quantity and (item.product.stock_quantity or 0) < quantity:
+            errors[str(id)] = f'Only {item.product.stock_quantity or 0} of {item.product.name} in stock'
+    if errors:
+        raise CartAPIError('Some updates could not be applied; none were saved', errors=errors)
+
+    lines = []
+    removed = []
+    for id, quantity in quantities.items():
+        if quantity:
+            items[id].quantity = quantity
+            lines.append(items[id])
+        else:
+            db.session.delete(items[id])
+            removed.append(id)
+    lines = [_line(item) for item in lines]
+    db.session.commit()
+    return jsonify({'success': True, 'lines': lines, 'removed': removed,
+                    'totals': _totals(current_user.id)})
@@ -0,0 +1,228 @@
+"""
+Static asset pipeline: minified, fingerprinted and precompressed CSS/JS.
+
+Every .css and .js file under the static folder is minified, written to
+ASSETS_DIR under a name that carries a hash of its content
+(`css/style.3f9c2a1b7d4e.css`), and given .gz and .br siblings (Brotli
+needs the optional `brotli` package). `asset_url('css/style.css')` in a
+template links to the fingerprinted copy, which /assets/ serves with the
+best encoding the browser accepts and a one-year immutable Cache-Control:
+a new build changes the name, so nothing ever has to revalidate.
+
+The build runs from `flask build-assets` and, when the sources changed
+since the last build, at startup. In debug mode asset_url links to the
+plain static files so edits show up without a rebuild.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from flask import current_app, request, send_from_directory, url_for
+
+ASSET_EXTENSIONS = ('.css', '.js')
+MANIFEST = 'manifest.json'
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+
+
+def minify_css(text):
+    try:
+        import rcssmin
+        return rcssmin.cssmin(text)
+    except ImportError:
+        pass
+    # Strings are kept verbatim; comments go; whitespace collapses and is
+    # dropped next to punctuation that never needs it
+    parts = []
+    position = 0
+    for match in _CSS_TOKENS.finditer(text):
+        parts.append(_squeeze_css(text[position:match.start()]))
+        if match.group(1):
+            parts.append(match.group(1))
+        position = match.end()
+    parts.append(_squeeze_css(text[position:]))
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+def _squeeze_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    return re.sub(r' ?([{};,>]) ?', r'\1', text)
+
+
+def minify_js(text):
+    """Drop comment-only lines, indentation and blank lines.
+
+    Deliberately conservative without the optional rjsmin package: line
+    breaks are kept (automatic semicolon insertion depends on them) and
+    lines inside multi-line template literals are left untouched.
+    """
+    try:
+        import rjsmin
+        return rjsmin.jsmin(text)
+    except ImportError:
+        pass
+    lines = []
+    in_template = in_comment = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            line = line.strip()
+            if in_comment:
+                if '*/' not in line:
+                    continue
+                line = line.split('*/', 1)[1].strip()
+                in_comment = False
+            if line.startswith('//'):
+                continue
+            if line.startswith('/*'):
+                if '*/' not in line:
+                    in_comment = True
+                    continue
+                line = line.split('*/', 1)[1].strip()
+            if not line:
+                continue
+            lines.append(line)
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def source_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetPipeline:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIR', os.path.join(app.instance_path, 'assets'))
+        app.config.setdefault('ASSETS_BUILD_ON_STARTUP', True)
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        app.extensions['assets'] = {'manifest': {}}
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+        manifest = self.load(app)
+        if self.stale(app, manifest) and app.config['ASSETS_BUILD_ON_STARTUP']:
+            manifest = self.build(app)
+        app.extensions['assets']['manifest'] = manifest
+
+    @staticmethod
+    def sources(app):
+        """Logical names (relative to the static folder) of every asset to build."""
+        names = []
+        for root, _, files in os.walk(app.static_folder):
+            for name in files:
+                if name.endswith(ASSET_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    names.append(os.path.relpath(path, app.static_folder).replace(os.sep, '/'))
+        return sorted(names)
+
+    def load(self, app):
+        try:
+            with open(os.path.join(app.config['ASSETS_DIR'], MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stale(self, app, manifest):
+        names = self.sources(app)
+        if set(names) != set(manifest):
+            return True
+        for name in names:
+            with open(os.path.join(app.static_folder, name), 'rb') as f:
+                if source_digest(f.read()) != manifest[name]['source']:
+                    return True
+            if not os.path.exists(os.path.join(app.config['ASSETS_DIR'], manifest[name]['file'])):
+                return True
+        return False
+
+    def build(self, app):
+        """Minify, fingerprint and compress every asset; returns the new manifest."""
+        directory = app.config['ASSETS_DIR']
+        brotli = _brotli()
+        manifest = {}
+        for name in self.sources(app):
+            with open(os.path.join(app.static_folder, name), 'rb') as f:
+                source = f.read()
+            text = source.decode('utf-8')
+            data = (minify_css(text) if name.endswith('.css') else minify_js(text)).encode('utf-8')
+            stem, extension = os.path.splitext(name)
+            file = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+            path = os.path.join(directory, file)
+            _write(path, data)
+            encodings = ['gzip']
+            _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli:
+                _write(path + '.br', brotli.compress(data, quality=11))
+                encodings.append('br')
+            manifest[name] = {'file': file, 'source': source_digest(source), 'size': len(source),
+                              'minified': len(data), 'encodings': encodings}
+        _write(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+        app.extensions['assets']['manifest'] = manifest
+        return manifest
+
+    def clean(self, app):
+        """Delete built files that the current manifest no longer names; returns how many."""
+        directory = app.config['ASSETS_DIR']
+        keep = {MANIFEST}
+        for entry in app.extensions['assets']['manifest'].values():
+            keep.update({entry['file'], entry['file'] + '.gz', entry['file'] + '.br'})
+        removed = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                relative = os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+                if relative not in keep:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        return removed
+
+    def url(self, filename):
+        """URL of the fingerprinted copy of a static file, or of the file itself."""
+        entry = current_app.extensions['assets']['manifest'].get(filename)
+        if entry is None or current_app.debug:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=entry['file'])
+
+    def serve(self, filename):
+        directory = current_app.config['ASSETS_DIR']
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[name] and os.path.isfile(os.path.join(directory, filename + suffix)):
+                encoding = name
+                filename += suffix
+                break
+        response = send_from_directory(directory, filename, mimetype=mimetype,
+                                       max_age=current_app.config['ASSETS_MAX_AGE'])
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = AssetPipeline()
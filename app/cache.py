@@ -0,0 +1,498 @@
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+
+
+class LRUCache:
+    """Thread-safe in-process cache with LRU eviction and per-entry TTL."""
+
+    shared = False  # Each worker process has its own
+
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileSystemCache:
+    """Cache entries as pickle files in a directory shared by worker processes."""
+
+    shared = True
+
+    def __init__(self, directory, max_entries=10000, default_ttl=300):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(str(key).encode()).hexdigest())
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if expires_at <= time.time():
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        # Write to a temporary file and rename it, so readers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._prune()
+
+    def _prune(self):
+        entries = [entry for entry in os.scandir(self.directory)
+                   if entry.is_file() and not entry.name.startswith('.tmp-')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+class RedisCache:
+    """Cache entries in a Redis server (or anything speaking its protocol).
+
+    Needs the optional `redis` package.
+    """
+
+    shared = True
+
+    def __init__(self, url, prefix='spequip:', default_ttl=300):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis cache backend needs the redis package: pip install redis')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key, default=None):
+        value = self._client.get(self.prefix + str(key))
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self.prefix + str(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                         ex=int(self.default_ttl if ttl is None else ttl))
+
+    def delete(self, key):
+        self._client.delete(self.prefix + str(key))
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + '*'):
+            self._client.delete(key)
+
+
+def make_cache(backend, max_entries=10000, default_ttl=300, directory=None, url=None, prefix='spequip:'):
+    """Build a cache backend by name: 'memory', 'filesystem' or 'redis'."""
+    if backend == 'memory':
+        return LRUCache(max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'filesystem':
+        return FileSystemCache(directory, max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'redis':
+        return RedisCache(url, prefix=prefix, default_ttl=default_ttl)
+    raise ValueError(f'Unknown cache backend: {backend!r}')
+
+
+class CartCountCache:
+    """Per-user cart badge count, so page renders skip the COUNT query.
+
+    CART_COUNT_STORE selects where counts live: 'session' keeps them in the
+    user's own session (consistent across worker processes), 'memory' in an
+    in-process LRU. Routes that change a cart call invalidate(); entries
+    also expire after CART_COUNT_TTL seconds to bound staleness from
+    changes made on behalf of other users (e.g. admin product deletion).
+    """
+
+    session_key = 'cart_count'
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CART_COUNT_STORE', 'session')  # session or memory
+        app.config.setdefault('CART_COUNT_TTL', 300)
+        app.extensions['cart_count_cache'] = LRUCache(
+            max_entries=app.config.get('CART_COUNT_MAX_ENTRIES', 10000),
+            default_ttl=app.config['CART_COUNT_TTL']
+        )
+
+    @staticmethod
+    def _memory():
+        return current_app.extensions['cart_count_cache']
+
+    @staticmethod
+    def _uses_session():
+        return current_app.config['CART_COUNT_STORE'] == 'session'
+
+    def get(self, user_id):
+        if self._uses_session():
+            entry = session.get(self.session_key)
+            if entry and entry['user_id'] == user_id and entry['expires'] > time.time():
+                return entry['count']
+        else:
+            count = self._memory().get(user_id)
+            if count is not None:
+                return count
+
+        from app.models import CartItem
+        count = CartItem.query.filter_by(user_id=user_id).count()
+        self.set(user_id, count)
+        return count
+
+    def set(self, user_id, count):
+        if self._uses_session():
+            session[self.session_key] = {
+                'user_id': user_id,
+                'count': count,
+                'expires': time.time() + current_app.config['CART_COUNT_TTL'],
+            }
+        else:
+            self._memory().set(user_id, count)
+
+    def invalidate(self, user_id):
+        if self._uses_session():
+            session.pop(self.session_key, None)
+        else:
+            self._memory().delete(user_id)
+
+
+cart_counts = CartCountCache()
+
+
+class FragmentCache:
+    """Rendered HTML for the catalog pages, shared by every visitor.
+
+    Fragments are keyed by the catalog generation, a timestamp that bump()
+    moves forward whenever products, stock or ratings change, so stale
+    entries are simply never read again and age out of the backend.
+    FRAGMENT_CACHE_BACKEND picks 'filesystem' (FRAGMENT_CACHE_DIR, shared
+    by the workers and CLI commands on one host), 'redis'
+    (FRAGMENT_CACHE_REDIS_URL, shared by every host), 'memory' or 'none'.
+    A 'memory' cache belongs to one process, so a bump from another worker
+    or a CLI command never reaches it; it is the default only for an
+    in-memory SQLite database, which no other process can change anyway.
+    Keys are prefixed with FRAGMENT_CACHE_NAMESPACE (by default a hash of
+    the database URI), so databases sharing a cache never share pages.
+    """
+
+    generation_key = 'catalog:generation'
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app.database import is_memory_sqlite
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        app.config.setdefault('FRAGMENT_CACHE_BACKEND', 'memory' if is_memory_sqlite(uri) else 'filesystem')
+        app.config.setdefault('FRAGMENT_CACHE_NAMESPACE', hashlib.sha1(uri.encode()).hexdigest()[:8])
+        app.config.setdefault('FRAGMENT_CACHE_TTL', 300)
+        app.config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES', 2000)
+        app.config.setdefault('FRAGMENT_CACHE_DIR', os.path.join(app.instance_path, 'fragment-cache'))
+        app.config.setdefault('FRAGMENT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        backend = app.config['FRAGMENT_CACHE_BACKEND']
+        app.extensions['fragment_cache'] = None if backend == 'none' else make_cache(
+            backend,
+            max_entries=app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+            default_ttl=app.config['FRAGMENT_CACHE_TTL'],
+            directory=app.config['FRAGMENT_CACHE_DIR'],
+            url=app.config['FRAGMENT_CACHE_REDIS_URL'],
+            prefix='spequip:fragment:',
+        )
+
+    @staticmethod
+    def _backend():
+        return current_app.extensions['fragment_cache']
+
+    @staticmethod
+    def _key(*parts):
+        return ':'.join([current_app.config['FRAGMENT_CACHE_NAMESPACE'], *parts])
+
+    def is_shared(self):
+        """Whether a bump() made here is seen by every worker process (and the CLI)."""
+        backend = self._backend()
+        return backend is not None and backend.shared
+
+    def generation(self):
+        """Current catalog generation (a UNIX timestamp)."""
+        backend = self._backend()
+        if backend is None:
+            return time.time()
+        generation = backend.get(self._key(self.generation_key))
+        if generation is None:
+            # First use, or the entry was evicted: start a new generation
+            generation = self.bump()
+        return generation
+
+    def bump(self):
+        """Invalidate every cached fragment; call after the catalog changes."""
+        generation = time.time()
+        backend = self._backend()
+        if backend is not None:
+            backend.set(self._key(self.generation_key), generation, ttl=365 * 24 * 3600)
+        return generation
+
+    def last_modified(self):
+        return datetime.fromtimestamp(int(self.generation()), timezone.utc)
+
+    def cached(self, name, render, *key_parts):
+        """Return the fragment `name` for `key_parts`, calling render() on a miss.
+
+        Logged-in and anonymous visitors get separate entries since the
+        product cards show cart and wishlist buttons only to the former.
+        """
+        backend = self._backend()
+        if backend is None:
+            return Markup(render())
+        variant = 'user' if current_user.is_authenticated else 'anon'
+        digest = hashlib.sha1(repr(key_parts).encode()).hexdigest()
+        key = self._key(name, repr(self.generation()), variant, digest)
+        html = backend.get(key)
+        if html is None:
+            html = str(render())
+            backend.set(key, html)
+        return Markup(html)
+
+    def memoize(self, name, compute, *key_parts):
+        """Like cached(), for any picklable value that is the same for every visitor."""
+        backend = self._backend()
+        if backend is None:
+            return compute()
+        digest = hashlib.sha1(repr(key_parts).encode()).hexdigest()
+        key = self._key(name, repr(self.generation()), digest)
+        value = backend.get(key)
+        if value is None:
+            value = compute()
+            backend.set(key, value)
+        return value
+
+    def etag(self):
+        """A validator for the catalog page that needs no rendering, or None.
+
+        An anonymous visitor's page depends only on its URL, the catalog
+        generation and the deployed code. Logged-in pages, pages carrying a
+        flashed message, development servers (templates reload) and backends
+        that are not shared are hashed once rendered: with 'memory' each
+        process has its own generation, which misses bumps made by other
+        workers or the CLI, and 'none' has no generation at all.
+        """
+        if (not self.is_shared() or current_app.debug or session.get('_flashes')
+                or current_user.is_authenticated):
+            return None
+        from app.compression import compression
+        return f'{self.generation():.6f}-{compression.build()}'
+
+    def conditional(self, view):
+        """Decorate a catalog view: add validators and turn repeat requests into 304s.
+
+        With a generation ETag the check runs before the view, so an
+        unchanged page is neither rendered nor read from the cache. It is
+        taken before rendering, so a bump during rendering is never hidden.
+        Otherwise the ETag hashes the whole page, so the per-user parts
+        (cart badge, flashed messages) are covered too. Last-Modified only
+        describes the catalog, so it is sent with the generation ETag alone.
+        """
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = self.etag()
+            if etag and request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            if etag:
+                response.set_etag(etag, weak=True)
+                response.last_modified = self.last_modified()
+            else:
+                response.add_etag(weak=True)
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+
+
+fragment_cache = FragmentCache()
+
+
+class UserCache:
+    """Flask-Login user records cached by id, so loading the current user skips the database.
+
+    Each user has a version stamp next to the cached record; invalidate()
+    replaces the stamp, which orphans the record at once even if another
+    request is about to write back a copy it read before the change.
+    USER_CACHE_BACKEND picks 'memory' (per process; other workers see the
+    change after USER_CACHE_TTL seconds), 'filesystem', 'redis' or 'none'.
+    The password hash is never cached; it is loaded on first access.
+    Admin routes check is_admin() instead of the cached flag, so revoked
+    admin rights apply at once with the 'memory' backend too.
+    """
+
+    excluded_columns = ('password_hash',)
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_BACKEND', 'memory')
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        app.config.setdefault('USER_CACHE_MAX_ENTRIES', 10000)
+        app.config.setdefault('USER_CACHE_DIR', os.path.join(app.instance_path, 'user-cache'))
+        app.config.setdefault('USER_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        backend = app.config['USER_CACHE_BACKEND']
+        app.extensions['user_cache'] = None if backend == 'none' else make_cache(
+            backend,
+            max_entries=app.config['USER_CACHE_MAX_ENTRIES'],
+            default_ttl=app.config['USER_CACHE_TTL'],
+            directory=app.config['USER_CACHE_DIR'],
+            url=app.config['USER_CACHE_REDIS_URL'],
+            prefix='spequip:user:',
+        )
+
+    @staticmethod
+    def _backend():
+        return current_app.extensions['user_cache']
+
+    @staticmethod
+    def _version(backend, user_id):
+        version = backend.get(f'version:{user_id}')
+        if version is None:
+            version = uuid.uuid4().hex
+            backend.set(f'version:{user_id}', version, ttl=24 * 3600)
+        return version
+
+    def load(self, user_id):
+        """Return the User for `user_id` attached to the current session, or None."""
+        from sqlalchemy.orm import make_transient_to_detached
+        from app import db
+        from app.models import User
+
+        backend = self._backend()
+        if backend is None:
+            return db.session.get(User, user_id)
+
+        version = self._version(backend, user_id)
+        entry = backend.get(f'record:{user_id}')
+        if entry is not None and entry[0] == version:
+            try:
+                user = User(**entry[1])
+            except TypeError:
+                pass  # Cached under an older schema; reload below
+            else:
+                # Attach as an already persistent row: no SELECT is issued
+                make_transient_to_detached(user)
+                return db.session.merge(user, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            self._store(backend, version, user)
+        return user
+
+    def _store(self, backend, version, user):
+        record = {attr.key: getattr(user, attr.key) for attr in user.__mapper__.column_attrs
+                  if attr.key not in self.excluded_columns}
+        backend.set(f'record:{user.id}', (version, record))
+
+    def prime(self, user):
+        """Cache a user the request has already loaded (e.g. at login)."""
+        backend = self._backend()
+        if backend is not None:
+            self._store(backend, self._version(backend, user.id), user)
+
+    def is_admin(self, user):
+        """Whether `user` has admin rights, as the database says right now.
+
+        The cached flag is trusted only when every process shares the cache
+        (and so sees invalidate()); a per-process copy could still hold
+        rights another worker has revoked, so it is checked with a primary
+        key lookup instead.
+        """
+        from app import db
+        from app.models import User
+
+        backend = self._backend()
+        if backend is None or backend.shared:
+            return bool(user.is_admin)
+        return bool(db.session.execute(db.select(User.is_admin).where(User.id == user.id)).scalar())
+
+    def invalidate(self, user_id):
+        """Drop the cached record; call after committing a change to the user."""
+        backend = self._backend()
+        if backend is not None:
+            backend.set(f'version:{user_id}', uuid.uuid4().hex, ttl=24 * 3600)
+            backend.delete(f'record:{user_id}')
+
+
+user_cache = UserCache()
@@ -0,0 +1,186 @@
+"""
+Bulk product catalog import from CSV, JSON or NDJSON files.
+
+Every row is checked with the same rules as the admin product form
+(ProductForm), then matched to an existing product by name: matches are
+updated, the rest inserted, in executemany batches. Rows that fail
+validation are skipped and reported with their row number. The search
+index and dashboard metrics are rebuilt once, after the last batch,
+instead of once per product.
+
+Used by `flask import-products` and the admin upload page.
+"""
+
+import csv
+import json
+from werkzeug.datastructures import MultiDict
+from app import db
+from app.models import Product
+from app.forms import ProductForm
+
+FORMATS = ('csv', 'json', 'ndjson')
+FIELDS = ('name', 'description', 'price', 'category', 'image_url', 'stock_quantity')
+IMPORT_BATCH_SIZE = 1000
+
+
+class CatalogImportError(ValueError):
+    """The file as a whole cannot be read (unknown format, broken JSON, missing columns)."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []  # (row number, {field: [messages]})
+
+    @property
+    def imported(self):
+        return self.inserted + self.updated
+
+    def summary(self):
+        return (f"{self.inserted} added, {self.updated} updated, "
+                f"{len(self.errors)} row{'s' if len(self.errors) != 1 else ''} rejected")
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in FORMATS:
+        raise CatalogImportError(f"Unsupported file type '.{extension}', expected one of: "
+                                 f"{', '.join('.' + fmt for fmt in FORMATS)}")
+    return extension
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per product from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = [field for field in ('name', 'description', 'price', 'category', 'stock_quantity')
+                   if field not in (reader.fieldnames or [])]
+        if missing:
+            raise CatalogImportError(f"CSV header is missing: {', '.join(missing)}")
+        yield from reader
+    elif fmt == 'ndjson':
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise CatalogImportError(f'Line {number} is not valid JSON: {e}')
+    else:
+        try:
+            rows = json.load(stream)
+        except ValueError as e:
+            raise CatalogImportError(f'File is not valid JSON: {e}')
+        if isinstance(rows, dict):
+            rows = rows.get('products')
+        if not isinstance(rows, list):
+            raise CatalogImportError('Expected a list of products, or {"products": [...]}')
+        yield from rows
+
+
+class RowValidator:
+    """Runs ProductForm's validators over plain dicts, reusing one form instance."""
+
+    def __init__(self):
+        # Explicit formdata keeps Flask-WTF from looking for a request
+        self.form = ProductForm(formdata=MultiDict(), meta={'csrf': False})
+        # Only the product fields; processing the whole form per row (submit
+        # button included) costs more than the database writes
+        self.fields = [self.form[field] for field in FIELDS]
+
+    def __call__(self, row):
+        """Returns (values, None) for a valid row, or (None, errors)."""
+        if not isinstance(row, dict):
+            return None, {'row': ['Expected an object with product fields']}
+        formdata = MultiDict((field, str(row[field]).strip()) for field in FIELDS
+                             if row.get(field) is not None)
+        errors = {}
+        for field in self.fields:
+            field.process(formdata)
+            if not field.validate(self.form):
+                errors[field.name] = list(field.errors)
+        if errors:
+            return None, errors
+        values = {field.name: field.data for field in self.fields}
+        if not values['image_url']:
+            # Not given: an update keeps the product's image, an insert gets the default
+            del values['image_url']
+        return values, None
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Validate and upsert `rows`; the caller commits (or rolls back a dry run).
+
+    A product named more than once is written with the values of its last
+    row and counted once. A row without an image_url leaves an existing
+    product's image alone; a new image_url drops the thumbnails made from
+    the old one, as editing the product does.
+    """
+    validate = RowValidator()
+    result = ImportResult()
+    existing = {}
+    images = {}
+    # Lowest id wins when the table already holds duplicate names
+    for product_id, name, image_url in db.session.execute(
+        db.select(Product.id, Product.name, Product.image_url).order_by(Product.id.desc())
+    ):
+        existing[name] = product_id
+        images[name] = image_url
+
+    seen = set()
+    inserts, updates = {}, {}
+
+    def write_batch():
+        if not dry_run:
+            if updates:
+                db.session.execute(db.update(Product), list(updates.values()))
+            if inserts:
+                db.session.execute(db.insert(Product), list(inserts.values()))
+                # Later rows with these names update the new products
+                existing.update((name, product_id) for product_id, name in db.session.execute(
+                    db.select(Product.id, Product.name).where(Product.name.in_(list(inserts)))
+                ))
+        inserts.clear()
+        updates.clear()
+
+    for number, row in enumerate(rows, 1):
+        values, errors = validate(row)
+        if errors:
+            result.errors.append((number, errors))
+            continue
+        name = values['name']
+        if name not in seen:
+            seen.add(name)
+            if name in existing:
+                result.updated += 1
+            else:
+                result.inserted += 1
+        if name in existing:
+            update = dict(values, id=existing[name])
+            if 'image_url' in values and values['image_url'] != images.get(name):
+                update.update(image_key=None, image_pending=None)
+            updates[name] = update
+        else:
+            inserts[name] = dict({'image_url': 'default-product.jpg'}, **values)
+            images[name] = inserts[name]['image_url']
+        if len(inserts) + len(updates) >= batch_size:
+            write_batch()
+    write_batch()
+
+    if result.imported and not dry_run:
+        refresh_after_import()
+    return result
+
+
+def refresh_after_import():
+    """Rebuild what is derived from the product table, once for the whole import.
+
+    The caller bumps the fragment cache after committing, as the admin
+    product routes do.
+    """
+    from app.search import product_search
+    from app import metrics, facets
+
+    product_search.rebuild()
+    metrics.rebuild()
+    facets.rebuild()
@@ -0,0 +1,119 @@
+import random
+import time
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from app import db
+from app.models import Product, Order, OrderItem, CartItem
+from app import metrics, facets
+
+# Driver messages that mean "another transaction holds the lock, try again"
+CONTENTION_MESSAGES = ('database is locked', 'database table is locked', 'deadlock',
+                       'could not serialize', 'lock wait timeout')
+
+
+class CheckoutError(Exception):
+    """Base class for checkout failures shown to the user."""
+
+
+class EmptyCartError(CheckoutError):
+    pass
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, product_names):
+        self.product_names = product_names
+        super().__init__(f"Not enough stock for: {', '.join(product_names)}")
+
+
+class CheckoutBusyError(CheckoutError):
+    """Lock contention persisted through every retry."""
+
+
+def is_lock_contention(error):
+    message = str(getattr(error, 'orig', error)).lower()
+    return any(text in message for text in CONTENTION_MESSAGES)
+
+
+def place_order(user_id, max_attempts=None):
+    """Turn the user's cart into an order in a single transaction.
+
+    Stock is reserved with one conditional UPDATE that only succeeds when
+    every line still has enough stock, so concurrent checkouts can never
+    oversell. If any line is short the whole transaction is rolled back
+    and OutOfStockError names the products. Lock contention is retried
+    with jittered exponential backoff.
+    """
+    attempts = max_attempts or current_app.config.get('CHECKOUT_MAX_ATTEMPTS', 5)
+    backoff = current_app.config.get('CHECKOUT_RETRY_BACKOFF', 0.05)
+    for attempt in range(1, attempts + 1):
+        try:
+            return _place_order(user_id)
+        except DBAPIError as e:
+            db.session.rollback()
+            if not is_lock_contention(e):
+                raise
+            if attempt == attempts:
+                raise CheckoutBusyError('Checkout is busy, please try again') from e
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def _place_order(user_id):
+    cart_items = CartItem.query.options(db.joinedload(CartItem.product)) \
+        .filter_by(user_id=user_id).all()
+    if not cart_items:
+        raise EmptyCartError('Your cart is empty')
+
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    # Reserve stock and count the sales for every line in one statement;
+    # rows whose stock is too low are skipped by the WHERE clause, which
+    # shows up in the row count
+    requested = db.case(quantities, value=Product.id)
+    result = db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(quantities), Product.stock_quantity >= requested)
+        .values(stock_quantity=Product.stock_quantity - requested,
+                units_sold=Product.units_sold + requested)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        db.session.rollback()
+        short = Product.query.filter(Product.id.in_(quantities)).all()
+        raise OutOfStockError([product.name for product in short
+                               if (product.stock_quantity or 0) < quantities[product.id]])
+
+    # Stock levels after the reservation, read inside the same transaction,
+    # move products between the dashboard's stock bands and the catalog's
+    # in-stock facet
+    changes = metrics.MetricChanges()
+    facet_changes = facets.FacetChanges()
+    for product_id, category, price, stock, rating_sum, rating_count in db.session.execute(
+        db.select(Product.id, Product.category, Product.price, Product.stock_quantity,
+                  Product.rating_sum, Product.rating_count).where(Product.id.in_(quantities))
+    ):
+        metrics.stock_changes(changes, stock + quantities[product_id], stock)
+        facet_changes.move(facets.cell_of(category, price, stock + quantities[product_id], rating_sum, rating_count),
+                           facets.cell_of(category, price, stock, rating_sum, rating_count))
+    facet_changes.save()
+
+    order = Order(user_id=user_id,
+                  total_amount=sum(item.product.price * item.quantity for item in cart_items))
+    db.session.add(order)
+    db.session.flush()  # Get the order ID
+
+    db.session.execute(db.insert(OrderItem), [{
+        'order_id': order.id,
+        'product_id': item.product_id,
+        'quantity': item.quantity,
+        'price': item.product.price,
+    } for item in cart_items])
+    db.session.execute(
+        db.delete(CartItem)
+        .where(CartItem.id.in_([item.id for item in cart_items]))
+        .execution_options(synchronize_session=False)
+    )
+    metrics.order_placed(changes, order).save()
+    db.session.commit()
+    return order
@@ -0,0 +1,263 @@
+import click
+from flask.cli import with_appcontext
+from app import db
+from app.cache import fragment_cache
+
+
+def warn_process_local_cache():
+    """Say so when catalog changes made by this process cannot reach the running servers."""
+    from flask import current_app
+
+    if current_app.config['FRAGMENT_CACHE_BACKEND'] == 'memory':
+        click.secho("Warning: FRAGMENT_CACHE_BACKEND is 'memory', private to this process, so running "
+                    "servers keep their cached catalog pages for up to "
+                    f"{current_app.config['FRAGMENT_CACHE_TTL']} seconds after changes made here. "
+                    "Use 'filesystem' or 'redis'.", err=True, fg='yellow')
+
+
+def bump_fragment_cache():
+    """Invalidate the cached catalog pages of every process sharing the cache."""
+    fragment_cache.bump()
+    warn_process_local_cache()
+
+
+@click.command('backfill-ratings')
+@with_appcontext
+def backfill_ratings_command():
+    """Add and populate the Product rating aggregates for an existing database."""
+    from app.models import Product
+    from app.migrations import add_missing_columns
+    from app import facets
+
+    added = add_missing_columns('product', [Product.__table__.c[name]
+                                            for name in ('rating_sum', 'rating_count', 'rating_avg')])
+    if added:
+        click.echo(f"Added columns: {', '.join(added)}")
+
+    Product.refresh_rating_aggregates()
+    facets.rebuild()
+    db.session.commit()
+    bump_fragment_cache()
+    click.echo(f"Rating aggregates refreshed for {Product.query.count()} products.")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Rebuild the product search index from the product table, creating it if needed."""
+    from flask import current_app
+    from app.search import product_search, create_search_table
+
+    if current_app.config['SEARCH_BACKEND'] != 'memory' and not create_search_table(db.session.connection()):
+        click.echo('SQLite with FTS5 is not available; searches use the in-memory index of each process.')
+    product_search.rebuild()
+    db.session.commit()
+    click.echo('Product search index rebuilt.')
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    from app.migrations import upgrade
+
+    applied = upgrade()
+    for version, description in applied:
+        click.echo(f"Applied migration {version}: {description}")
+    if not applied:
+        click.echo('Database schema is up to date.')
+
+
+@click.command('clear-fragment-cache')
+@with_appcontext
+def clear_fragment_cache_command():
+    """Start a new catalog generation so every cached page fragment is re-rendered."""
+    bump_fragment_cache()
+    click.echo('Catalog fragment cache invalidated.')
+
+
+@click.command('rebuild-metrics')
+@with_appcontext
+def rebuild_metrics_command():
+    """Recompute the admin dashboard counters, daily rollups and user order summaries from scratch."""
+    from app import metrics
+
+    metrics.rebuild()
+    db.session.commit()
+    counters = metrics.read_counters()
+    click.echo(f"Metrics rebuilt: {counters['products.total']} products, "
+               f"{counters['orders.total']} orders, {counters['users.total']} users.")
+
+
+@click.command('rebuild-facets')
+@with_appcontext
+def rebuild_facets_command():
+    """Recompute the catalog facet counts from the product table."""
+    from app import facets
+
+    facets.rebuild()
+    db.session.commit()
+    bump_fragment_cache()
+    click.echo(f"Facet counts rebuilt: {len(facets.read_cells())} cells.")
+
+
+@click.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'ndjson']),
+              help='File format; taken from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT/UPDATE batch.')
+@click.option('--dry-run', is_flag=True, help='Validate every row without saving anything.')
+@with_appcontext
+def import_products_command(path, fmt, batch_size, dry_run):
+    """Add or update products from a CSV, JSON or NDJSON file, matching on name."""
+    from app.catalog_import import CatalogImportError, detect_format, read_rows, import_products
+
+    try:
+        fmt = fmt or detect_format(path)
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            result = import_products(read_rows(stream, fmt), batch_size=batch_size, dry_run=dry_run)
+    except CatalogImportError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+    for number, errors in result.errors:
+        messages = '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in errors.items())
+        click.echo(f"Row {number}: {messages}", err=True)
+    if dry_run:
+        db.session.rollback()
+        click.echo(f"Dry run, nothing saved: {result.summary()}.")
+        return
+    db.session.commit()
+    if result.imported:
+        bump_fragment_cache()
+    click.echo(f"Imported products: {result.summary()}.")
+
+
+@click.command('process-product-images')
+@click.option('--download', is_flag=True, help='Also fetch images whose image_url is an http(s) URL.')
+@click.option('--all', 'everything', is_flag=True, help='Redo products that already have thumbnails.')
+@click.option('--workers', type=int, help='Resizing processes (default: IMAGE_WORKERS, or one per CPU).')
+@click.option('--batch-size', default=200, show_default=True, help='Images held in memory at once.')
+@with_appcontext
+def process_product_images_command(download, everything, workers, batch_size):
+    """Make thumbnails for products whose image_url is a local file (or a URL, with --download)."""
+    from flask import current_app
+    from app.models import Product
+    from app.images import product_images, read_sources
+
+    query = db.select(Product.id, Product.image_url).where(Product.image_url.is_not(None)).order_by(Product.id)
+    if not everything:
+        query = query.where(Product.image_key.is_(None))
+    products = db.session.execute(query).all()
+
+    done = skipped = failed = 0
+    for start in range(0, len(products), batch_size):
+        sources = []
+        for product_id, data, error in read_sources(products[start:start + batch_size],
+                                                    current_app.static_folder, download):
+            if error:
+                failed += 1
+                click.echo(f"Product {product_id}: {error}", err=True)
+            elif data is None:
+                skipped += 1
+            else:
+                sources.append((product_id, data))
+
+        keys = []
+        try:
+            for product_id, key, error in product_images.ingest_many(sources, workers=workers):
+                if error:
+                    failed += 1
+                    click.echo(f"Product {product_id}: {error}", err=True)
+                else:
+                    keys.append({'id': product_id, 'image_key': key})
+        except RuntimeError as e:  # Pillow is not installed
+            raise click.ClickException(str(e))
+        if keys:
+            db.session.execute(db.update(Product), keys)
+            db.session.commit()
+            done += len(keys)
+
+    if done:
+        bump_fragment_cache()
+    hint = '' if download else '; use --download for http(s) URLs'
+    click.echo(f"Thumbnails made for {done} products; {skipped} skipped (no local image file{hint}), "
+               f"{failed} failed.")
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Also delete files left over from earlier builds.')
+@with_appcontext
+def build_assets_command(clean):
+    """Minify, fingerprint and precompress the CSS and JavaScript in app/static."""
+    from flask import current_app
+    from app.assets import assets
+
+    manifest = assets.build(current_app)
+    for name, entry in sorted(manifest.items()):
+        click.echo(f"{name} -> {entry['file']} ({entry['size']:,} -> {entry['minified']:,} bytes; "
+                   f"{', '.join(entry['encodings'])})")
+    if clean:
+        click.echo(f"Removed {assets.clean(current_app)} stale files.")
+
+
+@click.command('jobs-worker')
+@click.option('--processes', type=int, help='Worker processes (default: JOBS_WORKERS).')
+@click.option('--until-idle', is_flag=True, help='Exit once no job is due instead of polling.')
+@with_appcontext
+def jobs_worker_command(processes, until_idle):
+    """Run queued background jobs; Ctrl-C stops after the jobs in progress."""
+    import logging
+    from flask import current_app
+    from app.jobs import jobs
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(processName)s %(message)s')
+    warn_process_local_cache()  # Jobs such as image resizing update the catalog
+    processes = processes or current_app.config['JOBS_WORKERS']
+    click.echo(f"Working jobs with {processes} processes{' until idle' if until_idle else ''}.")
+    jobs.run_workers(current_app._get_current_object(), processes, until_idle)
+
+
+@click.command('jobs-status')
+@click.option('--failures', default=10, show_default=True, help='Recent failed jobs to list.')
+@with_appcontext
+def jobs_status_command(failures):
+    """Show how many jobs are queued, running, done and failed."""
+    from app.jobs import jobs
+    from app.models import Job
+
+    counts = jobs.counts()
+    click.echo(', '.join(f"{status}: {counts.get(status, 0)}"
+                         for status in ('queued', 'running', 'done', 'failed')))
+    failed = db.session.execute(
+        db.select(Job).where(Job.status == 'failed').order_by(Job.finished_at.desc()).limit(failures)
+    ).scalars()
+    for job in failed:
+        click.echo(f"#{job.id} {job.name} failed {job.finished_at:%Y-%m-%d %H:%M} "
+                   f"after {job.attempts} attempts: {job.last_error}")
+
+
+@click.command('jobs-purge')
+@with_appcontext
+def jobs_purge_command():
+    """Delete done and failed jobs older than JOBS_RETENTION."""
+    from app.jobs import jobs
+
+    removed = jobs.purge()
+    db.session.commit()
+    click.echo(f"Removed {removed} finished jobs.")
+
+
+def register_commands(app):
+    app.cli.add_command(backfill_ratings_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(clear_fragment_cache_command)
+    app.cli.add_command(rebuild_metrics_command)
+    app.cli.add_command(rebuild_facets_command)
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(process_product_images_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(jobs_status_command)
+    app.cli.add_command(jobs_purge_command)
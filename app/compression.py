@@ -0,0 +1,168 @@
+"""
+Response compression and conditional GET for the app's own responses.
+
+Every text response (HTML pages, JSON, CSV and NDJSON exports) is
+compressed with Brotli (needs the optional `brotli` package) or gzip,
+whichever the browser prefers in Accept-Encoding. Buffered bodies are
+compressed in one go; streamed ones (the exports) chunk by chunk as they
+are sent, flushed every COMPRESS_STREAM_FLUSH bytes so the download keeps
+moving. Bodies under COMPRESS_MIN_SIZE, responses that already carry a
+Content-Encoding (the precompressed /assets/ files) and files sent
+straight from disk are left alone.
+
+HTML pages answering a GET get a weak ETag hashed from the rendered body
+before compression, so one validator covers every encoding, and an
+unchanged page is answered with 304 Not Modified and no body. Views that
+know a cheaper validator set their own ETag first (the catalog pages use
+the catalog generation when the fragment cache is shared, see
+FragmentCache.conditional) and are not hashed again.
+"""
+
+import gzip
+import hashlib
+import os
+import zlib
+from flask import current_app, request
+
+COMPRESSIBLE = ('text/html', 'text/css', 'text/plain', 'text/csv', 'application/json',
+                'application/javascript', 'application/x-ndjson', 'image/svg+xml')
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def build_id(root):
+    """Hash of the names, sizes and modification times of every file under `root`.
+
+    Changes whenever a deployment changes a template, module or static
+    file, so validators derived from data stamps alone expire with it.
+    """
+    digest = hashlib.sha1()
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for name in sorted(files):
+            stat = os.stat(os.path.join(directory, name))
+            digest.update(f'{os.path.relpath(os.path.join(directory, name), root)}'
+                          f':{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()[:12]
+
+
+class Compression:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)  # 11 is for /assets/, built once
+        app.config.setdefault('COMPRESS_STREAM_FLUSH', 64 * 1024)
+        app.config.setdefault('CONDITIONAL_HTML', True)
+        app.extensions['compression'] = {'build': build_id(app.root_path), 'brotli': _brotli()}
+        app.after_request(self.process)
+
+    @staticmethod
+    def build():
+        return current_app.extensions['compression']['build']
+
+    def process(self, response):
+        config = current_app.config
+        if config['CONDITIONAL_HTML']:
+            response = self.conditional(response)
+        if config['COMPRESS_ENABLED']:
+            response = self.compress(response)
+        return response
+
+    @staticmethod
+    def conditional(response):
+        """Give a rendered HTML page a weak ETag and answer a matching If-None-Match with 304."""
+        if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+                or response.mimetype != 'text/html' or response.is_streamed
+                or response.direct_passthrough or 'ETag' in response.headers):
+            return response
+        response.add_etag(weak=True)
+        if not response.cache_control.max_age:
+            response.cache_control.no_cache = True  # Stored, but checked with the server every time
+        # The page differs per visitor (navigation bar, cart badge, messages)
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    def encoding(self):
+        """The encoding to send, by the client's Accept-Encoding preferences, or None."""
+        offered = ['br', 'gzip'] if current_app.extensions['compression']['brotli'] else ['gzip']
+        return request.accept_encodings.best_match(offered)
+
+    def compress(self, response):
+        config = current_app.config
+        if (response.mimetype not in config['COMPRESS_MIMETYPES'] or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 206, 304)):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.cache_control.no_transform:
+            return response
+        encoding = self.encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.iter_encoded(), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            if encoding == 'br':
+                data = current_app.extensions['compression']['brotli'].compress(
+                    data, quality=config['COMPRESS_BROTLI_QUALITY'])
+            else:
+                data = gzip.compress(data, config['COMPRESS_GZIP_LEVEL'], mtime=0)
+            response.set_data(data)
+        response.content_encoding = encoding
+        # A strong validator names exact bytes, which are now different
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    @staticmethod
+    def _stream(chunks, encoding):
+        config = current_app.config
+        flush_every = config['COMPRESS_STREAM_FLUSH']
+        if encoding == 'br':
+            compressor = current_app.extensions['compression']['brotli'].Compressor(
+                quality=config['COMPRESS_BROTLI_QUALITY'])
+            write, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            write, finish = compressor.compress, compressor.flush
+
+            def flush():
+                return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        # Read here, inside the request: the generator runs after the view returned
+        def generate():
+            pending = 0
+            for chunk in chunks:
+                pending += len(chunk)
+                data = write(chunk)
+                if pending >= flush_every:
+                    # Send what the client has waited for instead of letting
+                    # the compressor sit on it
+                    data += flush()
+                    pending = 0
+                if data:
+                    yield data
+            yield finish()
+
+        return generate()
+
+
+compression = Compression()
@@ -0,0 +1,77 @@
+import os
+from sqlalchemy.engine import make_url
+from app import db
+
+DEFAULT_DATABASE_URI = 'sqlite:///spequip.db'
+
+
+def _env_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def load_database_config(config, environ=os.environ):
+    """Read database settings from the environment into the app config.
+
+    DATABASE_URL selects the database; the DB_POOL_* variables tune the
+    connection pool of server databases and the SQLITE_* variables the
+    pragmas applied to every SQLite connection.
+    """
+    uri = environ.get('DATABASE_URL', DEFAULT_DATABASE_URI)
+    if uri.startswith('postgres://'):
+        # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    config['SQLALCHEMY_DATABASE_URI'] = uri
+
+    config['DB_POOL_SIZE'] = int(environ.get('DB_POOL_SIZE', 10))
+    config['DB_MAX_OVERFLOW'] = int(environ.get('DB_MAX_OVERFLOW', 20))
+    config['DB_POOL_TIMEOUT'] = int(environ.get('DB_POOL_TIMEOUT', 30))
+    config['DB_POOL_RECYCLE'] = int(environ.get('DB_POOL_RECYCLE', 1800))
+    config['DB_POOL_PRE_PING'] = _env_bool(environ.get('DB_POOL_PRE_PING', 'true'))
+
+    config['SQLITE_JOURNAL_MODE'] = environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    config['SQLITE_SYNCHRONOUS'] = environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    config['SQLITE_BUSY_TIMEOUT'] = int(environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(uri):
+    """Whether the database lives inside this one process."""
+    return is_sqlite(uri) and make_url(uri).database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        # The driver waits this long for a lock before raising "database is locked"
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def configure_engine(app):
+    """Apply the SQLite pragmas on every new connection."""
+    if not is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+
+    journal_mode = app.config['SQLITE_JOURNAL_MODE']
+    synchronous = app.config['SQLITE_SYNCHRONOUS']
+    busy_timeout = app.config['SQLITE_BUSY_TIMEOUT']
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout:d}')
+        cursor.close()
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'connect', set_sqlite_pragmas)
@@ -0,0 +1,138 @@
+"""
+Streaming CSV and NDJSON exports of orders and users for admins.
+
+Rows are read with `yield_per`, so the driver hands them over in batches
+instead of loading the whole result, and every line is written to the
+response as soon as it is formatted. Memory use does not grow with the
+number of rows exported. Plain column selects keep ORM objects, and the
+session identity map, out of the loop.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from app import db
+from app.models import User, Order, OrderItem, Product
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+ORDER_STATUSES = ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')
+EXPORT_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = ['order_id', 'created_at', 'status', 'total_amount', 'user_id', 'username', 'email']
+ITEM_COLUMNS = ['item_id', 'product_id', 'product_name', 'quantity', 'price']
+USER_COLUMNS = ['id', 'username', 'email', 'is_admin', 'created_at']
+
+
+class ExportError(ValueError):
+    """A filter value that cannot be applied; the message is shown to the admin."""
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def created_between(column, start, end):
+    """Conditions for `start <= column < end + 1 day` (both dates inclusive)."""
+    start, end = parse_day(start, 'start'), parse_day(end, 'end')
+    if start and end and start > end:
+        raise ExportError('start must not be after end')
+    conditions = []
+    if start:
+        conditions.append(column >= datetime.combine(start, datetime.min.time()))
+    if end:
+        conditions.append(column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return conditions
+
+
+def order_rows(start=None, end=None, status=None):
+    """One row per order line, ordered by order; orders without lines get a single row."""
+    conditions = created_between(Order.created_at, start, end)
+    if status:
+        if status not in ORDER_STATUSES:
+            raise ExportError(f"status must be one of: {', '.join(ORDER_STATUSES)}")
+        conditions.append(Order.status == status)
+    statement = (
+        db.select(Order.id, Order.created_at, Order.status, Order.total_amount,
+                  User.id, User.username, User.email,
+                  OrderItem.id, OrderItem.product_id, Product.name, OrderItem.quantity, OrderItem.price)
+        .join(User, User.id == Order.user_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(*conditions)
+        .order_by(Order.id, OrderItem.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    return db.session.execute(statement)
+
+
+def user_rows(start=None, end=None, role=None):
+    conditions = created_between(User.created_at, start, end)
+    if role:
+        if role not in ('admin', 'customer'):
+            raise ExportError('role must be admin or customer')
+        conditions.append(User.is_admin.is_(role == 'admin'))
+    statement = (
+        db.select(User.id, User.username, User.email, User.is_admin, User.created_at)
+        .where(*conditions)
+        .order_by(User.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    return db.session.execute(statement)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    return value
+
+
+def _csv_lines(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_value(value) for value in row])
+        # One formatted line at a time; the buffer never holds more than a line
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, default=_value, separators=(',', ':')) + '\n'
+
+
+def stream_orders(fmt, rows):
+    """Lines of the orders export: CSV repeats the order columns on every line."""
+    if fmt == 'csv':
+        return _csv_lines(ORDER_COLUMNS + ITEM_COLUMNS, rows)
+
+    def records():
+        for order_id, lines in groupby(rows, key=lambda row: row[0]):
+            lines = list(lines)  # The lines of one order
+            record = dict(zip(ORDER_COLUMNS, [_value(value) for value in lines[0][:7]]))
+            record['items'] = [dict(zip(ITEM_COLUMNS, line[7:])) for line in lines if line[7] is not None]
+            yield record
+    return _ndjson_lines(records())
+
+
+def stream_users(fmt, rows):
+    if fmt == 'csv':
+        return _csv_lines(USER_COLUMNS, rows)
+    return _ndjson_lines(dict(zip(USER_COLUMNS, [_value(value) for value in row])) for row in rows)
+
+
+def filename(kind, fmt):
+    return f"spequip-{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
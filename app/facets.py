@@ -0,0 +1,229 @@
+"""
+Faceted catalog filtering: category, price band, in-stock and minimum rating,
+and the catalog's sort orders.
+
+Facet counts are kept in the facet_count table: the number of products in
+each (category, price band, in stock, whole-star rating) cell. With a dozen
+categories that is a few hundred rows whatever the catalog size. The
+write paths record how each change moves products between cells, in the
+same transaction as the change (like app/metrics.py), and the cells are
+read once per catalog generation through the fragment cache. Counts for
+any combination of filters, including the listing's total, are summed
+from the cells in Python. `flask rebuild-facets` recomputes the table in
+one grouped query; run it after changing CATALOG_PRICE_BANDS.
+
+Each facet's counts apply the other facets' filters but not its own, so
+picking a category still shows how many products the other categories
+hold.
+
+Every sort in SORTS has an index on its column and one on (category,
+column), and the stored rating_avg and units_sold columns stand in for
+aggregates over reviews and orders, so a sorted page is a keyset range
+scan of an index, alone or within a category.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from flask import current_app
+from app import db
+from app.cache import fragment_cache
+from app.metrics import upsert_totals
+from app.models import Product, FacetCount
+
+RATING_OPTIONS = (4, 3, 2, 1)
+
+# ?sort= value -> label, keyset keys (id breaks ties) and direction;
+# without a sort the listing is in id order and search in relevance order
+SORTS = {
+    'newest': {'label': 'Newest', 'keys': [Product.created_at, Product.id], 'descending': True},
+    'price_asc': {'label': 'Price: Low to High', 'keys': [Product.price, Product.id], 'descending': False},
+    'price_desc': {'label': 'Price: High to Low', 'keys': [Product.price, Product.id], 'descending': True},
+    'rating': {'label': 'Best Rated', 'keys': [Product.rating_avg, Product.id], 'descending': True},
+    'bestselling': {'label': 'Best Selling', 'keys': [Product.units_sold, Product.id], 'descending': True},
+}
+
+
+def cell_of(category, price, stock, rating_sum, rating_count):
+    """The (category, price band, in stock, whole-star rating) cell of one product."""
+    bounds = current_app.config['CATALOG_PRICE_BANDS']
+    return (category, bisect_right(bounds, price), bool(stock and stock > 0),
+            rating_sum // rating_count if rating_count else 0)
+
+
+def cell(product):
+    return cell_of(product.category, product.price, product.stock_quantity,
+                   product.rating_sum or 0, product.rating_count or 0)
+
+
+class FacetChanges:
+    """Products moved between cells during one write, applied with one statement."""
+
+    def __init__(self):
+        self.deltas = defaultdict(int)
+
+    def move(self, old, new):
+        if old != new:
+            if old is not None:
+                self.deltas[old] -= 1
+            if new is not None:
+                self.deltas[new] += 1
+        return self
+
+    def save(self):
+        upsert_totals(FacetCount, ['category', 'band', 'in_stock', 'rating'], [
+            {'category': category, 'band': band, 'in_stock': in_stock, 'rating': rating, 'value': value}
+            for (category, band, in_stock, rating), value in self.deltas.items() if value
+        ])
+
+
+def product_added(product):
+    FacetChanges().move(None, cell(product)).save()
+
+
+def product_removed(product):
+    FacetChanges().move(cell(product), None).save()
+
+
+def product_changed(old_cell, product):
+    """Call after changing a product's category, price or stock; `old_cell` is cell() from before."""
+    FacetChanges().move(old_cell, cell(product)).save()
+
+
+def rating_added(product_id, rating):
+    """Call after Product.record_review(); the new aggregates are read in the same transaction."""
+    category, price, stock, rating_sum, rating_count = db.session.execute(
+        db.select(Product.category, Product.price, Product.stock_quantity,
+                  Product.rating_sum, Product.rating_count).where(Product.id == product_id)
+    ).one()
+    FacetChanges().move(cell_of(category, price, stock, rating_sum - rating, rating_count - 1),
+                        cell_of(category, price, stock, rating_sum, rating_count)).save()
+
+
+def rebuild():
+    """Recompute every cell from the product table in one grouped query; the caller commits."""
+    bounds = current_app.config['CATALOG_PRICE_BANDS']
+    band = db.case(*[(Product.price < bound, i) for i, bound in enumerate(bounds)], else_=len(bounds))
+    in_stock = db.func.coalesce(Product.stock_quantity, 0) > 0
+    rating = db.case((Product.rating_count == 0, 0), else_=Product.rating_sum // Product.rating_count)
+    query = db.select(Product.category, band.label('band'), in_stock.label('in_stock'),
+                      rating.label('rating'), db.func.count()) \
+        .group_by(Product.category, 'band', 'in_stock', 'rating')
+    rows = [{'category': category, 'band': band, 'in_stock': bool(in_stock), 'rating': rating, 'value': value}
+            for category, band, in_stock, rating, value in db.session.execute(query)]
+    db.session.execute(db.delete(FacetCount))
+    if rows:
+        db.session.execute(db.insert(FacetCount), rows)
+
+
+def read_cells():
+    return [(row.category, row.band, row.in_stock, row.rating, row.value)
+            for row in db.session.execute(db.select(FacetCount)).scalars() if row.value > 0]
+
+
+class CatalogFilters:
+    """The facet filters and sort picked in a catalog URL; unknown values are ignored."""
+
+    def __init__(self, category=None, price=None, in_stock=False, min_rating=None, sort=None):
+        self.category = category
+        self.price = price  # Index into CatalogFacets.price_bands()
+        self.in_stock = in_stock
+        self.min_rating = min_rating
+        self.sort = sort  # Key of SORTS
+
+    @classmethod
+    def from_args(cls, args):
+        bands = [band['key'] for band in catalog_facets.price_bands()]
+        price = args.get('price')
+        rating = args.get('rating', type=int)
+        return cls(
+            category=args.get('category') or None,
+            price=bands.index(price) if price in bands else None,
+            in_stock=args.get('in_stock') == '1',
+            min_rating=rating if rating in RATING_OPTIONS else None,
+            sort=args.get('sort') if args.get('sort') in SORTS else None,
+        )
+
+    @property
+    def active(self):
+        return bool(self.category or self.price is not None or self.in_stock or self.min_rating)
+
+    def apply(self, query):
+        sort_column = self.ordering['keys'][0] if self.ordering else Product.id
+
+        def unindexed(column):
+            # A range on a column the page is not sorted by would let SQLite
+            # read that whole range through its index and sort it; written
+            # as column + 0 it is checked while walking the sort's index
+            return column if column is sort_column else column + db.literal_column('0')
+
+        if self.category:
+            query = query.filter(Product.category == self.category)
+        if self.price is not None:
+            band = catalog_facets.price_bands()[self.price]
+            query = query.filter(unindexed(Product.price) >= band['low'])
+            if band['high'] is not None:
+                query = query.filter(unindexed(Product.price) < band['high'])
+        if self.in_stock:
+            query = query.filter(Product.stock_quantity > 0)
+        if self.min_rating:
+            query = query.filter(unindexed(Product.rating_avg) >= self.min_rating)
+        return query
+
+    @property
+    def ordering(self):
+        """The SORTS entry picked, or None for the default order."""
+        return SORTS.get(self.sort)
+
+
+class CatalogFacets:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Upper bounds of the price bands; the last band is open-ended
+        app.config.setdefault('CATALOG_PRICE_BANDS', (500, 1000, 2500, 5000, 10000))
+
+    @staticmethod
+    def price_bands():
+        bounds = current_app.config['CATALOG_PRICE_BANDS']
+        edges = [0, *bounds, None]
+        return [{'key': f"{low}-{'' if high is None else high}", 'low': low, 'high': high}
+                for low, high in zip(edges, edges[1:])]
+
+    @staticmethod
+    def cells():
+        return fragment_cache.memoize('facets', read_cells)
+
+    def counts(self, filters):
+        """Counts for every facet option under `filters`, and the matching total."""
+        counts = {
+            'categories': {},
+            'prices': [0] * len(self.price_bands()),
+            'in_stock': 0,
+            'ratings': dict.fromkeys(RATING_OPTIONS, 0),
+            'total': 0,
+        }
+        for category, band, in_stock, rating, count in self.cells():
+            category_ok = not filters.category or category == filters.category
+            price_ok = filters.price is None or band == filters.price
+            stock_ok = not filters.in_stock or in_stock
+            rating_ok = not filters.min_rating or rating >= filters.min_rating
+            counts['categories'].setdefault(category, 0)
+            if price_ok and stock_ok and rating_ok:
+                counts['categories'][category] += count
+            if category_ok and stock_ok and rating_ok and band < len(counts['prices']):
+                counts['prices'][band] += count
+            if category_ok and price_ok and rating_ok and in_stock:
+                counts['in_stock'] += count
+            if category_ok and price_ok and stock_ok:
+                for option in RATING_OPTIONS:
+                    if rating >= option:
+                        counts['ratings'][option] += count
+            if category_ok and price_ok and stock_ok and rating_ok:
+                counts['total'] += count
+        counts['categories'] = dict(sorted(counts['categories'].items()))
+        return counts
+
+
+catalog_facets = CatalogFacets()
@@ -1,5 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, TextAreaField, FloatField, IntegerField, SelectField, HiddenField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, SubmitField, TextAreaField, FloatField, IntegerField, SelectField, HiddenField, \
+    BooleanField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange
 
 class LoginForm(FlaskForm):
@@ -33,6 +35,9 @@ class ProductForm(FlaskForm):
         ('other', 'Other')
     ], validators=[DataRequired()])
     image_url = StringField('Image URL')
+    image_file = FileField('Upload Image', validators=[
+        FileAllowed(['jpg', 'jpeg', 'png', 'webp', 'gif'], 'Upload a JPEG, PNG, WebP or GIF image')
+    ])
     stock_quantity = IntegerField('Stock Quantity', validators=[DataRequired(), NumberRange(min=0)])
     submit = SubmitField('Save Product')
 
@@ -57,3 +62,10 @@ class UpdateOrderStatusForm(FlaskForm):
         ('cancelled', 'Cancelled')
     ], validators=[DataRequired()])
     submit = SubmitField('Update Status')
+
+class ImportProductsForm(FlaskForm):
+    file = FileField('Catalog File', validators=[
+        FileRequired(), FileAllowed(['csv', 'json', 'ndjson'], 'Upload a .csv, .json or .ndjson file')
+    ])
+    dry_run = BooleanField('Validate only (do not save)')
+    submit = SubmitField('Import Products')
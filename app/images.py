@@ -0,0 +1,269 @@
+"""
+Product image thumbnails.
+
+An ingested image is stored as a set of resized copies, one per width in
+IMAGE_WIDTHS, each in WebP and JPEG. Files are named after a hash of the
+source image (`<key>-<width>w.<ext>`), so a URL always names the same
+bytes and can be cached by browsers for a year. The key is stored in
+Product.image_key; templates build `srcset` lists from it with the
+`product_image` macro.
+
+Resizing needs the optional Pillow package. Bulk jobs (`flask
+process-product-images`) spread the work over a process pool. An admin
+upload is only checked in the request and kept under IMAGE_DIR/uploads;
+the 'product_images.render' background job resizes it and then switches
+the product over to the new thumbnails.
+"""
+
+import hashlib
+import io
+import os
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app, url_for
+from app import db
+from app.jobs import job
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+DOWNLOAD_TIMEOUT = 20
+
+
+class ImageError(ValueError):
+    """An upload or source file that is not a usable image."""
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise RuntimeError('Product thumbnails need the Pillow package: pip install Pillow')
+    return Image, ImageOps
+
+
+def image_key(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def variant_name(key, width, fmt):
+    return f'{key}-{width}w.{"jpg" if fmt == "jpeg" else fmt}'
+
+
+def render_variants(data, key, directory, widths, quality):
+    """Write every width/format of one image; runs in a worker process.
+
+    Returns the key. Images narrower than a width are not scaled up, so
+    the larger names hold the original size.
+    """
+    Image, ImageOps = _pil()
+    try:
+        source = Image.open(io.BytesIO(data))
+        source.load()
+    except Exception as e:
+        raise ImageError(f'Not a readable image: {e}')
+    source = ImageOps.exif_transpose(source)
+    if source.mode in ('RGBA', 'LA', 'P'):
+        # JPEG has no alpha channel; flatten transparent PNGs onto white
+        rgba = source.convert('RGBA')
+        source = Image.new('RGB', rgba.size, 'white')
+        source.paste(rgba, mask=rgba.getchannel('A'))
+    elif source.mode != 'RGB':
+        source = source.convert('RGB')
+
+    os.makedirs(directory, exist_ok=True)
+    for width in widths:
+        image = source
+        if source.width > width:
+            image = source.resize((width, max(1, round(source.height * width / source.width))),
+                                  Image.LANCZOS)
+        for fmt, pil_format in FORMATS.items():
+            path = os.path.join(directory, variant_name(key, width, fmt))
+            options = {'quality': quality, 'method': 4} if fmt == 'webp' else \
+                {'quality': quality, 'optimize': True, 'progressive': True}
+            # Write then rename, so a half-written file is never served
+            temp = f'{path}.{os.getpid()}.tmp'
+            image.save(temp, pil_format, **options)
+            os.replace(temp, path)
+    return key
+
+
+def _render_job(job):
+    product_id, data, directory, widths, quality = job
+    try:
+        return product_id, render_variants(data, image_key(data), directory, widths, quality), None
+    except ImageError as e:
+        return product_id, None, str(e)
+
+
+class ProductImages:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_DIR', os.path.join(app.instance_path, 'product-images'))
+        app.config.setdefault('IMAGE_WIDTHS', (160, 320, 640, 1024))
+        app.config.setdefault('IMAGE_QUALITY', 80)
+        app.config.setdefault('IMAGE_WORKERS', None)  # None: one per CPU
+        app.config.setdefault('IMAGE_MAX_AGE', 365 * 24 * 3600)
+        app.add_template_global(self.sources, 'product_image_sources')
+
+    @staticmethod
+    def _settings():
+        config = current_app.config
+        return config['IMAGE_DIR'], tuple(sorted(config['IMAGE_WIDTHS'])), config['IMAGE_QUALITY']
+
+    def has_variants(self, key):
+        directory, widths, _ = self._settings()
+        return all(os.path.exists(os.path.join(directory, variant_name(key, width, fmt)))
+                   for width in widths for fmt in FORMATS)
+
+    def ingest(self, data):
+        """Resize one image in this process and return its key."""
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ImageError('Image is larger than 20 MB')
+        key = image_key(data)
+        if not self.has_variants(key):
+            directory, widths, quality = self._settings()
+            render_variants(data, key, directory, widths, quality)
+        return key
+
+    def accept(self, data):
+        """Check an upload and keep it for the resize job; returns its key.
+
+        Only the image header is decoded here. Uploads whose thumbnails
+        already exist are not kept.
+        """
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ImageError('Image is larger than 20 MB')
+        Image, _ = _pil()
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.verify()
+        except Exception as e:
+            raise ImageError(f'Not a readable image: {e}')
+        key = image_key(data)
+        if not self.has_variants(key):
+            path = self.upload_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f'{path}.{os.getpid()}.tmp'
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)
+        return key
+
+    @staticmethod
+    def upload_path(key):
+        return os.path.join(current_app.config['IMAGE_DIR'], 'uploads', key)
+
+    def ingest_many(self, sources, workers=None):
+        """Resize (product_id, bytes) pairs in a process pool.
+
+        Yields (product_id, key, error) as each image finishes; images whose
+        variants already exist are not rendered again.
+        """
+        directory, widths, quality = self._settings()
+        jobs = []
+        for product_id, data in sources:
+            key = image_key(data)
+            if self.has_variants(key):
+                yield product_id, key, None
+            else:
+                jobs.append((product_id, data, directory, widths, quality))
+        if not jobs:
+            return
+        _pil()  # Fail here, not once per worker, when Pillow is missing
+        workers = workers or current_app.config['IMAGE_WORKERS']
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_render_job, jobs, chunksize=4)
+
+    @staticmethod
+    def largest_url(key):
+        width = max(current_app.config['IMAGE_WIDTHS'])
+        return url_for('main.product_image_file', filename=variant_name(key, width, 'jpeg'))
+
+    def sources(self, product):
+        """src/srcset values for a product's thumbnails, or None without an ingested image."""
+        key = getattr(product, 'image_key', None)
+        if not key:
+            return None
+        widths = sorted(current_app.config['IMAGE_WIDTHS'])
+
+        def srcset(fmt):
+            return ', '.join(f"{url_for('main.product_image_file', filename=variant_name(key, width, fmt))} {width}w"
+                             for width in widths)
+        return {
+            'src': url_for('main.product_image_file', filename=variant_name(key, widths[len(widths) // 2], 'jpeg')),
+            'largest': self.largest_url(key),
+            'webp': srcset('webp'),
+            'jpeg': srcset('jpeg'),
+        }
+
+
+@job('product_images.render')
+def render_upload(key, image_url):
+    """Resize a kept upload and show it on the products waiting for it."""
+    from app.models import Product
+    from app.cache import fragment_cache
+
+    if not product_images.has_variants(key):
+        directory, widths, quality = product_images._settings()
+        with open(product_images.upload_path(key), 'rb') as f:
+            render_variants(f.read(), key, directory, widths, quality)
+    waiting = db.session.execute(
+        db.update(Product).where(Product.image_pending == key)
+        .values(image_key=key, image_url=image_url, image_pending=None)
+    ).rowcount
+    db.session.commit()
+    if waiting:
+        fragment_cache.bump()
+    try:
+        os.remove(product_images.upload_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def read_source(location, static_folder=None, download=False):
+    """Bytes of an image given as a local path or, with download, an http(s) URL.
+
+    Returns None for a location that is neither (for example the default
+    placeholder name).
+    """
+    if location.startswith(('http://', 'https://')):
+        if not download:
+            return None
+        request = urllib.request.Request(location, headers={'User-Agent': 'SpEquip image importer'})
+        with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    else:
+        candidates = [location]
+        if static_folder:
+            candidates.append(os.path.join(static_folder, location.lstrip('/').removeprefix('static/')))
+        path = next((p for p in candidates if os.path.isfile(p)), None)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            data = f.read(MAX_SOURCE_BYTES + 1)
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ImageError('Image is larger than 20 MB')
+    return data
+
+
+def read_sources(locations, static_folder=None, download=False, threads=8):
+    """Fetch many sources concurrently (downloads are I/O bound).
+
+    `locations` is a list of (product_id, location); yields
+    (product_id, bytes or None, error or None).
+    """
+    def fetch(item):
+        product_id, location = item
+        try:
+            return product_id, read_source(location, static_folder, download), None
+        except (OSError, ImageError) as e:
+            return product_id, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        yield from pool.map(fetch, locations)
+
+
+product_images = ProductImages()
@@ -0,0 +1,265 @@
+"""
+Background jobs: work a request causes but does not have to wait for.
+
+A route enqueues a job in its own transaction (`jobs.enqueue(name,
+payload)`), so the job is stored exactly when the change that needs it
+commits and disappears with it on rollback. Workers started with `flask
+jobs-worker` poll the job table, claim due jobs one at a time with a
+single UPDATE and run the handler registered for the name with @job.
+The queue is the application database itself; there is no broker.
+
+A handler that raises is retried up to JOBS_MAX_ATTEMPTS times, waiting
+JOBS_RETRY_BACKOFF seconds and doubling the wait each time, then marked
+'failed'. A job whose worker died stays 'running' until its lease
+(JOBS_LEASE seconds) runs out and another worker takes it over, so every
+job runs at least once and handlers must be safe to run again. A job
+enqueued with an idempotency key is added only if no other job kept in
+the table (done and failed jobs are kept for JOBS_RETENTION seconds)
+has that key.
+
+With JOBS_EAGER set, jobs enqueued during a request run in the web
+process after the route returns. Tests and a development server without
+a worker use it.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, g
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.checkout import is_lock_contention
+
+logger = logging.getLogger('spequip.jobs')
+
+HANDLERS = {}
+
+
+def job(name):
+    """Register a job handler; it is called with the payload as keyword arguments."""
+    def decorator(func):
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_EAGER', os.environ.get('SPEQUIP_JOBS_EAGER') == '1')
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_RETRY_BACKOFF', 10)
+        app.config.setdefault('JOBS_LEASE', 15 * 60)
+        app.config.setdefault('JOBS_RETENTION', 7 * 24 * 3600)
+        app.after_request(self._run_eager)
+
+    def enqueue(self, name, payload=None, key=None, delay=0, max_attempts=None):
+        """Add a job to the current transaction; it becomes due once that commits.
+
+        Returns False, adding nothing, when another job already has `key`.
+        """
+        from app.models import Job
+
+        if name not in HANDLERS:
+            raise LookupError(f'No handler for job {name!r}')
+        row = {
+            'name': name,
+            'payload': json.dumps(payload or {}),
+            'idempotency_key': key,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+            'run_at': datetime.utcnow() + timedelta(seconds=delay),
+            'created_at': datetime.utcnow(),
+        }
+        dialect = db.session.get_bind().dialect.name
+        if key is None:
+            db.session.execute(db.insert(Job), [row])
+            added = True
+        elif dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            added = db.session.execute(
+                insert(Job).values(**row).on_conflict_do_nothing(index_elements=['idempotency_key'])
+            ).rowcount == 1
+        else:
+            added = db.session.execute(db.select(Job.id).where(Job.idempotency_key == key)).first() is None
+            if added:
+                db.session.execute(db.insert(Job), [row])
+        if added and current_app.config['JOBS_EAGER']:
+            g.jobs_enqueued = True
+        return added
+
+    def _run_eager(self, response):
+        if g.pop('jobs_enqueued', False):
+            db.session.rollback()  # Whatever the route did not commit is dropped, as at teardown
+            self.work(until_idle=True)
+        return response
+
+    def claim(self, worker):
+        """Mark the next due job (or one whose lease ran out) as running and return it.
+
+        Returns None when no job is due, and False when the database stayed
+        locked by other writers.
+        """
+        from app.models import Job
+
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=current_app.config['JOBS_LEASE'])
+        is_abandoned = db.and_(Job.status == 'running', Job.locked_at < expired)
+        is_due = db.and_(Job.status == 'queued', Job.run_at <= now)
+        # SKIP LOCKED (where supported, e.g. PostgreSQL) lets concurrent
+        # workers pass over a job another one is claiming; SQLite runs one
+        # write at a time anyway
+        abandoned = db.select(Job.id).where(is_abandoned).limit(1) \
+            .with_for_update(skip_locked=True).scalar_subquery()
+        due = db.select(Job.id).where(is_due).order_by(Job.run_at, Job.id).limit(1) \
+            .with_for_update(skip_locked=True).scalar_subquery()
+        # One statement picks and locks the job. The outer condition is
+        # checked again against the row as it is when updated, so a job
+        # another worker claimed first is never claimed twice.
+        try:
+            claimed = db.session.execute(
+                db.update(Job).where(Job.id == db.func.coalesce(abandoned, due), db.or_(is_abandoned, is_due))
+                .values(status='running', locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+                .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+            ).first()
+            db.session.commit()
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_lock_contention(e):
+                raise
+            # Another worker held the write lock past the busy timeout
+            return False
+        return claimed
+
+    def execute(self, claimed, worker):
+        """Run a claimed job; a success is recorded with the handler's own changes."""
+        from app.models import Job
+
+        job_id, name, payload, attempts, max_attempts = claimed
+        started = time.perf_counter()
+        try:
+            handler = HANDLERS.get(name)
+            if handler is None:
+                raise LookupError(f'No handler for job {name!r}')
+            handler(**json.loads(payload))
+            db.session.execute(
+                db.update(Job).where(Job.id == job_id, Job.locked_by == worker)
+                .values(status='done', finished_at=datetime.utcnow(), last_error=None)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = f'{type(e).__name__}: {e}'
+            retry = attempts < max_attempts and not isinstance(e, LookupError)
+            delay = current_app.config['JOBS_RETRY_BACKOFF'] * 2 ** (attempts - 1)
+            values = {'last_error': error[:2000]}
+            if retry:
+                values.update(status='queued', run_at=datetime.utcnow() + timedelta(seconds=delay))
+            else:
+                values.update(status='failed', finished_at=datetime.utcnow())
+            # As on success, a worker whose lease was taken over leaves the job to its new owner
+            owned = db.session.execute(
+                db.update(Job).where(Job.id == job_id, Job.locked_by == worker).values(**values)
+            ).rowcount
+            db.session.commit()
+            if not owned:
+                logger.warning('job %s %s failed after its lease was taken over: %s', job_id, name, error)
+                return False
+            logger.warning('job %s %s (attempt %d/%d) failed: %s%s', job_id, name, attempts, max_attempts,
+                           error, f'; retrying in {delay}s' if retry else '', exc_info=not retry)
+            return False
+        logger.info('job %s %s done in %.0f ms', job_id, name, (time.perf_counter() - started) * 1000)
+        return True
+
+    def work(self, worker=None, until_idle=False, max_jobs=None, stop=None):
+        """Claim and run jobs in this process; returns how many ran.
+
+        Without `until_idle` the loop polls every JOBS_POLL_INTERVAL seconds
+        until `stop` (a threading.Event) is set.
+        """
+        worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+        ran = 0
+        while not (stop and stop.is_set()):
+            claimed = self.claim(worker)
+            if claimed is None and until_idle:
+                break
+            if not claimed:
+                (stop or threading.Event()).wait(current_app.config['JOBS_POLL_INTERVAL'])
+                continue
+            self.execute(claimed, worker)
+            ran += 1
+            if max_jobs and ran >= max_jobs:
+                break
+        return ran
+
+    def run_workers(self, app, processes, until_idle=False):
+        """Run `processes` worker processes until they are interrupted (or idle)."""
+        if processes <= 1:
+            with app.app_context():
+                return _work(self, until_idle)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        forked = context.get_start_method() == 'fork'
+        with app.app_context():
+            db.engine.dispose()  # Connections are not shared with the children
+        children = [context.Process(target=_worker_process, args=(app if forked else None, until_idle),
+                                    name=f'jobs-worker-{i}') for i in range(processes)]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()  # SIGTERM: each finishes its current job first
+            for child in children:
+                child.join()
+
+    def purge(self):
+        """Delete done and failed jobs older than JOBS_RETENTION; the caller commits."""
+        from app.models import Job
+
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOBS_RETENTION'])
+        return db.session.execute(
+            db.delete(Job).where(Job.status.in_(['done', 'failed']), Job.finished_at < cutoff)
+        ).rowcount
+
+    def counts(self):
+        from app.models import Job
+
+        return dict(db.session.execute(db.select(Job.status, db.func.count()).group_by(Job.status)).all())
+
+
+def _work(queue, until_idle):
+    # SIGTERM and Ctrl-C let the current job finish, then stop the loop
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+    return queue.work(until_idle=until_idle, stop=stop)
+
+
+def _worker_process(app, until_idle):
+    if app is None:
+        from app import create_app
+        app = create_app()
+    with app.app_context():
+        _work(jobs, until_idle)
+
+
+jobs = JobQueue()
@@ -0,0 +1,273 @@
+"""
+Precomputed counters and daily rollups for the admin pages.
+
+The write routes record the effect of each change with the helpers below,
+in the same transaction as the change itself, so the counters stay exact
+and the admin pages read them with one small query instead of counting
+rows. `flask rebuild-metrics` recomputes everything from the source tables.
+
+Counters: products.total, products.stock.{ok,low,out}, orders.total,
+orders.status.<status>, users.total, users.admins, users.customers.
+Daily rollups: orders.count, orders.revenue (cancelled orders excluded)
+and users.new. Per user, the user_order_summary table holds the number of
+orders, the lifetime spend (cancelled orders excluded) and the date of
+the last order.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from app import db
+from app.models import User, Product, Order, MetricCounter, DailyMetric, UserOrderSummary
+
+LOW_STOCK_THRESHOLD = 10  # Products with 1-10 units left count as low stock
+
+
+def stock_band(quantity):
+    if not quantity or quantity <= 0:
+        return 'out'
+    if quantity <= LOW_STOCK_THRESHOLD:
+        return 'low'
+    return 'ok'
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def upsert_totals(model, keys, rows):
+    """Add each row's value to the stored one, creating missing rows."""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys, set_={'value': model.value + statement.excluded.value}
+        )
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            db.update(model)
+            .where(*[getattr(model, key) == row[key] for key in keys])
+            .values(value=model.value + row['value'])
+        )
+        if not result.rowcount:
+            db.session.execute(db.insert(model).values(**row))
+
+
+def upsert_user_summaries(rows):
+    """Add each row's order count and spend to the user's summary, keeping the later last order."""
+    if not rows:
+        return
+    model = UserOrderSummary
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(model)
+        new = statement.excluded
+        statement = statement.on_conflict_do_update(index_elements=['user_id'], set_={
+            'order_count': model.order_count + new.order_count,
+            'total_spent': model.total_spent + new.total_spent,
+            'last_order_at': db.case((model.last_order_at.is_(None), new.last_order_at),
+                                     (new.last_order_at > model.last_order_at, new.last_order_at),
+                                     else_=model.last_order_at),
+        })
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            db.update(model).where(model.user_id == row['user_id']).values(
+                order_count=model.order_count + row['order_count'],
+                total_spent=model.total_spent + row['total_spent'],
+                last_order_at=db.case((model.last_order_at.is_(None), row['last_order_at']),
+                                      (model.last_order_at < row['last_order_at'], row['last_order_at']),
+                                      else_=model.last_order_at),
+            )
+        )
+        if not result.rowcount:
+            db.session.execute(db.insert(model).values(**row))
+
+
+class MetricChanges:
+    """Deltas collected during one write, applied with one statement per table."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.daily = defaultdict(float)
+        self.users = {}
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+        return self
+
+    def count_daily(self, day, name, amount=1):
+        self.daily[day, name] += amount
+        return self
+
+    def count_user(self, user_id, orders=0, spent=0, ordered_at=None):
+        """Add to a user's order summary; `ordered_at` replaces an older last order date."""
+        summary = self.users.setdefault(user_id, {'user_id': user_id, 'order_count': 0,
+                                                  'total_spent': 0.0, 'last_order_at': None})
+        summary['order_count'] += orders
+        summary['total_spent'] += spent
+        if ordered_at and (summary['last_order_at'] is None or ordered_at > summary['last_order_at']):
+            summary['last_order_at'] = ordered_at
+        return self
+
+    def save(self):
+        upsert_user_summaries(list(self.users.values()))
+        upsert_totals(MetricCounter, ['name'], [
+            {'name': name, 'value': value} for name, value in self.counters.items() if value
+        ])
+        upsert_totals(DailyMetric, ['day', 'name'], [
+            {'day': day, 'name': name, 'value': value} for (day, name), value in self.daily.items() if value
+        ])
+
+
+def product_added(stock):
+    MetricChanges().count('products.total').count(f'products.stock.{stock_band(stock)}').save()
+
+
+def product_removed(stock):
+    MetricChanges().count('products.total', -1).count(f'products.stock.{stock_band(stock)}', -1).save()
+
+
+def stock_changes(changes, old_stock, new_stock):
+    """Move a product between stock bands; `changes` is a MetricChanges."""
+    old_band, new_band = stock_band(old_stock), stock_band(new_stock)
+    if old_band != new_band:
+        changes.count(f'products.stock.{old_band}', -1).count(f'products.stock.{new_band}')
+    return changes
+
+
+def stock_changed(old_stock, new_stock):
+    stock_changes(MetricChanges(), old_stock, new_stock).save()
+
+
+def order_placed(changes, order):
+    day = _day(order.created_at)
+    changes.count('orders.total').count(f'orders.status.{order.status or "pending"}')
+    changes.count_daily(day, 'orders.count').count_daily(day, 'orders.revenue', order.total_amount)
+    spent = 0 if order.status == 'cancelled' else order.total_amount
+    changes.count_user(order.user_id, 1, spent, order.created_at or datetime.utcnow())
+    return changes
+
+
+def order_status_changed(order, old_status):
+    if old_status == order.status:
+        return
+    changes = MetricChanges()
+    changes.count(f'orders.status.{old_status}', -1).count(f'orders.status.{order.status}')
+    # Revenue leaves the daily rollup when an order is cancelled, and comes back if it is reinstated
+    day = _day(order.created_at)
+    if order.status == 'cancelled':
+        changes.count_daily(day, 'orders.revenue', -order.total_amount)
+        changes.count_user(order.user_id, spent=-order.total_amount)
+    elif old_status == 'cancelled':
+        changes.count_daily(day, 'orders.revenue', order.total_amount)
+        changes.count_user(order.user_id, spent=order.total_amount)
+    changes.save()
+
+
+def user_registered(user):
+    role = 'users.admins' if user.is_admin else 'users.customers'
+    MetricChanges().count('users.total').count(role).count_daily(_day(user.created_at), 'users.new').save()
+
+
+def user_admin_changed(user):
+    """Call after flipping user.is_admin."""
+    sign = 1 if user.is_admin else -1
+    MetricChanges().count('users.admins', sign).count('users.customers', -sign).save()
+
+
+def read_counters():
+    """Every counter in one query; missing counters read as 0."""
+    counters = defaultdict(int)
+    for name, value in db.session.execute(db.select(MetricCounter.name, MetricCounter.value)):
+        counters[name] = int(value) if float(value).is_integer() else value
+    return counters
+
+
+def read_daily(days=7, today=None):
+    """Daily rollups for the last `days` days, newest first, with gaps filled in."""
+    today = today or datetime.utcnow().date()
+    first = today - timedelta(days=days - 1)
+    values = defaultdict(dict)
+    rows = db.session.execute(
+        db.select(DailyMetric.day, DailyMetric.name, DailyMetric.value).where(DailyMetric.day >= first)
+    )
+    for day, name, value in rows:
+        values[day][name] = value
+    return [{'day': day,
+             'orders': int(values[day].get('orders.count', 0)),
+             'revenue': values[day].get('orders.revenue', 0.0),
+             'new_users': int(values[day].get('users.new', 0))}
+            for day in (today - timedelta(days=offset) for offset in range(days))]
+
+
+def rebuild_user_summaries():
+    """Recompute every user's order summary in one grouped INSERT ... SELECT; the caller commits."""
+    spent = db.func.sum(db.case((Order.status == 'cancelled', 0), else_=Order.total_amount))
+    db.session.execute(db.delete(UserOrderSummary))
+    db.session.execute(db.insert(UserOrderSummary).from_select(
+        ['user_id', 'order_count', 'total_spent', 'last_order_at'],
+        db.select(Order.user_id, db.func.count(), db.func.coalesce(spent, 0), db.func.max(Order.created_at))
+        .group_by(Order.user_id)
+    ))
+
+
+def rebuild():
+    """Recompute every counter, rollup and user summary from the source tables; the caller commits."""
+    db.session.execute(db.delete(MetricCounter))
+    db.session.execute(db.delete(DailyMetric))
+    rebuild_user_summaries()
+    changes = MetricChanges()
+
+    stock = db.case(
+        (db.func.coalesce(Product.stock_quantity, 0) <= 0, 'out'),
+        (Product.stock_quantity <= LOW_STOCK_THRESHOLD, 'low'),
+        else_='ok',
+    )
+    for band, total in db.session.execute(db.select(stock, db.func.count()).group_by(stock)):
+        changes.count('products.total', total).count(f'products.stock.{band}', total)
+
+    status = db.func.coalesce(Order.status, 'pending')
+    for name, total in db.session.execute(db.select(status, db.func.count()).group_by(status)):
+        changes.count('orders.total', total).count(f'orders.status.{name}', total)
+
+    day = db.func.date(Order.created_at)
+    revenue = db.func.sum(db.case((Order.status == 'cancelled', 0), else_=Order.total_amount))
+    for value, total, amount in db.session.execute(
+        db.select(day, db.func.count(), revenue).group_by(day)
+    ):
+        changes.count_daily(_parse_day(value), 'orders.count', total)
+        changes.count_daily(_parse_day(value), 'orders.revenue', amount or 0)
+
+    for is_admin, total in db.session.execute(
+        db.select(db.func.coalesce(User.is_admin, False), db.func.count()).group_by(User.is_admin)
+    ):
+        changes.count('users.total', total).count('users.admins' if is_admin else 'users.customers', total)
+
+    day = db.func.date(User.created_at)
+    for value, total in db.session.execute(db.select(day, db.func.count()).group_by(day)):
+        changes.count_daily(_parse_day(value), 'users.new', total)
+
+    changes.save()
+
+
+def _parse_day(value):
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
@@ -0,0 +1,383 @@
+"""
+Schema migrations for existing databases.
+
+New databases get the full schema from db.create_all(); these steps bring
+older databases up to the same schema. Every migration is idempotent, so
+running them against a freshly created database only records the version.
+Apply pending migrations with `flask db-upgrade`.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+
+MIGRATIONS = []
+
+# Migrations work on the tables as they were at their own version, never
+# through the models, which describe the latest schema. Tables a migration
+# creates are snapshots of that version's model; the rows it fills in are
+# read and written through these lightweight tables.
+snapshots = db.MetaData()
+db.Table('user', snapshots, db.Column('id', db.Integer, primary_key=True))  # Target of foreign keys
+
+user_table = db.table(
+    'user', db.column('id', db.Integer), db.column('is_admin', db.Boolean), db.column('created_at', db.DateTime),
+)
+product_table = db.table(
+    'product', db.column('id', db.Integer), db.column('category', db.String), db.column('price', db.Float),
+    db.column('stock_quantity', db.Integer), db.column('rating_sum', db.Integer),
+    db.column('rating_count', db.Integer), db.column('rating_avg', db.Float), db.column('units_sold', db.Integer),
+    db.column('created_at', db.DateTime),
+)
+order_table = db.table(
+    'order', db.column('id', db.Integer), db.column('user_id', db.Integer), db.column('total_amount', db.Float),
+    db.column('status', db.String), db.column('created_at', db.DateTime),
+)
+order_item_table = db.table(
+    'order_item', db.column('order_id', db.Integer), db.column('product_id', db.Integer),
+    db.column('quantity', db.Integer),
+)
+cart_item_table = db.table(
+    'cart_item', db.column('id', db.Integer), db.column('user_id', db.Integer),
+    db.column('product_id', db.Integer), db.column('quantity', db.Integer),
+)
+review_table = db.table(
+    'review', db.column('id', db.Integer), db.column('user_id', db.Integer),
+    db.column('product_id', db.Integer), db.column('rating', db.Integer),
+)
+wishlist_table = db.table(
+    'wishlist', db.column('id', db.Integer), db.column('user_id', db.Integer), db.column('product_id', db.Integer),
+)
+
+schema_version = db.Table(
+    'schema_version', db.metadata,
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+
+def migration(version, description):
+    """Register a migration step; steps run in version order."""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return decorator
+
+
+def add_missing_columns(table_name, columns):
+    """Add the columns (db.Column objects) that an older database's table lacks.
+
+    Returns the names of the columns that were added.
+    """
+    connection = db.session.connection()
+    existing = {col['name'] for col in db.inspect(connection).get_columns(table_name)}
+    added = []
+    for column in columns:
+        if column.name in existing:
+            continue
+        ddl = f'ALTER TABLE "{table_name}" ADD COLUMN {column.name} ' \
+              f'{column.type.compile(dialect=connection.dialect)}'
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+        connection.execute(db.text(ddl))
+        added.append(column.name)
+    return added
+
+
+def create_missing_indexes(table_name, indexes):
+    """Create the (name, columns, unique) indexes that the database lacks."""
+    connection = db.session.connection()
+    for name, columns, unique in indexes:
+        table = db.Table(table_name, db.MetaData(), *[db.Column(column) for column in columns])
+        db.Index(name, *table.c, unique=unique).create(bind=connection, checkfirst=True)
+
+
+def delete_duplicates(table, *columns):
+    """Keep the oldest row for each combination of columns, delete the rest."""
+    keep = db.select(db.func.min(table.c.id)).group_by(*[table.c[c] for c in columns])
+    return db.session.execute(db.delete(table).where(table.c.id.not_in(keep))).rowcount
+
+
+def refresh_rating_sums():
+    """Recompute rating_sum and rating_count (version 1) from the reviews."""
+    product, review = product_table.c, review_table.c
+    db.session.execute(db.update(product_table).values(
+        rating_sum=db.select(db.func.coalesce(db.func.sum(review.rating), 0))
+        .where(review.product_id == product.id).scalar_subquery(),
+        rating_count=db.select(db.func.count(review.id)).where(review.product_id == product.id).scalar_subquery(),
+    ))
+
+
+@migration(1, 'Add product rating aggregates')
+def add_rating_aggregates():
+    if add_missing_columns('product', [
+        db.Column('rating_sum', db.Integer, server_default='0'),
+        db.Column('rating_count', db.Integer, server_default='0'),
+    ]):
+        refresh_rating_sums()
+
+
+@migration(2, 'Index foreign keys and filter columns, enforce unique cart/wishlist/review rows')
+def add_indexes():
+    # Unique indexes cannot be built over duplicates. Cart rows are merged
+    # into the oldest row first so no quantity is lost.
+    cart = cart_item_table
+    duplicate = cart.alias('duplicate')
+    totals = db.select(db.func.sum(duplicate.c.quantity)).where(
+        duplicate.c.user_id == cart.c.user_id,
+        duplicate.c.product_id == cart.c.product_id,
+    ).scalar_subquery()
+    db.session.execute(db.update(cart).values(quantity=totals))
+    delete_duplicates(cart_item_table, 'user_id', 'product_id')
+    delete_duplicates(wishlist_table, 'user_id', 'product_id')
+    if delete_duplicates(review_table, 'user_id', 'product_id'):
+        refresh_rating_sums()
+
+    create_missing_indexes('user', [('ix_user_is_admin', ['is_admin'], False),
+                                    ('ix_user_created_at', ['created_at'], False)])
+    create_missing_indexes('product', [('ix_product_category', ['category'], False)])
+    create_missing_indexes('order', [('ix_order_user_id_created_at', ['user_id', 'created_at'], False),
+                                     ('ix_order_status', ['status'], False),
+                                     ('ix_order_created_at', ['created_at'], False)])
+    create_missing_indexes('order_item', [('ix_order_item_order_id', ['order_id'], False),
+                                          ('ix_order_item_product_id', ['product_id'], False)])
+    for table in ('cart_item', 'review', 'wishlist'):
+        create_missing_indexes(table, [(f'ix_{table}_product_id', ['product_id'], False),
+                                       (f'uq_{table}_user_id_product_id', ['user_id', 'product_id'], True)])
+
+
+metric_counter_v3 = db.Table(
+    'metric_counter', snapshots,
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('value', db.Float, nullable=False, default=0),
+)
+daily_metric_v3 = db.Table(
+    'daily_metric', snapshots,
+    db.Column('day', db.Date, primary_key=True),
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('value', db.Float, nullable=False, default=0),
+)
+
+
+def _as_date(value):
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+@migration(3, 'Add precomputed admin dashboard metrics')
+def add_metrics():
+    connection = db.session.connection()
+    metric_counter_v3.create(bind=connection, checkfirst=True)
+    daily_metric_v3.create(bind=connection, checkfirst=True)
+
+    # The counters and daily rollups of this version, as app/metrics.py
+    # computed them then; user summaries came later, with migration 8
+    counters, daily = defaultdict(float), defaultdict(float)
+    product, order, user = product_table.c, order_table.c, user_table.c
+    stock = db.case((db.func.coalesce(product.stock_quantity, 0) <= 0, 'out'),
+                    (product.stock_quantity <= 10, 'low'), else_='ok')
+    for band, total in db.session.execute(db.select(stock, db.func.count()).group_by(stock)):
+        counters['products.total'] += total
+        counters[f'products.stock.{band}'] += total
+
+    status = db.func.coalesce(order.status, 'pending')
+    for name, total in db.session.execute(db.select(status, db.func.count()).group_by(status)):
+        counters['orders.total'] += total
+        counters[f'orders.status.{name}'] += total
+
+    day = db.func.date(order.created_at)
+    revenue = db.func.sum(db.case((order.status == 'cancelled', 0), else_=order.total_amount))
+    for value, total, amount in db.session.execute(db.select(day, db.func.count(), revenue).group_by(day)):
+        daily[_as_date(value), 'orders.count'] += total
+        daily[_as_date(value), 'orders.revenue'] += amount or 0
+
+    is_admin = db.func.coalesce(user.is_admin, False)
+    for admin, total in db.session.execute(db.select(is_admin, db.func.count()).group_by(is_admin)):
+        counters['users.total'] += total
+        counters['users.admins' if admin else 'users.customers'] += total
+
+    day = db.func.date(user.created_at)
+    for value, total in db.session.execute(db.select(day, db.func.count()).group_by(day)):
+        daily[_as_date(value), 'users.new'] += total
+
+    db.session.execute(db.delete(metric_counter_v3))
+    db.session.execute(db.delete(daily_metric_v3))
+    rows = [{'name': name, 'value': value} for name, value in counters.items() if value]
+    if rows:
+        db.session.execute(db.insert(metric_counter_v3), rows)
+    rows = [{'day': day, 'name': name, 'value': value} for (day, name), value in daily.items() if value]
+    if rows:
+        db.session.execute(db.insert(daily_metric_v3), rows)
+
+
+@migration(4, 'Add product image thumbnail key')
+def add_image_key():
+    add_missing_columns('product', [db.Column('image_key', db.String(20))])
+
+
+facet_count_v5 = db.Table(
+    'facet_count', snapshots,
+    db.Column('category', db.String(50), primary_key=True),
+    db.Column('band', db.Integer, primary_key=True),
+    db.Column('in_stock', db.Boolean, primary_key=True),
+    db.Column('rating', db.Integer, primary_key=True),
+    db.Column('value', db.Integer, nullable=False, default=0),
+)
+
+
+@migration(5, 'Add catalog facet counts')
+def add_facet_counts():
+    facet_count_v5.create(bind=db.session.connection(), checkfirst=True)
+
+    # Bucketed as app/facets.py did at this version, when the rating was
+    # read from rating_sum and rating_count
+    product = product_table.c
+    bounds = current_app.config['CATALOG_PRICE_BANDS']
+    band = db.case(*[(product.price < bound, i) for i, bound in enumerate(bounds)], else_=len(bounds))
+    in_stock = db.func.coalesce(product.stock_quantity, 0) > 0
+    rating = db.case((product.rating_count == 0, 0), else_=product.rating_sum // product.rating_count)
+    query = db.select(product.category, band.label('band'), in_stock.label('in_stock'),
+                      rating.label('rating'), db.func.count()) \
+        .group_by(product.category, 'band', 'in_stock', 'rating')
+    rows = [{'category': category, 'band': band, 'in_stock': bool(in_stock), 'rating': rating, 'value': value}
+            for category, band, in_stock, rating, value in db.session.execute(query)]
+    db.session.execute(db.delete(facet_count_v5))
+    if rows:
+        db.session.execute(db.insert(facet_count_v5), rows)
+
+
+@migration(6, 'Add product rating average and units sold, index the catalog sorts')
+def add_catalog_sorts():
+    product, item, order = product_table.c, order_item_table.c, order_table.c
+    added = add_missing_columns('product', [
+        db.Column('rating_avg', db.Float, server_default='0'),
+        db.Column('units_sold', db.Integer, server_default='0'),
+    ])
+    if 'rating_avg' in added:
+        db.session.execute(db.update(product_table).values(rating_avg=db.case(
+            (product.rating_count == 0, 0.0), else_=product.rating_sum * 1.0 / product.rating_count
+        )))
+    if 'units_sold' in added:
+        db.session.execute(db.update(product_table).values(units_sold=(
+            db.select(db.func.coalesce(db.func.sum(item.quantity), 0))
+            .join(order_table, order.id == item.order_id)
+            .where(item.product_id == product.id, order.status != 'cancelled').scalar_subquery()
+        )))
+    indexes = []
+    for column in ('price', 'created_at', 'rating_avg', 'units_sold'):
+        indexes += [(f'ix_product_{column}', [column], False),
+                    (f'ix_product_category_{column}', ['category', column], False)]
+    create_missing_indexes('product', indexes)
+
+
+job_v7 = db.Table(
+    'job', snapshots,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('name', db.String(100), nullable=False),
+    db.Column('payload', db.Text, nullable=False),
+    db.Column('idempotency_key', db.String(200), unique=True),
+    db.Column('status', db.String(20), nullable=False, default='queued'),
+    db.Column('attempts', db.Integer, nullable=False, default=0),
+    db.Column('max_attempts', db.Integer, nullable=False),
+    db.Column('run_at', db.DateTime, nullable=False),
+    db.Column('locked_by', db.String(100)),
+    db.Column('locked_at', db.DateTime),
+    db.Column('last_error', db.Text),
+    db.Column('created_at', db.DateTime, nullable=False),
+    db.Column('finished_at', db.DateTime),
+    db.Index('ix_job_status_run_at', 'status', 'run_at'),
+)
+
+
+@migration(7, 'Add the background job table and pending product images')
+def add_jobs():
+    job_v7.create(bind=db.session.connection(), checkfirst=True)
+    add_missing_columns('product', [db.Column('image_pending', db.String(20))])
+
+
+user_order_summary_v8 = db.Table(
+    'user_order_summary', snapshots,
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('order_count', db.Integer, nullable=False, default=0),
+    db.Column('total_spent', db.Float, nullable=False, default=0),
+    db.Column('last_order_at', db.DateTime),
+)
+
+
+@migration(8, 'Add per-user order summaries')
+def add_user_order_summaries():
+    user_order_summary_v8.create(bind=db.session.connection(), checkfirst=True)
+
+    order = order_table.c
+    spent = db.func.sum(db.case((order.status == 'cancelled', 0), else_=order.total_amount))
+    db.session.execute(db.delete(user_order_summary_v8))
+    db.session.execute(db.insert(user_order_summary_v8).from_select(
+        ['user_id', 'order_count', 'total_spent', 'last_order_at'],
+        db.select(order.user_id, db.func.count(), db.func.coalesce(spent, 0), db.func.max(order.created_at))
+        .group_by(order.user_id)
+    ))
+
+
+@migration(9, 'Add the product full-text search index')
+def add_search_index():
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite' or db.inspect(connection).has_table('product_search'):
+        return
+    try:
+        connection.execute(db.text(
+            "CREATE VIRTUAL TABLE product_search USING fts5(name, description, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    except OperationalError:
+        return  # SQLite without FTS5: each process keeps an in-memory index instead
+    connection.execute(db.text(
+        "INSERT INTO product_search (rowid, name, description, category) "
+        "SELECT id, name, description, category FROM product"
+    ))
+    connection.execute(db.text("INSERT INTO product_search (product_search) VALUES ('optimize')"))
+
+
+@migration(10, 'Fill in missing creation times')
+def fill_created_at():
+    # Listings page by created_at with a row-value cursor, which never
+    # matches a NULL. Undated rows get the time of the upgrade, the day
+    # migration 3 already counted them on in the dashboard metrics.
+    now = datetime.utcnow()
+    for table in (user_table, product_table, order_table):
+        db.session.execute(db.update(table).where(table.c.created_at.is_(None)).values(created_at=now))
+
+def applied_versions():
+    schema_version.create(bind=db.session.connection(), checkfirst=True)
+    return set(db.session.execute(db.select(schema_version.c.version)).scalars())
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [step for step in MIGRATIONS if step[0] not in applied]
+
+
+def upgrade():
+    """Apply pending migrations, each in its own transaction.
+
+    Returns the (version, description) pairs that were applied.
+    """
+    applied = []
+    for version, description, func in pending_migrations():
+        try:
+            func()
+            db.session.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append((version, description))
+    return applied
@@ -1,6 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import passwords
 from datetime import datetime
 from app import db
 
@@ -9,33 +9,63 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
-    is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_admin = db.Column(db.Boolean, default=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     
     # Relationships
     orders = db.relationship('Order', backref='user', lazy=True)
     cart_items = db.relationship('CartItem', backref='user', lazy=True)
     reviews = db.relationship('Review', backref='user', lazy=True)
     wishlist = db.relationship('Wishlist', backref='user', lazy=True)
+    order_summary = db.relationship('UserOrderSummary', uselist=False, lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.username}>'
 
 class Product(db.Model):
+    __table_args__ = (
+        # Sorted catalog views, overall and within a category. Each index
+        # ends in the implicit rowid, so it also orders ties by id and a
+        # keyset page is one range scan.
+        db.Index('ix_product_price', 'price'),
+        db.Index('ix_product_category_price', 'category', 'price'),
+        db.Index('ix_product_created_at', 'created_at'),
+        db.Index('ix_product_category_created_at', 'category', 'created_at'),
+        db.Index('ix_product_rating_avg', 'rating_avg'),
+        db.Index('ix_product_category_rating_avg', 'category', 'rating_avg'),
+        db.Index('ix_product_units_sold', 'units_sold'),
+        db.Index('ix_product_category_units_sold', 'category', 'units_sold'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     price = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(50), nullable=False, index=True)
     image_url = db.Column(db.String(200), default='default-product.jpg')
+    image_key = db.Column(db.String(20))  # Thumbnails from app.images, when ingested
+    image_pending = db.Column(db.String(20))  # Key of an upload still being resized by a job
     stock_quantity = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Denormalized review aggregates, maintained by add_review so listing
+    # pages never have to load the reviews themselves
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Stored so the best-rated view can be read from an index
+    rating_avg = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # Units in orders that were not cancelled, kept by checkout and the
+    # order status route for the best-selling view
+    units_sold = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships with cascade deletes
     order_items = db.relationship('OrderItem', backref='product', lazy=True, cascade='all, delete-orphan')
@@ -45,30 +75,89 @@ class Product(db.Model):
     
     @property
     def average_rating(self):
-        if self.reviews:
-            return sum(review.rating for review in self.reviews) / len(self.reviews)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return 0
     
+    @classmethod
+    def record_review(cls, product_id, rating):
+        """Add a rating to the stored aggregates in the current transaction."""
+        cls.query.filter_by(id=product_id).update({
+            cls.rating_sum: cls.rating_sum + rating,
+            cls.rating_count: cls.rating_count + 1,
+            cls.rating_avg: (cls.rating_sum + rating) * 1.0 / (cls.rating_count + 1)
+        }, synchronize_session=False)
+    
+    @classmethod
+    def refresh_rating_aggregates(cls):
+        """Recompute rating_sum/rating_count/rating_avg for every product from the reviews table."""
+        rating_sum = db.select(db.func.coalesce(db.func.sum(Review.rating), 0)) \
+            .where(Review.product_id == cls.id).scalar_subquery()
+        rating_count = db.select(db.func.count(Review.id)) \
+            .where(Review.product_id == cls.id).scalar_subquery()
+        db.session.execute(
+            db.update(cls).values(rating_sum=rating_sum, rating_count=rating_count)
+        )
+        db.session.execute(
+            db.update(cls).values(rating_avg=db.case(
+                (cls.rating_count == 0, 0.0), else_=cls.rating_sum * 1.0 / cls.rating_count
+            ))
+        )
+    
+    @classmethod
+    def record_sales(cls, quantities, sign=1):
+        """Add (or with sign=-1, take back) {product_id: units} sold, in one statement."""
+        if quantities:
+            db.session.execute(
+                db.update(cls).where(cls.id.in_(quantities))
+                .values(units_sold=cls.units_sold + sign * db.case(quantities, value=cls.id))
+                .execution_options(synchronize_session=False)
+            )
+    
+    @classmethod
+    def refresh_sales(cls):
+        """Recompute units_sold for every product from the orders that were not cancelled."""
+        units = db.select(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+            .join(Order, Order.id == OrderItem.order_id) \
+            .where(OrderItem.product_id == cls.id, Order.status != 'cancelled').scalar_subquery()
+        db.session.execute(db.update(cls).values(units_sold=units))
+    
     def __repr__(self):
         return f'<Product {self.name}>'
 
 class Order(db.Model):
+    __table_args__ = (
+        # A user's order history, newest first
+        db.Index('ix_order_user_id_created_at', 'user_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, confirmed, shipped, delivered, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, confirmed, shipped, delivered, cancelled
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     
     # Relationships
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
     
+    @classmethod
+    def query_with_items(cls):
+        """Order query that loads items and their products up front.
+        
+        One extra SELECT fetches the items of every order on the page (with
+        products joined in), instead of one lazy load per order and product.
+        """
+        return cls.query.options(
+            db.selectinload(cls.order_items).joinedload(OrderItem.product)
+        )
+    
     def __repr__(self):
         return f'<Order {self.id}>'
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)  # Price at time of order
     
@@ -76,18 +165,65 @@ class OrderItem(db.Model):
         return f'<OrderItem {self.id}>'
 
 class CartItem(db.Model):
+    __table_args__ = (
+        db.Index('uq_cart_item_user_id_product_id', 'user_id', 'product_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     
+    @classmethod
+    def add_from_wishlist(cls, user_id):
+        """Put one unit of every in-stock wishlist product into the user's cart.
+        
+        Products already in the cart get one more unit if stock allows. The
+        wishlist, stock levels and cart rows are read with one SELECT, and
+        the updates and inserts are one statement each. Returns the number
+        of wishlist items and of units added; the caller commits.
+        """
+        rows = db.session.execute(
+            db.select(Product.stock_quantity, Wishlist.product_id, cls.id, cls.quantity)
+            .select_from(Wishlist)
+            .join(Product, Product.id == Wishlist.product_id)
+            .outerjoin(cls, db.and_(cls.user_id == Wishlist.user_id,
+                                    cls.product_id == Wishlist.product_id))
+            .where(Wishlist.user_id == user_id)
+        ).all()
+        
+        increments = []
+        inserts = []
+        for stock, product_id, cart_item_id, quantity in rows:
+            if not stock or stock <= 0:
+                continue
+            if cart_item_id is None:
+                inserts.append({'user_id': user_id, 'product_id': product_id, 'quantity': 1})
+            elif stock > quantity:
+                increments.append(cart_item_id)
+        
+        if increments:
+            db.session.execute(
+                db.update(cls).where(cls.id.in_(increments))
+                .values(quantity=cls.quantity + 1)
+                .execution_options(synchronize_session=False)
+            )
+        if inserts:
+            db.session.execute(db.insert(cls), inserts)
+        return len(rows), len(increments) + len(inserts)
+    
     def __repr__(self):
         return f'<CartItem {self.id}>'
 
 class Review(db.Model):
+    __table_args__ = (
+        # One review per user and product
+        db.Index('uq_review_user_id_product_id', 'user_id', 'product_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     rating = db.Column(db.Integer, nullable=False)  # 1-5 stars
     comment = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -96,10 +232,76 @@ class Review(db.Model):
         return f'<Review {self.id}>'
 
 class Wishlist(db.Model):
+    __table_args__ = (
+        db.Index('uq_wishlist_user_id_product_id', 'user_id', 'product_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<Wishlist {self.id}>'
+
+class MetricCounter(db.Model):
+    """A running total for the admin pages, e.g. 'orders.status.pending'."""
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MetricCounter {self.name}={self.value}>'
+
+class FacetCount(db.Model):
+    """Products in one catalog facet cell, maintained by app/facets.py."""
+    category = db.Column(db.String(50), primary_key=True)
+    band = db.Column(db.Integer, primary_key=True)  # Index into CATALOG_PRICE_BANDS
+    in_stock = db.Column(db.Boolean, primary_key=True)
+    rating = db.Column(db.Integer, primary_key=True)  # Whole stars of the average; 0 when unrated
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<FacetCount {self.category}/{self.band}/{self.in_stock}/{self.rating}={self.value}>'
+
+class DailyMetric(db.Model):
+    """A per-day rollup, e.g. the revenue of the orders placed on a day."""
+    day = db.Column(db.Date, primary_key=True)
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyMetric {self.day} {self.name}={self.value}>'
+
+class UserOrderSummary(db.Model):
+    """One user's order count, lifetime spend and last order, maintained by app/metrics.py."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Float, nullable=False, default=0)  # Cancelled orders excluded
+    last_order_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<UserOrderSummary {self.user_id} {self.order_count} orders>'
+
+class Job(db.Model):
+    """A unit of background work; see app/jobs.py."""
+    __table_args__ = (
+        # Workers claim the oldest due job
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON keyword arguments for the handler
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)  # Not claimed before this time (retry backoff)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
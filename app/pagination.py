@@ -0,0 +1,151 @@
+from datetime import datetime
+from flask import current_app, request, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+from app import db
+from app.cache import LRUCache
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def encode_cursor(values, direction):
+    """Turn the sort key of a row into an opaque, signed page token."""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return _serializer().dumps({'k': values, 'd': direction})
+
+
+def decode_cursor(token, keys):
+    """Return (values, direction) for a token, or None if it is missing or was tampered with."""
+    if not token:
+        return None
+    try:
+        payload = _serializer().loads(token)
+        values, direction = payload['k'], payload['d']
+    except (BadSignature, KeyError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or len(values) != len(keys):
+        return None
+    try:
+        values = [datetime.fromisoformat(value)
+                  if key.type.python_type is datetime and value is not None else value
+                  for key, value in zip(keys, values)]
+    except (TypeError, ValueError):
+        return None
+    return values, direction
+
+
+def page_url(endpoint, page_args):
+    """URL for another page of the current listing, keeping its filters."""
+    args = request.args.to_dict()
+    args.pop('page', None)
+    args.pop('cursor', None)
+    args.update(page_args)
+    return url_for(endpoint, **args)
+
+
+class KeysetPagination:
+    """One page of a query walked by its sort key instead of OFFSET.
+
+    Rows are ordered by `keys` (all ascending, or all descending) and each
+    page starts right after the key of the previous page's last row, so
+    every page costs one indexed range scan however deep it is. The last
+    key must be unique (normally the primary key) to break ties, and no
+    key may be NULL: the row-value comparison never matches a NULL, so
+    such rows would drop out after the first page.
+
+    `totals` picks how the total row count is found: 'exact' counts on
+    every page, 'estimate' reuses a count cached for PAGINATION_COUNT_TTL
+    seconds, and None skips counting altogether. A caller that already
+    knows the count passes it as `total` instead; with a total of 0 the
+    page query is skipped too.
+    """
+
+    def __init__(self, query, keys, per_page=10, cursor=None, descending=False, totals='estimate',
+                 total=None):
+        nullable = [key.key for key in keys if getattr(key, 'nullable', False)]
+        if nullable:
+            raise ValueError(f"Keyset pagination keys must be NOT NULL: {', '.join(nullable)}")
+        self.keys = keys
+        self.per_page = per_page
+        self.descending = descending
+
+        position = decode_cursor(cursor, keys)
+        direction = position[1] if position else 'next'
+        forward = direction == 'next'
+        # Walking back reverses both the comparison and the sort order;
+        # the rows are flipped into display order below
+        scan_descending = descending == forward
+
+        page_query = query.order_by(None)
+        if position:
+            values = position[0]
+            if len(keys) == 1:
+                row, bound = keys[0], values[0]
+            else:
+                row, bound = db.tuple_(*keys), db.tuple_(*values)
+            page_query = page_query.filter(row < bound if scan_descending else row > bound)
+        page_query = page_query.order_by(*[key.desc() if scan_descending else key.asc()
+                                           for key in keys])
+        rows = page_query.limit(per_page + 1).all() if total != 0 else []
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if forward:
+            self.items = rows
+            self.has_next = has_more
+            self.has_prev = position is not None and bool(rows)
+        else:
+            self.items = rows[::-1]
+            self.has_next = bool(rows)
+            self.has_prev = has_more
+
+        self.next_cursor = encode_cursor(self._key_of(self.items[-1]), 'next') if self.has_next else None
+        self.prev_cursor = encode_cursor(self._key_of(self.items[0]), 'prev') if self.has_prev else None
+
+        self.total_is_estimate = totals == 'estimate' and total is None
+        if total is not None:
+            self.total = total
+        elif totals == 'exact':
+            self.total = query.order_by(None).count()
+        elif totals == 'estimate':
+            self.total = self._cached_count(query)
+        else:
+            self.total = None
+
+    def _key_of(self, item):
+        return [getattr(item, key.key) for key in self.keys]
+
+    @staticmethod
+    def _cached_count(query):
+        counts = current_app.extensions.get('pagination_counts')
+        if counts is None:
+            counts = current_app.extensions['pagination_counts'] = LRUCache(
+                max_entries=1000, default_ttl=current_app.config.get('PAGINATION_COUNT_TTL', 60)
+            )
+        compiled = query.enable_eagerloads(False).order_by(None).statement.compile()
+        cache_key = (str(compiled), repr(sorted(compiled.params.items())))
+        total = counts.get(cache_key)
+        if total is None:
+            total = query.order_by(None).count()
+            counts.set(cache_key, total)
+        return total
+
+    @property
+    def next_args(self):
+        return {'cursor': self.next_cursor}
+
+    @property
+    def prev_args(self):
+        return {'cursor': self.prev_cursor}
+
+
+def keyset_paginate(query, keys, per_page=10, descending=False, totals=None, total=None):
+    """Paginate `query` by `keys`, reading the page token from ?cursor=."""
+    if totals is None:
+        totals = current_app.config.get('PAGINATION_TOTALS', 'estimate')
+    return KeysetPagination(query, keys, per_page=per_page,
+                            cursor=request.args.get('cursor'),
+                            descending=descending,
+                            totals=totals if totals in ('exact', 'estimate') else None,
+                            total=total)
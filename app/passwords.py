@@ -0,0 +1,156 @@
+"""
+Password hashing and login throttling.
+
+Hashes are made with werkzeug using PASSWORD_HASH_METHOD (e.g.
+'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'). When the method changes,
+old hashes keep working and are replaced with the new parameters on the
+user's next successful login.
+
+Hashing runs on a small thread pool (PASSWORD_HASH_WORKERS), so no more
+than that many hashes burn CPU at once however many requests arrive;
+hashlib releases the GIL while it works. At most PASSWORD_HASH_QUEUE
+hashes may wait for a worker; beyond that HashingBusyError is raised at
+once instead of letting requests pile up.
+
+LoginThrottle counts failed logins per client IP and per email address in
+a sliding window, so a flood is turned away before anything is looked up
+or hashed. It lives in process memory: each worker process keeps its own
+counts.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusyError(RuntimeError):
+    """Every hashing slot is taken."""
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 4)
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 64)
+        app.extensions['passwords'] = {
+            'pool': ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                       thread_name_prefix='password-hash'),
+            'slots': threading.BoundedSemaphore(app.config['PASSWORD_HASH_WORKERS']
+                                                + app.config['PASSWORD_HASH_QUEUE']),
+            'methods': {},  # configured method -> the prefix werkzeug writes for it
+        }
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['passwords']
+
+    def _run(self, function, *args):
+        state = self._state()
+        if not state['slots'].acquire(blocking=False):
+            raise HashingBusyError('Too many password checks in progress')
+        try:
+            return state['pool'].submit(function, *args).result()
+        finally:
+            state['slots'].release()
+
+    def hash(self, password):
+        config = current_app.config
+        return self._run(generate_password_hash, password, config['PASSWORD_HASH_METHOD'],
+                         config['PASSWORD_SALT_LENGTH'])
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than the configured ones."""
+        methods = self._state()['methods']
+        method = current_app.config['PASSWORD_HASH_METHOD']
+        if method not in methods:
+            # werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'); learn the
+            # full form once from a hash of nothing
+            methods[method] = generate_password_hash('', method, 1).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != methods[method]
+
+
+class LoginThrottle:
+    """Sliding-window counts of failed logins per client IP and per account from that IP.
+
+    Keys are 'ip:<address>' and 'login:<address>:<normalized email>'. An
+    account is throttled from one client at a time, so failures made
+    elsewhere cannot lock its owner out. The IP must be the real client's:
+    behind a reverse proxy set PROXY_FIX_X_FOR (see create_app), or every
+    visitor shares the proxy's address.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOGIN_THROTTLE_ENABLED', True)
+        app.config.setdefault('LOGIN_THROTTLE_WINDOW', 15 * 60)
+        app.config.setdefault('LOGIN_MAX_FAILURES_PER_IP', 20)
+        app.config.setdefault('LOGIN_MAX_FAILURES_PER_EMAIL', 5)
+        app.config.setdefault('LOGIN_THROTTLE_MAX_KEYS', 100000)
+        app.extensions['login_throttle'] = {'lock': threading.Lock(), 'failures': OrderedDict()}
+
+    @staticmethod
+    def account_key(ip, email):
+        return f'login:{ip}:{(email or "").strip().lower()}'
+
+    def keys(self, ip, email):
+        return {f'ip:{ip}': current_app.config['LOGIN_MAX_FAILURES_PER_IP'],
+                self.account_key(ip, email): current_app.config['LOGIN_MAX_FAILURES_PER_EMAIL']}
+
+    def retry_after(self, ip, email):
+        """Seconds until a login for this IP and email may be tried again; 0 when it may now."""
+        config = current_app.config
+        if not config['LOGIN_THROTTLE_ENABLED']:
+            return 0
+        state = current_app.extensions['login_throttle']
+        now = time.monotonic()
+        wait = 0
+        with state['lock']:
+            for key, limit in self.keys(ip, email).items():
+                failures = state['failures'].get(key)
+                if failures is None:
+                    continue
+                while failures and failures[0] <= now - config['LOGIN_THROTTLE_WINDOW']:
+                    failures.popleft()
+                if len(failures) >= limit:
+                    # Allowed again once the oldest failure that counts leaves the window
+                    wait = max(wait, failures[-limit] + config['LOGIN_THROTTLE_WINDOW'] - now)
+        return int(wait) + 1 if wait else 0
+
+    def failed(self, ip, email):
+        if not current_app.config['LOGIN_THROTTLE_ENABLED']:
+            return
+        state = current_app.extensions['login_throttle']
+        now = time.monotonic()
+        with state['lock']:
+            for key, limit in self.keys(ip, email).items():
+                failures = state['failures'].get(key)
+                if failures is None:
+                    failures = state['failures'][key] = deque(maxlen=limit)
+                state['failures'].move_to_end(key)
+                failures.append(now)
+            while len(state['failures']) > current_app.config['LOGIN_THROTTLE_MAX_KEYS']:
+                state['failures'].popitem(last=False)
+
+    def succeeded(self, ip, email):
+        """Forget the account's failures; the IP's stay, so one good account cannot reset a flood."""
+        state = current_app.extensions['login_throttle']
+        with state['lock']:
+            state['failures'].pop(self.account_key(ip, email), None)
+
+
+passwords = PasswordHasher()
+login_throttle = LoginThrottle()
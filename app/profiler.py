@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from flask import current_app, g, request, has_request_context, before_render_template, template_rendered
+from app import db
+
+logger = logging.getLogger('spequip.profiler')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class EndpointStats:
+    """Recent request timings per endpoint, kept in a bounded window."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self._window))
+
+    def record(self, endpoint, total_ms, db_ms, query_count):
+        with self._lock:
+            self._samples[endpoint].append((total_ms, db_ms, query_count))
+
+    def summary(self):
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+        rows = []
+        for endpoint, values in samples.items():
+            totals = [value[0] for value in values]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(values),
+                'p50': percentile(totals, 50),
+                'p95': percentile(totals, 95),
+                'p99': percentile(totals, 99),
+                'avg_db_ms': sum(value[1] for value in values) / len(values),
+                'avg_queries': sum(value[2] for value in values) / len(values),
+            })
+        return sorted(rows, key=lambda row: row['p95'], reverse=True)
+
+
+class RequestProfiler:
+    """Opt-in per-request SQL and template timing.
+
+    Enabled with the PROFILER_ENABLED config flag. Each request gets a
+    Server-Timing header and one JSON log line on the 'spequip.profiler'
+    logger; per-endpoint percentiles are shown on /admin/profiler.
+    """
+
+    def __init__(self, app=None):
+        self.stats = EndpointStats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_ENABLED', False)
+        app.config.setdefault('PROFILER_SLOW_QUERIES', 3)  # slowest statements kept per request
+        app.config.setdefault('PROFILER_SLOW_QUERY_MS', 100)  # warn above this duration
+        app.config.setdefault('PROFILER_WINDOW', 1000)  # requests kept per endpoint
+        app.extensions['profiler'] = self
+        if not app.config['PROFILER_ENABLED']:
+            return
+
+        self.stats = EndpointStats(app.config['PROFILER_WINDOW'])
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        with app.app_context():
+            engine = db.engine
+        db.event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        db.event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    @staticmethod
+    def _current():
+        if has_request_context():
+            return g.get('profile')
+        return None
+
+    def _start_request(self):
+        g.profile = {
+            'started': time.perf_counter(),
+            'query_count': 0,
+            'db_ms': 0.0,
+            'template_ms': 0.0,
+            'template_started': None,
+            'queries': [],
+        }
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profiler_started'].pop()
+        profile = self._current()
+        if profile is None:
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        profile['query_count'] += 1
+        profile['db_ms'] += elapsed
+        profile['queries'].append((elapsed, statement))
+
+    def _before_render(self, sender, template, context, **extra):
+        profile = self._current()
+        if profile is not None:
+            profile['template_started'] = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        profile = self._current()
+        if profile is not None and profile['template_started'] is not None:
+            profile['template_ms'] += (time.perf_counter() - profile['template_started']) * 1000
+            profile['template_started'] = None
+
+    def _finish_request(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile['started']) * 1000
+        endpoint = request.endpoint or 'unknown'
+        slowest = sorted(profile['queries'], key=lambda query: query[0], reverse=True)
+        slowest = slowest[:current_app.config['PROFILER_SLOW_QUERIES']]
+
+        response.headers.add('Server-Timing', ', '.join([
+            f'db;dur={profile["db_ms"]:.2f};desc="{profile["query_count"]} queries"',
+            f'tpl;dur={profile["template_ms"]:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ]))
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(profile['db_ms'], 2),
+            'template_ms': round(profile['template_ms'], 2),
+            'query_count': profile['query_count'],
+            'slowest': [{'ms': round(ms, 2), 'sql': ' '.join(sql.split())} for ms, sql in slowest],
+        }))
+        threshold = current_app.config['PROFILER_SLOW_QUERY_MS']
+        for ms, sql in slowest:
+            if ms >= threshold:
+                logger.warning('Slow query (%.1f ms) on %s: %s', ms, endpoint, ' '.join(sql.split()))
+
+        self.stats.record(endpoint, total_ms, profile['db_ms'], profile['query_count'])
+        return response
+
+
+profiler = RequestProfiler()
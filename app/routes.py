@@ -1,17 +1,32 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, make_response, \
+    Response, stream_with_context, abort, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
-from app.models import User, Product, Order, OrderItem, CartItem, Review, Wishlist
-from app.forms import LoginForm, RegistrationForm, ProductForm, ReviewForm, UpdateOrderStatusForm
+from app.models import User, Product, Order, OrderItem, CartItem, Review, Wishlist, UserOrderSummary
+from app.forms import LoginForm, RegistrationForm, ProductForm, ReviewForm, UpdateOrderStatusForm, ImportProductsForm
+from app.search import product_search
+from app.profiler import profiler
+from app.cache import cart_counts, fragment_cache, user_cache
+from app.images import product_images, ImageError
+from app.jobs import jobs
+from app.passwords import login_throttle, HashingBusyError
+from app.checkout import place_order, EmptyCartError, OutOfStockError, CheckoutBusyError
+from app.pagination import keyset_paginate
+from app.facets import CatalogFilters, SORTS, catalog_facets
+from app import metrics, facets, exports, catalog_import
 from datetime import datetime
+import io
 
 main = Blueprint('main', __name__)
 
 # Home page
 @main.route('/')
+@fragment_cache.conditional
 def index():
-    featured_products = Product.query.limit(8).all()
-    return render_template('index.html', products=featured_products)
+    featured = fragment_cache.cached('home:featured', lambda: render_template(
+        '_featured_products.html', products=Product.query.limit(8).all()
+    ))
+    return render_template('index.html', featured=featured)
 
 # Authentication routes
 @main.route('/login', methods=['GET', 'POST'])
@@ -21,13 +36,37 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
+        # Turn floods away before the lookup and the (deliberately slow) hash
+        retry_after = login_throttle.retry_after(request.remote_addr, form.email.data)
+        if retry_after:
+            flash(f'Too many failed login attempts. Please try again in {(retry_after + 59) // 60} minutes.', 'danger')
+            response = make_response(render_template('auth/login.html', form=form), 429)
+            response.headers['Retry-After'] = str(retry_after)
+            return response
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HashingBusyError:
+            flash('We could not sign you in right now. Please try again.', 'danger')
+            return make_response(render_template('auth/login.html', form=form), 503)
+        if valid:
+            login_throttle.succeeded(request.remote_addr, form.email.data)
+            if user.password_needs_rehash():
+                # Hash parameters changed since this password was set
+                try:
+                    user.set_password(form.password.data)
+                except HashingBusyError:
+                    pass  # The password is right; upgrade the hash at a later login
+                else:
+                    db.session.commit()
+                    user_cache.invalidate(user.id)
             login_user(user)
+            user_cache.prime(user)
             next_page = request.args.get('next')
             if user.is_admin:
                 return redirect(next_page) if next_page else redirect(url_for('main.admin_dashboard'))
             return redirect(next_page) if next_page else redirect(url_for('main.index'))
+        login_throttle.failed(request.remote_addr, form.email.data)
         flash('Invalid email or password', 'danger')
     return render_template('auth/login.html', form=form)
 
@@ -48,8 +87,14 @@ def register():
             return render_template('auth/register.html', form=form)
         
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusyError:
+            flash('We could not create your account right now. Please try again.', 'danger')
+            return make_response(render_template('auth/register.html', form=form), 503)
         db.session.add(user)
+        db.session.flush()
+        metrics.user_registered(user)
         db.session.commit()
         flash('Registration successful!', 'success')
         return redirect(url_for('main.login'))
@@ -63,27 +108,33 @@ def logout():
 
 # Product routes
 @main.route('/products')
+@fragment_cache.conditional
 def products():
+    catalog = fragment_cache.cached('products', render_catalog, sorted(request.args.items(multi=True)))
+    return render_template('products/products.html', catalog=catalog)
+
+def render_catalog():
     page = request.args.get('page', 1, type=int)
-    category = request.args.get('category')
     search = request.args.get('search')
+    filters = CatalogFilters.from_args(request.args)
+    counts = catalog_facets.counts(filters)
     
-    query = Product.query
-    
-    if category:
-        query = query.filter_by(category=category)
+    sort = filters.ordering
     
     if search:
-        query = query.filter(Product.name.contains(search))
-    
-    products = query.paginate(
-        page=page, per_page=12, error_out=False
-    )
-    
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [cat[0] for cat in categories]
+        # Ranked full-text search over name, description and category;
+        # only the category facet and the sort apply to it
+        products = product_search.paginate(search, page=page, per_page=12, category=filters.category,
+                                           sort=sort)
+    else:
+        # The facet counts already hold the number of matches
+        products = keyset_paginate(filters.apply(Product.query),
+                                   sort['keys'] if sort else [Product.id], per_page=12,
+                                   descending=bool(sort and sort['descending']),
+                                   total=counts['total'])
     
-    return render_template('products/products.html', products=products, categories=categories)
+    return render_template('products/_catalog.html', products=products, filters=filters, facets=counts,
+                           price_bands=catalog_facets.price_bands(), sorts=SORTS, searching=bool(search))
 
 @main.route('/product/<int:id>')
 def product_detail(id):
@@ -114,6 +165,7 @@ def add_to_cart():
         db.session.add(cart_item)
     
     db.session.commit()
+    cart_counts.invalidate(current_user.id)
     flash('Item added to cart!', 'success')
     return redirect(url_for('main.product_detail', id=product_id))
 
@@ -131,40 +183,22 @@ def remove_from_cart(id):
     if cart_item.user_id == current_user.id:
         db.session.delete(cart_item)
         db.session.commit()
+        cart_counts.invalidate(current_user.id)
         flash('Item removed from cart', 'success')
     return redirect(url_for('main.cart'))
 
 @main.route('/add-all-to-cart', methods=['POST'])
 @login_required
 def add_all_to_cart():
-    wishlist_items = Wishlist.query.filter_by(user_id=current_user.id).all()
+    wishlist_size, added_count = CartItem.add_from_wishlist(current_user.id)
     
-    if not wishlist_items:
+    if not wishlist_size:
         flash('Your wishlist is empty', 'warning')
         return redirect(url_for('main.wishlist'))
     
-    added_count = 0
-    for wishlist_item in wishlist_items:
-        product = wishlist_item.product
-        
-        # Check if product has stock
-        if product.stock_quantity > 0:
-            # Check if item already in cart
-            cart_item = CartItem.query.filter_by(user_id=current_user.id, product_id=product.id).first()
-            
-            if cart_item:
-                # Add 1 more to existing cart item if stock allows
-                if product.stock_quantity > cart_item.quantity:
-                    cart_item.quantity += 1
-                    added_count += 1
-            else:
-                # Add new item to cart
-                cart_item = CartItem(user_id=current_user.id, product_id=product.id, quantity=1)
-                db.session.add(cart_item)
-                added_count += 1
-    
     if added_count > 0:
         db.session.commit()
+        cart_counts.invalidate(current_user.id)
         flash(f'{added_count} items added to cart from wishlist!', 'success')
     else:
         flash('No items could be added to cart (out of stock or already in cart)', 'warning')
@@ -174,51 +208,38 @@ def add_all_to_cart():
 @main.route('/cart-count')
 @login_required
 def cart_count():
-    count = CartItem.query.filter_by(user_id=current_user.id).count()
-    return jsonify({'count': count})
+    return jsonify({'count': cart_counts.get(current_user.id)})
 
 # Order routes
 @main.route('/checkout', methods=['POST'])
 @login_required
 def checkout():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    
-    if not cart_items:
+    try:
+        place_order(current_user.id)
+    except EmptyCartError:
         flash('Your cart is empty', 'warning')
         return redirect(url_for('main.cart'))
+    except OutOfStockError as e:
+        flash(f"Not enough stock available for {', '.join(e.product_names) or 'some items'}", 'danger')
+        return redirect(url_for('main.cart'))
+    except CheckoutBusyError:
+        flash('We could not place your order right now. Please try again.', 'danger')
+        return redirect(url_for('main.cart'))
     
-    total = sum(item.product.price * item.quantity for item in cart_items)
-    
-    # Create order
-    order = Order(user_id=current_user.id, total_amount=total)
-    db.session.add(order)
-    db.session.flush()  # Get the order ID
-    
-    # Create order items and update stock
-    for cart_item in cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            price=cart_item.product.price
-        )
-        db.session.add(order_item)
-        
-        # Update product stock
-        cart_item.product.stock_quantity -= cart_item.quantity
-        
-        # Remove from cart
-        db.session.delete(cart_item)
-    
-    db.session.commit()
+    cart_counts.invalidate(current_user.id)
+    fragment_cache.bump()  # Stock levels on the product cards changed
     flash('Order placed successfully!', 'success')
     return redirect(url_for('main.orders'))
 
 @main.route('/orders')
 @login_required
 def orders():
-    user_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
-    return render_template('orders/orders.html', orders=user_orders)
+    summary = db.session.get(UserOrderSummary, current_user.id)
+    # The summary's order count is the total, so paging needs no COUNT query
+    user_orders = keyset_paginate(Order.query_with_items().filter_by(user_id=current_user.id),
+                                  [Order.created_at, Order.id], per_page=10, descending=True,
+                                  total=summary.order_count if summary else None)
+    return render_template('orders/orders.html', orders=user_orders, summary=summary)
 
 # Review routes
 @main.route('/add-review', methods=['POST'])
@@ -242,7 +263,10 @@ def add_review():
                 comment=form.comment.data
             )
             db.session.add(review)
+            Product.record_review(form.product_id.data, form.rating.data)
+            facets.rating_added(form.product_id.data, form.rating.data)
             db.session.commit()
+            fragment_cache.bump()
             flash('Review added successfully!', 'success')
     
     return redirect(url_for('main.product_detail', id=form.product_id.data))
@@ -284,39 +308,38 @@ def remove_from_wishlist(id):
 @main.route('/admin')
 @login_required
 def admin_dashboard():
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_users = User.query.filter_by(is_admin=False).count()
-    pending_orders = Order.query.filter_by(status='pending').count()
+    # Counters are kept up to date by the write routes (see app/metrics.py)
+    counters = metrics.read_counters()
     
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
+    recent_orders = Order.query.options(db.joinedload(Order.user)) \
+        .order_by(Order.created_at.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
-                         total_products=total_products,
-                         total_orders=total_orders,
-                         total_users=total_users,
-                         pending_orders=pending_orders,
+                         total_products=counters['products.total'],
+                         total_orders=counters['orders.total'],
+                         total_users=counters['users.customers'],
+                         pending_orders=counters['orders.status.pending'],
+                         daily=metrics.read_daily(7),
                          recent_orders=recent_orders)
 
 @main.route('/admin/products')
 @login_required
 def admin_products():
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    page = request.args.get('page', 1, type=int)
-    products = Product.query.paginate(page=page, per_page=10, error_out=False)
-    return render_template('admin/products.html', products=products)
+    products = keyset_paginate(Product.query, [Product.id], per_page=10)
+    return render_template('admin/products.html', products=products, counters=metrics.read_counters())
 
 @main.route('/admin/products/add', methods=['GET', 'POST'])
 @login_required
 def admin_add_product():
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
@@ -330,17 +353,95 @@ def admin_add_product():
             image_url=form.image_url.data or 'default-product.jpg',
             stock_quantity=form.stock_quantity.data
         )
+        if not apply_image_upload(form, product):
+            return render_template('admin/add_product.html', form=form)
         db.session.add(product)
+        db.session.flush()  # Get the product ID for the search index
+        product_search.index_product(product)
+        pending_image = enqueue_image_job(product)
+        metrics.product_added(product.stock_quantity)
+        facets.product_added(product)
         db.session.commit()
+        fragment_cache.bump()
         flash('Product added successfully!', 'success')
+        if pending_image:
+            flash('The new image will appear once it has been resized.', 'info')
         return redirect(url_for('main.admin_products'))
     
     return render_template('admin/add_product.html', form=form)
 
+@main.route('/admin/products/import', methods=['GET', 'POST'])
+@login_required
+def admin_import_products():
+    if not user_cache.is_admin(current_user):
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    form = ImportProductsForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            fmt = catalog_import.detect_format(upload.filename)
+            stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            result = catalog_import.import_products(catalog_import.read_rows(stream, fmt),
+                                                    dry_run=form.dry_run.data)
+        except (catalog_import.CatalogImportError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            flash(f'Import failed: {e}', 'danger')
+        else:
+            if form.dry_run.data:
+                db.session.rollback()
+            else:
+                db.session.commit()
+                if result.imported:
+                    fragment_cache.bump()
+                flash(f'Imported products: {result.summary()}.', 'success' if not result.errors else 'warning')
+    
+    return render_template('admin/import_products.html', form=form, result=result,
+                           dry_run=form.dry_run.data, max_errors=100)
+
+def apply_image_upload(form, product):
+    """Take an uploaded image for the product; False (with a form error) if it is unusable."""
+    upload = form.image_file.data
+    if not upload:
+        return True
+    try:
+        key = product_images.accept(upload.read())
+    except (ImageError, RuntimeError) as e:
+        form.image_file.errors.append(str(e))
+        return False
+    if product_images.has_variants(key):
+        product.image_key, product.image_pending = key, None
+        # image_url keeps pointing at a real file for everything that reads it directly
+        product.image_url = product_images.largest_url(key)
+    else:
+        # Resized after the commit by a background job (see enqueue_image_job),
+        # which then switches the product over; until then the old image shows
+        product.image_pending = key
+    return True
+
+def enqueue_image_job(product):
+    """Queue the resize of a pending upload, if any; call once the product has an id."""
+    if not product.image_pending:
+        return False
+    jobs.enqueue('product_images.render',
+                 {'key': product.image_pending, 'image_url': product_images.largest_url(product.image_pending)},
+                 key=f'product-image:{product.id}:{product.image_pending}')
+    return True
+
+@main.route('/media/products/<filename>')
+def product_image_file(filename):
+    # Names carry a hash of the image, so a URL never changes content
+    response = send_from_directory(current_app.config['IMAGE_DIR'], filename,
+                                   max_age=current_app.config['IMAGE_MAX_AGE'])
+    response.cache_control.immutable = True
+    return response
+
 @main.route('/admin/products/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def admin_edit_product(id):
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
@@ -348,14 +449,28 @@ def admin_edit_product(id):
     form = ProductForm(obj=product)
     
     if form.validate_on_submit():
+        metrics.stock_changed(product.stock_quantity, form.stock_quantity.data)
+        old_cell = facets.cell(product)
         product.name = form.name.data
         product.description = form.description.data
         product.price = form.price.data
         product.category = form.category.data
-        product.image_url = form.image_url.data or 'default-product.jpg'
+        image_url = form.image_url.data or 'default-product.jpg'
+        if image_url != product.image_url:
+            # Thumbnails belong to the old image
+            product.image_url, product.image_key, product.image_pending = image_url, None, None
         product.stock_quantity = form.stock_quantity.data
+        if not apply_image_upload(form, product):
+            db.session.rollback()
+            return render_template('admin/edit_product.html', form=form, product=product)
+        facets.product_changed(old_cell, product)
+        product_search.index_product(product)
+        pending_image = enqueue_image_job(product)
         db.session.commit()
+        fragment_cache.bump()
         flash('Product updated successfully!', 'success')
+        if pending_image:
+            flash('The new image will appear once it has been resized.', 'info')
         return redirect(url_for('main.admin_products'))
     
     return render_template('admin/edit_product.html', form=form, product=product)
@@ -363,7 +478,7 @@ def admin_edit_product(id):
 @main.route('/admin/products/delete/<int:id>')
 @login_required
 def admin_delete_product(id):
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
@@ -379,15 +494,20 @@ def admin_delete_product(id):
         # Delete cart items
         CartItem.query.filter_by(product_id=id).delete()
         
-        # Delete reviews
+        # Delete reviews (the rating aggregates go with the product row,
+        # in the same transaction)
         Review.query.filter_by(product_id=id).delete()
         
         # Delete wishlist items
         Wishlist.query.filter_by(product_id=id).delete()
         
-        # Finally delete the product
+        # Finally delete the product and drop it from the search index
+        metrics.product_removed(product.stock_quantity)
+        facets.product_removed(product)
         db.session.delete(product)
+        product_search.remove_product(id)
         db.session.commit()
+        fragment_cache.bump()
         flash('Product deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -398,20 +518,18 @@ def admin_delete_product(id):
 @main.route('/admin/orders')
 @login_required
 def admin_orders():
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    page = request.args.get('page', 1, type=int)
-    orders = Order.query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    orders = keyset_paginate(Order.query_with_items().options(db.joinedload(Order.user)),
+                             [Order.created_at, Order.id], per_page=10, descending=True)
     return render_template('admin/orders.html', orders=orders)
 
 @main.route('/admin/orders/<int:id>/update-status', methods=['POST'])
 @login_required
 def admin_update_order_status(id):
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
@@ -419,21 +537,56 @@ def admin_update_order_status(id):
     form = UpdateOrderStatusForm()
     
     if form.validate_on_submit():
+        old_status = order.status
         order.status = form.status.data
+        metrics.order_status_changed(order, old_status)
+        cancelled = (order.status == 'cancelled') - (old_status == 'cancelled')
+        if cancelled:
+            # A cancelled order's units leave the best-selling counts, and
+            # come back if it is reinstated
+            quantities = {}
+            for item in order.order_items:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            Product.record_sales(quantities, sign=-cancelled)
         db.session.commit()
+        if cancelled:
+            fragment_cache.bump()
         flash('Order status updated successfully!', 'success')
     
     return redirect(url_for('main.admin_orders'))
 
+@main.route('/admin/orders/export.<fmt>')
+@login_required
+def admin_export_orders(fmt):
+    if not user_cache.is_admin(current_user):
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    if fmt not in exports.FORMATS:
+        abort(404)
+    
+    try:
+        rows = exports.order_rows(request.args.get('start'), request.args.get('end'),
+                                  request.args.get('status'))
+    except exports.ExportError as e:
+        flash(f'Export failed: {e}', 'danger')
+        return redirect(url_for('main.admin_orders'))
+    return _export_response(exports.stream_orders(fmt, rows), 'orders', fmt)
+
+def _export_response(lines, kind, fmt):
+    # stream_with_context keeps the session open while the rows are sent
+    response = Response(stream_with_context(lines), mimetype=exports.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{exports.filename(kind, fmt)}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # Let nginx pass chunks straight through
+    return response
+
 # User Management Routes
 @main.route('/admin/users')
 @login_required
 def admin_users():
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '', type=str)
     
     query = User.query
@@ -445,18 +598,34 @@ def admin_users():
             )
         )
     
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    # Order counts come from each user's summary row, joined into the page query
+    users = keyset_paginate(query.options(db.joinedload(User.order_summary)),
+                            [User.created_at, User.id], per_page=10, descending=True)
     
-    # Get today's date for statistics
-    from datetime import date
-    today = date.today()
+    return render_template('admin/users.html', users=users, search=search,
+                           counters=metrics.read_counters(), new_today=metrics.read_daily(1)[0]['new_users'])
 
-    return render_template('admin/users.html', users=users, search=search, today=today)@main.route('/admin/users/<int:id>/toggle-admin', methods=['POST'])
+@main.route('/admin/users/export.<fmt>')
+@login_required
+def admin_export_users(fmt):
+    if not user_cache.is_admin(current_user):
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    if fmt not in exports.FORMATS:
+        abort(404)
+    
+    try:
+        rows = exports.user_rows(request.args.get('start'), request.args.get('end'),
+                                 request.args.get('role'))
+    except exports.ExportError as e:
+        flash(f'Export failed: {e}', 'danger')
+        return redirect(url_for('main.admin_users'))
+    return _export_response(exports.stream_users(fmt, rows), 'users', fmt)
+
+@main.route('/admin/users/<int:id>/toggle-admin', methods=['POST'])
 @login_required
 def admin_toggle_user_admin(id):
-    if not current_user.is_admin:
+    if not user_cache.is_admin(current_user):
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
@@ -466,12 +635,25 @@ def admin_toggle_user_admin(id):
         return redirect(url_for('main.admin_users'))
     
     user.is_admin = not user.is_admin
+    metrics.user_admin_changed(user)
     db.session.commit()
+    user_cache.invalidate(user.id)
     
     status = 'granted' if user.is_admin else 'revoked'
     flash(f'Admin privileges {status} for {user.username}', 'success')
     return redirect(url_for('main.admin_users'))
 
+@main.route('/admin/profiler')
+@login_required
+def admin_profiler():
+    if not user_cache.is_admin(current_user):
+        flash('Access denied', 'danger')
+        return redirect(url_for('main.index'))
+    
+    return render_template('admin/profiler.html',
+                         enabled=current_app.config['PROFILER_ENABLED'],
+                         endpoints=profiler.stats.summary())
+
 # Support and Company Pages
 @main.route('/help-center')
 def help_center():
@@ -0,0 +1,361 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy.exc import OperationalError
+from app import db
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of a match in each indexed column
+FIELD_WEIGHTS = {'name': 10.0, 'category': 4.0, 'description': 1.0}
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def create_search_table(connection):
+    """Create the FTS5 index table if it is missing, on SQLite.
+
+    Runs with db.create_all() (as the product table is created) and from
+    `flask rebuild-search-index`; migration 9 adds it to older databases.
+    Returns False when the database is not SQLite or SQLite lacks FTS5.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        connection.execute(db.text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS5Backend.table} USING fts5("
+            "name, description, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    except OperationalError:
+        # SQLite build without FTS5; a failed statement leaves the transaction as it was
+        return False
+    return True
+
+
+class FTS5Backend:
+    """Product index stored in an SQLite FTS5 virtual table.
+
+    The table lives in the application database, so index writes share the
+    transaction of the product change that triggered them.
+    """
+
+    table = 'product_search'
+
+    @classmethod
+    def table_exists(cls):
+        if db.session.get_bind().dialect.name != 'sqlite':
+            return False
+        return db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {'name': cls.table}).first() is not None
+
+    def rebuild(self):
+        db.session.execute(db.text(f"DELETE FROM {self.table}"))
+        db.session.execute(db.text(
+            f"INSERT INTO {self.table} (rowid, name, description, category) "
+            "SELECT id, name, description, category FROM product"
+        ))
+        # Merge the index segments written by the bulk insert
+        db.session.execute(db.text(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')"))
+
+    def index(self, product):
+        self.remove(product.id)
+        db.session.execute(db.text(
+            f"INSERT INTO {self.table} (rowid, name, description, category) "
+            "VALUES (:id, :name, :description, :category)"
+        ), {'id': product.id, 'name': product.name,
+            'description': product.description, 'category': product.category})
+
+    def remove(self, product_id):
+        db.session.execute(db.text(f"DELETE FROM {self.table} WHERE rowid = :id"),
+                           {'id': product_id})
+
+    def search(self, terms, category, offset, limit, sort=None):
+        if not terms:
+            return [], 0
+        # Every term must match (implicit AND), each as a prefix
+        match = ' '.join(f'"{term}"*' for term in terms)
+        if category:
+            match = f'({match}) AND category : "{category.replace(chr(34), "")}"'
+        if sort:
+            return self._sorted(match, offset, limit, sort)
+        window = current_app.config['SEARCH_RANK_WINDOW']
+        params = {'match': match, 'window': window}
+        matches = f"FROM {self.table} WHERE {self.table} MATCH :match"
+        score = f"bm25({self.table}, {FIELD_WEIGHTS['name']}, " \
+                f"{FIELD_WEIGHTS['description']}, {FIELD_WEIGHTS['category']})"
+        # Results come in one fixed order: the newest `window` matches ranked
+        # among themselves, then any older matches ranked among themselves.
+        # A broad query's first pages then cost one pass over the newest
+        # part of the index however many products contain the terms; an
+        # older match is listed after the window even when it ranks higher.
+        ids = []
+        if offset < window:
+            rows = db.session.execute(db.text(
+                f"SELECT rowid, count(*) OVER () FROM (SELECT rowid, {score} AS score {matches} "
+                "ORDER BY rowid DESC LIMIT :window) ORDER BY score, rowid DESC "
+                "LIMIT :limit OFFSET :offset"
+            ), dict(params, limit=min(limit, window - offset), offset=offset)).all()
+            ids = [row[0] for row in rows]
+            if rows and rows[0][1] < window:
+                return ids, rows[0][1]  # The window held every match
+        total = db.session.execute(db.text(f"SELECT count(*) {matches}"), params).scalar()
+        if total <= window or offset + limit <= window:
+            return ids, total
+        # The page reaches past the window into the older matches
+        boundary = db.session.execute(db.text(
+            f"SELECT min(rowid) FROM (SELECT rowid {matches} ORDER BY rowid DESC LIMIT :window)"
+        ), params).scalar()
+        start = max(offset, window) - window
+        rows = db.session.execute(db.text(
+            f"SELECT rowid {matches} AND rowid < :boundary ORDER BY {score}, rowid DESC "
+            "LIMIT :limit OFFSET :offset"
+        ), dict(params, boundary=boundary, limit=offset + limit - window - start, offset=start)).all()
+        return ids + [row[0] for row in rows], total
+
+    def _sorted(self, match, offset, limit, sort):
+        """Matches in a catalog sort order (see app.facets.SORTS) instead of by rank."""
+        from app.models import Product
+
+        matches = db.select(db.literal_column('rowid')).select_from(db.table(self.table)) \
+            .where(db.text(f"{self.table} MATCH :match").bindparams(match=match))
+        total = db.session.execute(
+            db.select(db.func.count()).select_from(matches.subquery())
+        ).scalar()
+        if not total or offset >= total:
+            return [], total
+        # Sorting reads every match; walking the sort's index until a page of
+        # matches turns up reads about (offset + limit) * catalog / total
+        # entries. Written as id + 0 the match list cannot drive the lookup,
+        # so SQLite walks the index instead.
+        catalog = db.session.execute(db.select(db.func.max(Product.id))).scalar() or 0
+        walk = total * total > (offset + limit) * catalog
+        member = Product.id + db.literal_column('0') if walk else Product.id
+        ids = db.session.execute(
+            db.select(Product.id).where(member.in_(matches))
+            .order_by(*[key.desc() if sort['descending'] else key for key in sort['keys']])
+            .offset(offset).limit(limit)
+        ).scalars().all()
+        return ids, total
+
+
+class InvertedIndexBackend:
+    """Pure-Python inverted index, used when FTS5 is unavailable.
+
+    The index is built from the product table on first use and kept in
+    process memory, so each worker process holds its own copy and only
+    sees the product changes made through that process. It is not part of
+    the database transaction either: a change that is rolled back stays
+    indexed until the index is rebuilt. Results are still read from the
+    product table, so such entries can only add or miss a hit.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}   # term -> {product_id: weighted term frequency}
+        self._vocabulary = []  # sorted terms, for prefix lookups
+        self._documents = {}  # product_id -> (terms, category)
+        self._built = False
+
+    def ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def rebuild(self):
+        from app.models import Product
+
+        rows = db.session.execute(
+            db.select(Product.id, Product.name, Product.description, Product.category)
+        ).all()
+        with self._lock:
+            self._postings = {}
+            self._documents = {}
+            for row in rows:
+                self._add(row.id, row.name, row.description, row.category)
+            self._vocabulary = sorted(self._postings)
+            self._built = True
+
+    def index(self, product):
+        with self._lock:
+            self.ensure_built()
+            self._remove(product.id)
+            self._add(product.id, product.name, product.description, product.category,
+                      update_vocabulary=True)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, product_id, name, description, category, update_vocabulary=False):
+        weights = {}
+        for field, text in (('name', name), ('description', description), ('category', category)):
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if update_vocabulary:
+                    bisect.insort(self._vocabulary, term)
+            postings[product_id] = weight
+        self._documents[product_id] = (tuple(weights), category)
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for term in document[0]:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                index = bisect.bisect_left(self._vocabulary, term)
+                if index < len(self._vocabulary) and self._vocabulary[index] == term:
+                    del self._vocabulary[index]
+
+    def _prefix_matches(self, prefix):
+        """Return {product_id: best weight} across every term starting with prefix."""
+        matches = {}
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            for product_id, weight in self._postings[term].items():
+                if weight > matches.get(product_id, 0.0):
+                    matches[product_id] = weight
+        return matches
+
+    def search(self, terms, category, offset, limit, sort=None):
+        if not terms:
+            return [], 0
+        with self._lock:
+            self.ensure_built()
+            document_count = len(self._documents) or 1
+            scores = None
+            for term in terms:
+                matches = self._prefix_matches(term)
+                if not matches:
+                    return [], 0
+                idf = math.log(1 + document_count / len(matches))
+                if scores is None:
+                    scores = {pid: weight * idf for pid, weight in matches.items()}
+                else:
+                    scores = {pid: score + matches[pid] * idf
+                              for pid, score in scores.items() if pid in matches}
+            if category:
+                scores = {pid: score for pid, score in scores.items()
+                          if self._documents[pid][1] == category}
+        if sort:
+            return self._sorted(list(scores), offset, limit, sort), len(scores)
+        ranked = heapq.nsmallest(offset + limit, scores, key=lambda pid: (-scores[pid], pid))
+        return ranked[offset:], len(scores)
+
+    @staticmethod
+    def _sorted(ids, offset, limit, sort, chunk=500):
+        """Order matching ids by the sort keys read from the product table, in chunks."""
+        from app.models import Product
+
+        keys = []
+        for start in range(0, len(ids), chunk):
+            keys.extend(db.session.execute(
+                db.select(*sort['keys']).where(Product.id.in_(ids[start:start + chunk]))
+            ).all())
+        pick = heapq.nlargest if sort['descending'] else heapq.nsmallest
+        # None (a product without created_at) sorts as the lowest value, as in SQLite
+        return [row[-1] for row in pick(offset + limit, keys,
+                                        key=lambda row: [(value is not None, value) for value in row])][offset:]
+
+
+class SearchPagination(Pagination):
+    """Pagination over ranked search hits, compatible with Query.paginate()."""
+
+    def _query_items(self):
+        from app.models import Product
+
+        backend = self._query_args['backend']
+        ids, self._total = backend.search(
+            self._query_args['terms'], self._query_args['category'],
+            self._query_offset, self.per_page, sort=self._query_args['sort']
+        )
+        if not ids:
+            return []
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()}
+        return [products[pid] for pid in ids if pid in products]
+
+    def _query_count(self):
+        return self._total
+
+    # Link arguments for the shared pagination macro; ranked hits are
+    # paged by number since their order has no stable key
+    @property
+    def next_args(self):
+        return {'page': self.next_num}
+
+    @property
+    def prev_args(self):
+        return {'page': self.prev_num}
+
+
+class ProductSearch:
+    """Product search facade, kept in sync by the admin product routes."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app.models import Product
+
+        app.config.setdefault('SEARCH_BACKEND', 'auto')  # auto, fts5 or memory
+        app.config.setdefault('SEARCH_RANK_WINDOW', 5000)
+        app.extensions['product_search'] = {'backend': None}
+        if not db.event.contains(Product.__table__, 'after_create', self._create_with_products):
+            db.event.listen(Product.__table__, 'after_create', self._create_with_products)
+
+    @staticmethod
+    def _create_with_products(target, connection, **kw):
+        create_search_table(connection)
+
+    @property
+    def backend(self):
+        """FTS5 when its table exists (see create_search_table), else the in-memory index.
+
+        Deciding only reads the schema, so the caller's transaction is left alone.
+        """
+        state = current_app.extensions['product_search']
+        if state['backend'] is None:
+            name = current_app.config['SEARCH_BACKEND']
+            if name != 'memory' and FTS5Backend.table_exists():
+                state['backend'] = FTS5Backend()
+            elif name == 'fts5':
+                raise RuntimeError('The product_search table is missing; run `flask db-upgrade` '
+                                   'or `flask rebuild-search-index`')
+            else:
+                state['backend'] = InvertedIndexBackend()
+        return state['backend']
+
+    def index_product(self, product):
+        """Add or refresh a product; call after flush so the product has an id."""
+        self.backend.index(product)
+
+    def remove_product(self, product_id):
+        self.backend.remove(product_id)
+
+    def rebuild(self):
+        self.backend.rebuild()
+
+    def paginate(self, text, page=1, per_page=12, category=None, sort=None):
+        """Ranked matches, or with `sort` (an app.facets.SORTS entry) matches in that order."""
+        return SearchPagination(page=page, per_page=per_page, error_out=False,
+                                backend=self.backend, terms=tokenize(text),
+                                category=category, sort=sort)
+
+
+product_search = ProductSearch()
@@ -51,8 +51,10 @@ function initializeAlerts() {
 }
 
 // Cart Functionality
+// Cart changes go through the JSON cart API (/api/cart), which answers
+// with the changed line and the cart totals instead of a redirect.
 function initializeCart() {
-    // Update cart quantity
+    // Update cart quantity; changes made in quick succession are sent as one batch
     const quantityInputs = document.querySelectorAll('.quantity-input');
     quantityInputs.forEach(input => {
         input.addEventListener('change', function() {
@@ -60,6 +62,16 @@ function initializeCart() {
         });
     });
     
+    // Remove from cart without leaving the page
+    document.querySelectorAll('.remove-from-cart-btn').forEach(btn => {
+        btn.addEventListener('click', function(e) {
+            e.preventDefault();
+            if (confirm('Remove this item from cart?')) {
+                removeCartItem(this.dataset.cartId);
+            }
+        });
+    });
+    
     // Add to cart buttons
     const addToCartBtns = document.querySelectorAll('.add-to-cart-btn');
     addToCartBtns.forEach(btn => {
@@ -71,76 +83,114 @@ function initializeCart() {
         });
     });
     
-    // Cart counter update
-    updateCartCounter();
+    // Add to cart forms on product cards and product pages
+    document.querySelectorAll('form[action="/add-to-cart"]').forEach(form => {
+        form.addEventListener('submit', function(e) {
+            e.preventDefault();
+            const data = new FormData(form);
+            addToCart(data.get('product_id'), data.get('quantity') || 1, form);
+        });
+    });
 }
 
-function addToCart(productId, quantity) {
-    const formData = new FormData();
-    formData.append('product_id', productId);
-    formData.append('quantity', quantity);
-    
-    fetch('/add-to-cart', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.text())
+function cartRequest(url, method, body) {
+    return fetch(url, {
+        method: method,
+        headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+        body: body ? JSON.stringify(body) : undefined
+    }).then(response => response.json().then(data => {
+        if (!response.ok) {
+            const error = new Error(data.error || 'Cart request failed');
+            error.status = response.status;
+            error.data = data;
+            throw error;
+        }
+        return data;
+    }));
+}
+
+function addToCart(productId, quantity, fallbackForm) {
+    cartRequest('/api/cart/items', 'POST', {product_id: productId, quantity: quantity})
     .then(data => {
-        // Update cart counter
-        updateCartCounter();
-        // Show success message
+        updateCartTotals(data.totals);
         showAlert('Item added to cart!', 'success');
-        // Small delay before reload to show the alert
-        setTimeout(() => {
-            window.location.reload();
-        }, 1000);
     })
     .catch(error => {
+        if (error.status === 401 && fallbackForm) {
+            // Not logged in: let the regular form post send the user to the login page
+            fallbackForm.submit();
+            return;
+        }
         console.error('Error adding to cart:', error);
-        showAlert('Error adding item to cart', 'danger');
+        showAlert(error.data ? error.message : 'Error adding item to cart', 'danger');
     });
 }
 
+const pendingQuantities = {};
+let quantityTimeout;
+
 function updateCartItemQuantity(cartId, quantity) {
-    const formData = new FormData();
-    formData.append('cart_id', cartId);
-    formData.append('quantity', quantity);
+    pendingQuantities[cartId] = parseInt(quantity, 10);
+    clearTimeout(quantityTimeout);
+    quantityTimeout = setTimeout(flushCartQuantities, 400);
+}
+
+function flushCartQuantities() {
+    const updates = Object.keys(pendingQuantities).map(id => ({id: parseInt(id, 10), quantity: pendingQuantities[id]}));
+    Object.keys(pendingQuantities).forEach(id => delete pendingQuantities[id]);
+    if (!updates.length) return;
     
-    fetch('/update-cart-quantity', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            updateCartDisplay();
-        } else {
-            showAlert('Error updating cart', 'danger');
-        }
-    })
+    cartRequest('/api/cart/batch', 'POST', {updates: updates})
+    .then(data => updateCartDisplay(data))
     .catch(error => {
         console.error('Error updating cart:', error);
+        const details = error.data && error.data.errors ? Object.values(error.data.errors).join(', ') : '';
+        showAlert(details || 'Error updating cart', 'danger');
     });
 }
 
-function updateCartCounter() {
-    // Fetch cart count from server
-    fetch('/cart-count')
-    .then(response => response.json())
-    .then(data => {
-        const counter = document.querySelector('.cart-counter');
-        if (counter) {
-            counter.textContent = data.count || 0;
-        }
-    })
+function removeCartItem(cartId) {
+    cartRequest(`/api/cart/items/${cartId}`, 'DELETE')
+    .then(data => updateCartDisplay(data))
     .catch(error => {
-        console.error('Error fetching cart count:', error);
-        // Fallback: count visible cart items
-        const cartItems = document.querySelectorAll('.cart-item');
-        const counter = document.querySelector('.cart-counter');
-        if (counter) {
-            counter.textContent = cartItems.length;
-        }
+        console.error('Error removing cart item:', error);
+        showAlert('Error removing item from cart', 'danger');
+    });
+}
+
+function updateCartDisplay(data) {
+    (data.lines || (data.line ? [data.line] : [])).forEach(line => {
+        const row = document.querySelector(`.cart-item[data-cart-id="${line.id}"]`);
+        if (!row) return;
+        const input = row.querySelector('.quantity-input');
+        if (input) input.value = line.quantity;
+        const lineTotal = row.querySelector('.line-total');
+        if (lineTotal) lineTotal.textContent = `₹${line.line_total.toFixed(2)}`;
+    });
+    (data.removed || []).forEach(id => {
+        document.querySelector(`.cart-item[data-cart-id="${id}"]`)?.remove();
+    });
+    updateCartTotals(data.totals);
+    if (data.totals.count === 0 && document.querySelector('.cart-total')) {
+        // Show the empty cart page
+        window.location.reload();
+    }
+}
+
+function updateCartTotals(totals) {
+    const counter = document.querySelector('.cart-counter');
+    if (counter) {
+        counter.textContent = totals.count;
+    }
+    const fields = {
+        '#cart-line-count': totals.count,
+        '#cart-subtotal': `₹${totals.subtotal.toFixed(2)}`,
+        '#cart-tax': `₹${totals.tax.toFixed(2)}`,
+        '#cart-grand-total': `₹${totals.total.toFixed(2)}`
+    };
+    Object.keys(fields).forEach(selector => {
+        const element = document.querySelector(selector);
+        if (element) element.textContent = fields[selector];
     });
 }
 
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Response compression benchmark
+Seeds a small catalog, then for the home page, the catalog, an info page
+and an order export reports the bytes sent and the server time per
+request uncompressed, with gzip and with Brotli, and the time of a
+revalidation answered with 304 Not Modified.
+
+    python benchmarks/bench_compression.py --products 2000 --requests 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User, Product, Order
+
+PAGES = [('home', '/'), ('catalog', '/products'), ('catalog sorted', '/products?sort=price_desc'),
+         ('help center', '/help-center'), ('orders export', '/admin/orders/export.csv')]
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.flush()
+        db.session.execute(db.insert(Product), [
+            {'name': f'Product {i}', 'description': 'A sturdy piece of sports equipment ' * 3,
+             'price': 100 + i % 5000, 'category': ['tennis', 'golf', 'cricket'][i % 3], 'stock_quantity': i % 20}
+            for i in range(args.products)])
+        db.session.execute(db.insert(Order), [
+            {'user_id': admin.id, 'total_amount': 100 + i, 'status': 'delivered'} for i in range(args.orders)])
+        db.session.commit()
+
+    for name, url in PAGES:
+        client = app.test_client()
+        if url.startswith('/admin'):
+            client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+        results = []
+        for encoding in ENCODINGS:
+            samples = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = client.get(url, headers={'Accept-Encoding': encoding})
+                body = response.data
+                samples.append((time.perf_counter() - started) * 1000)
+            results.append(f"{response.headers.get('Content-Encoding', 'identity')} {len(body):>9,} B "
+                           f"{statistics.median(samples):6.2f} ms")
+        line = f"{name:<15} " + ' | '.join(results)
+        etag = response.headers.get('ETag')
+        if etag:
+            samples = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+                samples.append((time.perf_counter() - started) * 1000)
+            line += f" | 304 {statistics.median(samples):6.2f} ms"
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Database concurrency benchmark
+Runs N worker processes against one database, each mixing catalog reads
+with cart writes, and reports throughput per journal mode.
+
+    python benchmarks/bench_db_concurrency.py --workers 1 4 8 --duration 5
+    DATABASE_URL=postgresql://... python benchmarks/bench_db_concurrency.py --modes server
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PRODUCTS = 2000
+USERS = 200
+
+
+def make_config(uri, journal_mode):
+    config = {'SQLALCHEMY_DATABASE_URI': uri}
+    if journal_mode != 'server':
+        config['SQLITE_JOURNAL_MODE'] = journal_mode
+    return config
+
+
+def prepare(uri, journal_mode):
+    from app import create_app, db
+    from app.models import User, Product
+
+    app = create_app(make_config(uri, journal_mode))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password_hash': 'x'}
+            for i in range(USERS)])
+        db.session.execute(db.insert(Product), [
+            {'name': f'Product {i}', 'description': 'Benchmark product', 'price': 100 + i,
+             'category': 'other', 'stock_quantity': 100} for i in range(PRODUCTS)])
+        db.session.commit()
+
+
+def worker(uri, journal_mode, duration, write_ratio, seed, results):
+    from app import create_app, db
+    from app.models import Product, CartItem
+
+    rng = random.Random(seed)
+    app = create_app(make_config(uri, journal_mode))
+    reads = writes = errors = 0
+    with app.app_context():
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < write_ratio:
+                    user_id = rng.randint(1, USERS)
+                    item = CartItem(user_id=user_id, product_id=rng.randint(1, PRODUCTS), quantity=1)
+                    db.session.add(item)
+                    db.session.commit()
+                    db.session.delete(item)
+                    db.session.commit()
+                    writes += 1
+                else:
+                    Product.query.filter_by(category='other').offset(rng.randint(0, PRODUCTS - 12)).limit(12).all()
+                    db.session.get(Product, rng.randint(1, PRODUCTS))
+                    reads += 1
+            except Exception:
+                db.session.rollback()
+                errors += 1
+            db.session.expunge_all()
+    results.put((reads, writes, errors))
+
+
+def run(uri, journal_mode, workers, duration, write_ratio):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker,
+                                         args=(uri, journal_mode, duration, write_ratio, seed, results))
+                 for seed in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    reads = sum(total[0] for total in totals)
+    writes = sum(total[1] for total in totals)
+    errors = sum(total[2] for total in totals)
+    return reads / duration, writes / duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--modes', nargs='+', default=['DELETE', 'WAL'],
+                        help="SQLite journal modes to compare, or 'server' to use DATABASE_URL as-is")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    print(f"{'mode':<8} {'workers':>7} {'reads/s':>10} {'writes/s':>10} {'errors':>7}")
+    for mode in args.modes:
+        if mode == 'server':
+            uri = os.environ['DATABASE_URL']
+        else:
+            uri = f"sqlite:///{os.path.join(workdir, f'bench-{mode.lower()}.db')}"
+        prepare(uri, mode)
+        for workers in args.workers:
+            reads, writes, errors = run(uri, mode, workers, args.duration, args.write_ratio)
+            print(f"{mode:<8} {workers:>7} {reads:>10.0f} {writes:>10.0f} {errors:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
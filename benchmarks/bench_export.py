@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Export benchmark
+Fills a temporary SQLite database with orders and their lines, streams the
+admin CSV and NDJSON order exports and reports rows per second, bytes sent
+and the peak Python memory allocated while streaming. Peak memory must not
+grow with the number of orders exported.
+
+    python benchmarks/bench_export.py --orders 10000 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User, Product, Order, OrderItem
+
+STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+
+
+def add_orders(first_id, count, user_ids, product_ids, rng, chunk_size=10000):
+    """Insert orders first_id..first_id+count-1 with 1-4 lines each; returns the line count."""
+    started = datetime(2020, 1, 1)
+    lines = 0
+    for start in range(first_id, first_id + count, chunk_size):
+        ids = range(start, min(start + chunk_size, first_id + count))
+        db.session.execute(db.insert(Order), [{
+            'id': i, 'user_id': rng.choice(user_ids), 'total_amount': round(rng.uniform(100, 50000), 2),
+            'status': rng.choice(STATUSES), 'created_at': started + timedelta(minutes=i),
+        } for i in ids])
+        items = [{
+            'order_id': i, 'product_id': product_id, 'quantity': rng.randint(1, 3),
+            'price': round(rng.uniform(100, 10000), 2),
+        } for i in ids for product_id in rng.sample(product_ids, rng.randint(1, 4))]
+        db.session.execute(db.insert(OrderItem), items)
+        lines += len(items)
+        db.session.commit()
+    return lines
+
+
+def stream(client, url):
+    """Read the response chunk by chunk; returns (bytes, lines, seconds, peak bytes)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    assert response.status_code == 200, response.status_code
+    size = lines = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+    response.close()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, lines, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, nargs='+', default=[10000, 100000],
+                        help='export sizes to compare, smallest first')
+    parser.add_argument('--max-growth', type=float, default=2.0,
+                        help='fail if peak memory at the largest size is this many times the smallest')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'WTF_CSRF_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.execute(db.insert(User), [{
+            'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+        } for i in range(1000)])
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}', 'description': 'Benchmark product', 'price': 100 + i,
+            'category': 'other', 'stock_quantity': 10,
+        } for i in range(500)])
+        db.session.commit()
+        user_ids = list(db.session.execute(db.select(User.id)).scalars())
+        product_ids = list(db.session.execute(db.select(Product.id)).scalars())
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+
+    print(f"{'orders':>8} {'format':>7} {'lines':>9} {'MB':>8} {'rows/s':>10} {'peak KB':>9}")
+    peaks = []
+    total = 0
+    for size in sorted(args.orders):
+        with app.app_context():
+            add_orders(total + 1, size - total, user_ids, product_ids, rng)
+        total = size
+        for fmt in ('csv', 'ndjson'):
+            nbytes, lines, elapsed, peak = stream(client, f'/admin/orders/export.{fmt}')
+            peaks.append(peak)
+            print(f"{size:>8} {fmt:>7} {lines:>9} {nbytes / 1e6:>8.1f} "
+                  f"{lines / elapsed:>10.0f} {peak / 1024:>9.0f}")
+
+    growth = max(peaks[-2:]) / max(peaks[:2])
+    bounded = growth <= args.max_growth
+    print(f"\nPeak memory, largest vs smallest export: {growth:.2f}x ({'bounded' if bounded else 'GROWS'})")
+    return 0 if bounded else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Faceted catalog benchmark
+Generates products and reviews with benchmarks/generate_data.py's
+generator, then times rebuilding and reading the facet_count table,
+summing counts for a filter combination, and fetching the first and a
+later page of the listing for random filter combinations.
+
+    python benchmarks/bench_facets.py --products 1000000 --combinations 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import Product
+from app import facets
+from app.facets import CatalogFilters, RATING_OPTIONS, catalog_facets
+from app.pagination import KeysetPagination
+from generate_data import CATEGORIES, Generator
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def summary(label, samples):
+    ordered = sorted(samples)
+    print(f"{label:<26} p50 {statistics.median(ordered):8.2f} ms   p95 {ordered[int(len(ordered) * 0.95)]:8.2f} ms"
+          f"   max {ordered[-1]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=None, help='default: one per two products')
+    parser.add_argument('--combinations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='spequip-bench-'), 'facets.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'SQLITE_SYNCHRONOUS': 'OFF'})
+    reviews = args.products // 2 if args.reviews is None else args.reviews
+    with app.app_context():
+        db.create_all()
+        Generator(args.seed, max(1000, reviews // 50), args.products, 0, reviews, 365).run()
+        Product.refresh_rating_aggregates()
+        db.session.commit()
+
+    rng = random.Random(args.seed)
+    with app.test_request_context():
+        build_ms, _ = timed(facets.rebuild)
+        db.session.commit()
+        read_ms, cells = timed(facets.read_cells)
+        print(f"{args.products:,} products; {len(cells)} facet cells rebuilt in {build_ms:.0f} ms, "
+              f"read in {read_ms:.2f} ms\n")
+        bands = len(catalog_facets.price_bands())
+
+        counting, first_pages, later_pages = [], [], []
+        for _ in range(args.combinations):
+            filters = CatalogFilters(
+                category=rng.choice([None, *CATEGORIES]),
+                price=rng.choice([None, *range(bands)]),
+                in_stock=rng.random() < 0.5,
+                min_rating=rng.choice([None, *RATING_OPTIONS]),
+            )
+            ms, counts = timed(lambda: catalog_facets.counts(filters))
+            counting.append(ms)
+            query = filters.apply(Product.query)
+            ms, page = timed(lambda: KeysetPagination(query, [Product.id], per_page=12, total=counts['total']))
+            first_pages.append(ms)
+            if page.next_cursor:
+                ms, _ = timed(lambda: KeysetPagination(query, [Product.id], per_page=12, cursor=page.next_cursor,
+                                                       total=counts['total']))
+                later_pages.append(ms)
+            db.session.rollback()
+
+    summary('facet counts', counting)
+    summary('first page', first_pages)
+    if later_pages:
+        summary('second page', later_pages)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Catalog import benchmark
+Writes a CSV of synthetic products, imports it into a temporary SQLite
+database twice (all inserts, then all updates) through app.catalog_import
+and reports rows per second for each pass, including the search index and
+metrics rebuild at the end.
+
+    python benchmarks/bench_import.py --products 100000
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.catalog_import import read_rows, import_products
+from app.models import Product
+
+CATEGORIES = ['football', 'basketball', 'tennis', 'soccer', 'baseball', 'golf',
+              'fitness', 'running', 'swimming', 'cycling', 'other']
+WORDS = ['pro', 'lite', 'match', 'training', 'carbon', 'grip', 'elite', 'junior', 'speed', 'classic']
+
+
+def write_catalog(path, count, rng, bad_every):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'description', 'price', 'category', 'image_url', 'stock_quantity'])
+        for i in range(count):
+            price = round(rng.uniform(100, 50000), 2)
+            if bad_every and i % bad_every == 0:
+                price = 'n/a'  # Rejected by the FloatField
+            writer.writerow([
+                f"{rng.choice(WORDS).title()} {rng.choice(CATEGORIES).title()} {i}",
+                ' '.join(rng.choice(WORDS) for _ in range(12)),
+                price, rng.choice(CATEGORIES), '', rng.randint(1, 200),
+            ])
+
+
+def timed_import(app, path, batch_size):
+    with app.app_context():
+        started = time.perf_counter()
+        with open(path, newline='') as stream:
+            result = import_products(read_rows(stream, 'csv'), batch_size=batch_size)
+        db.session.commit()
+        return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--bad-every', type=int, default=1000, help='make every Nth row invalid (0 for none)')
+    parser.add_argument('--max-seconds', type=float, default=60.0, help='fail if a pass takes longer')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    path = os.path.join(workdir, 'catalog.csv')
+    write_catalog(path, args.products, rng, args.bad_every)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+    with app.app_context():
+        db.create_all()
+
+    print(f"{'pass':>8} {'added':>8} {'updated':>8} {'rejected':>8} {'seconds':>8} {'rows/s':>9}")
+    worst = 0
+    for label in ('insert', 'update'):
+        result, elapsed = timed_import(app, path, args.batch_size)
+        worst = max(worst, elapsed)
+        print(f"{label:>8} {result.inserted:>8} {result.updated:>8} {len(result.errors):>8} "
+              f"{elapsed:>8.2f} {args.products / elapsed:>9.0f}")
+
+    with app.app_context():
+        stored = db.session.query(db.func.count(Product.id)).scalar()
+    expected = args.products - len(result.errors)
+    assert stored == expected, f"{stored} products stored, expected {expected}"
+    fast = worst <= args.max_seconds
+    print(f"\nSlowest pass: {worst:.2f}s ({'ok' if fast else 'TOO SLOW'})")
+    return 0 if fast else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
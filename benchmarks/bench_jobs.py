@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Background job benchmark
+Times the admin image upload with the resize queued for a worker against
+running it before the response (JOBS_EAGER), then measures how many
+no-op jobs per second one and several worker processes get through the
+SQLite-backed queue. Needs Pillow for the upload part.
+
+    python benchmarks/bench_jobs.py --uploads 30 --jobs 5000 --processes 4
+"""
+
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User, Product
+from app.jobs import job, jobs
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@job('bench.noop')
+def noop(n):
+    pass
+
+
+def make_app(workdir, name, **config):
+    app = create_app(dict({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, name)}",
+        'WTF_CSRF_ENABLED': False,
+        'IMAGE_DIR': os.path.join(workdir, 'images'),
+        'JOBS_POLL_INTERVAL': 0.05,
+    }, **config))
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.add(Product(name='Ball', description='Bench', price=10, category='other', stock_quantity=5))
+        db.session.commit()
+    return app
+
+
+def upload_latencies(app, uploads, rng):
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    samples = []
+    for _ in range(uploads):
+        buffer = io.BytesIO()
+        # A new image each time, so nothing is found already resized
+        Image.effect_noise((1600, 1200), rng.randint(10, 100)).convert('RGB').save(buffer, 'JPEG')
+        started = time.perf_counter()
+        response = client.post('/admin/products/edit/1', content_type='multipart/form-data', data={
+            'name': 'Ball', 'description': 'Bench', 'price': 10, 'category': 'other', 'image_url': '',
+            'stock_quantity': 5, 'image_file': (io.BytesIO(buffer.getvalue()), 'ball.jpg'),
+        })
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 302, response.status_code
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--uploads', type=int, default=20)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    rng = random.Random(args.seed)
+    if Image is None:
+        print("Pillow is not installed; skipping the upload timings")
+    else:
+        for label, eager in [('resize before response', True), ('resize queued', False)]:
+            app = make_app(workdir, f'upload-{eager}.db', JOBS_EAGER=eager)
+            samples = sorted(upload_latencies(app, args.uploads, rng))
+            print(f"{label:<24} p50 {statistics.median(samples):8.1f} ms   "
+                  f"p95 {samples[int(len(samples) * 0.95)]:8.1f} ms")
+            if not eager:
+                with app.app_context():
+                    started = time.perf_counter()
+                    ran = jobs.work(until_idle=True)
+                    print(f"{'':<24} worker caught up on {ran} resizes in "
+                          f"{time.perf_counter() - started:.2f}s")
+        print()
+
+    for processes in sorted({1, args.processes}):
+        app = make_app(workdir, f'throughput-{processes}.db')
+        with app.app_context():
+            for n in range(args.jobs):
+                jobs.enqueue('bench.noop', {'n': n})
+            db.session.commit()
+        started = time.perf_counter()
+        jobs.run_workers(app, processes, until_idle=True)
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            done = jobs.counts().get('done', 0)
+        print(f"{processes} worker process(es): {done} jobs in {elapsed:.2f}s ({done / elapsed:,.0f} jobs/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark
+Sends a credential-stuffing burst (wrong passwords for a handful of real
+accounts, from a few client IPs) at /login from many threads and reports
+throughput, latency and how many password hashes were computed, first with
+the throttle off and then on. With it on, hashing stops once each email
+or IP reaches its failure limit.
+
+    python benchmarks/bench_login.py --attempts 400 --concurrency 16
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User
+
+
+def run(throttle, attempts, concurrency, accounts, ips, method):
+    path = os.path.join(tempfile.mkdtemp(prefix='spequip-bench-'), 'login.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'WTF_CSRF_ENABLED': False,
+                      'PASSWORD_HASH_METHOD': method, 'LOGIN_THROTTLE_ENABLED': throttle})
+    with app.app_context():
+        db.create_all()
+        for i in range(accounts):
+            user = User(username=f'victim{i}', email=f'victim{i}@example.com')
+            user.set_password('correct-horse')
+            db.session.add(user)
+        db.session.commit()
+
+    hashes = []
+    lock = threading.Lock()
+    original = User.check_password
+
+    def counting_check(user, password):
+        with lock:
+            hashes.append(1)
+        return original(user, password)
+
+    def attempt(i):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', data={'email': f'victim{i % accounts}@example.com', 'password': f'guess{i}'},
+                               environ_base={'REMOTE_ADDR': f'10.0.0.{i % ips}'})
+        return (time.perf_counter() - started) * 1000, response.status_code
+
+    User.check_password = counting_check
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(attempt, range(attempts)))
+        elapsed = time.perf_counter() - started
+    finally:
+        User.check_password = original
+        os.remove(path)
+
+    timings = sorted(ms for ms, _ in results)
+    return {
+        'elapsed': elapsed,
+        'rps': attempts / elapsed,
+        'p50': statistics.median(timings),
+        'p95': timings[int(len(timings) * 0.95)],
+        'hashes': len(hashes),
+        'rejected': sum(1 for _, status in results if status == 429),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--accounts', type=int, default=10, help='distinct emails attacked')
+    parser.add_argument('--ips', type=int, default=4, help='distinct client addresses')
+    parser.add_argument('--method', default='scrypt:32768:8:1', help='PASSWORD_HASH_METHOD')
+    args = parser.parse_args()
+
+    print(f"{'throttle':<10} {'seconds':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'hashes':>7} {'429s':>6}")
+    for throttle in (False, True):
+        row = run(throttle, args.attempts, args.concurrency, args.accounts, args.ips, args.method)
+        print(f"{'on' if throttle else 'off':<10} {row['elapsed']:>8.2f} {row['rps']:>8.1f} {row['p50']:>8.1f} "
+              f"{row['p95']:>8.1f} {row['hashes']:>7} {row['rejected']:>6}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
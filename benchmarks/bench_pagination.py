@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Pagination benchmark
+Fills a temporary SQLite database with orders and times the first and a
+deep page of the admin order listing, paged with OFFSET (Query.paginate)
+and with keyset cursors (app.pagination).
+
+    python benchmarks/bench_pagination.py --orders 200000 --page 10000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User, Order
+from app.pagination import KeysetPagination, encode_cursor
+
+STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+
+
+def generate_orders(count, user_ids, rng, chunk_size=10000):
+    started = datetime(2020, 1, 1)
+    for start in range(0, count, chunk_size):
+        rows = []
+        for i in range(start, min(start + chunk_size, count)):
+            rows.append({
+                'user_id': rng.choice(user_ids),
+                'total_amount': round(rng.uniform(100, 50000), 2),
+                'status': rng.choice(STATUSES),
+                # Whole minutes, so many orders share a timestamp and the id breaks ties
+                'created_at': started + timedelta(minutes=i // 3),
+            })
+        yield rows
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_calls(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.expunge_all()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--page', type=int, default=10000, help='deep page to compare with page 1')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--max-ratio', type=float, default=2.0,
+                        help='fail if the deep keyset page p50 is this many times page 1')
+    args = parser.parse_args()
+    if (args.page - 1) * args.per_page >= args.orders:
+        parser.error('--page is past the last order; raise --orders')
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+
+    with app.test_request_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [{
+            'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+        } for i in range(args.users)])
+        user_ids = db.session.execute(db.select(User.id)).scalars().all()
+        started = time.perf_counter()
+        for rows in generate_orders(args.orders, user_ids, rng):
+            db.session.execute(db.insert(Order), rows)
+        db.session.commit()
+        print(f"Inserted {args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+        query = Order.query.options(db.joinedload(Order.user))
+        keys = [Order.created_at, Order.id]
+        newest_first = [Order.created_at.desc(), Order.id.desc()]
+
+        # The cursor a reader would hold after paging through to the deep page
+        offset = (args.page - 1) * args.per_page
+        before = query.order_by(*newest_first).offset(offset - 1).first()
+        deep_cursor = encode_cursor([before.created_at, before.id], 'next')
+
+        cases = [
+            ('offset', 'page 1', lambda: query.order_by(*newest_first)
+                .paginate(page=1, per_page=args.per_page, error_out=False).items),
+            ('offset', f'page {args.page}', lambda: query.order_by(*newest_first)
+                .paginate(page=args.page, per_page=args.per_page, error_out=False).items),
+            ('keyset', 'page 1', lambda: KeysetPagination(
+                query, keys, per_page=args.per_page, descending=True, totals=None).items),
+            ('keyset', f'page {args.page}', lambda: KeysetPagination(
+                query, keys, per_page=args.per_page, cursor=deep_cursor,
+                descending=True, totals=None).items),
+            ('keyset+est', f'page {args.page}', lambda: KeysetPagination(
+                query, keys, per_page=args.per_page, cursor=deep_cursor,
+                descending=True, totals='estimate').items),
+        ]
+
+        medians = {}
+        print(f"\n{'mode':<11} {'page':<11} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for mode, label, func in cases:
+            timings = time_calls(func, args.repeat)
+            medians[mode, label] = statistics.median(timings)
+            print(f"{mode:<11} {label:<11} {medians[mode, label]:>8.2f} "
+                  f"{percentile(timings, 95):>8.2f} {max(timings):>8.2f}")
+
+        # Sanity check: both strategies land on the same rows
+        offset_ids = [order.id for order in query.order_by(*newest_first)
+                      .offset(offset).limit(args.per_page)]
+        keyset_ids = [order.id for order in KeysetPagination(
+            query, keys, per_page=args.per_page, cursor=deep_cursor, descending=True, totals=None).items]
+        assert offset_ids == keyset_ids, 'keyset page differs from the OFFSET page'
+
+    ratio = medians['keyset', f'page {args.page}'] / medians['keyset', 'page 1']
+    failed = ratio > args.max_ratio
+    print(f"\nKeyset page {args.page} / page 1: {ratio:.2f}x "
+          f"(limit {args.max_ratio:.1f}x): {'FAILED' if failed else 'ok'}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Route benchmark harness
+Drives the real Flask routes, either in-process through the test client or
+against a running server, and reports per endpoint latency percentiles,
+throughput, errors and SQL statements per request. Results are written to
+a JSON file; pass an earlier file to --compare to see what changed.
+
+    python benchmarks/generate_data.py --database instance/loadtest.db --users 1e5 --orders 5e5
+    python benchmarks/bench_routes.py --database instance/loadtest.db --requests 200 \\
+        --output results/before.json
+    python benchmarks/bench_routes.py --url http://127.0.0.1:5000 --concurrency 8 \\
+        --compare results/before.json
+
+Statement counts are only available in-process. The default credentials
+are the ones generate_data.py creates.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# (name, who is logged in, path); {product} is replaced by a random product id per request
+ENDPOINTS = [
+    ('home', None, '/'),
+    ('catalog', None, '/products'),
+    ('catalog_category', None, '/products?category=tennis'),
+    ('search', None, '/products?search=carbon+ball'),
+    ('product', None, '/product/{product}'),
+    ('about', None, '/about-us'),
+    ('cart', 'customer', '/cart'),
+    ('cart_api', 'customer', '/api/cart'),
+    ('orders', 'customer', '/orders'),
+    ('wishlist', 'customer', '/wishlist'),
+    ('admin_dashboard', 'admin', '/admin'),
+    ('admin_products', 'admin', '/admin/products'),
+    ('admin_orders', 'admin', '/admin/orders'),
+    ('admin_users', 'admin', '/admin/users'),
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class InProcessTarget:
+    """Requests go through app.test_client(); SQL statements are counted per thread."""
+
+    counts_statements = True
+
+    def __init__(self, database, config, instance_path=None):
+        from app import create_app, db
+
+        url = database if '://' in database else f"sqlite:///{os.path.abspath(database)}"
+        self.app = create_app(dict({'SQLALCHEMY_DATABASE_URI': url, 'WTF_CSRF_ENABLED': False}, **config),
+                              instance_path=instance_path)
+        self.local = threading.local()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self.local.statements = getattr(self.local, 'statements', 0) + 1
+
+        with self.app.app_context():
+            db.event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            from app.models import Product
+            self.max_product_id = db.session.query(db.func.max(Product.id)).scalar() or 1
+
+    def session(self, credentials):
+        client = self.app.test_client()
+        if credentials:
+            response = client.post('/login', data={'email': credentials[0], 'password': credentials[1]})
+            if response.status_code != 302:
+                raise SystemExit(f'Could not log in as {credentials[0]}')
+        return client
+
+    def get(self, client, path):
+        self.local.statements = 0
+        response = client.get(path)
+        response.close()
+        return response.status_code, self.local.statements
+
+
+class ServerTarget:
+    """Requests go over HTTP to a running server, one cookie jar per session."""
+
+    counts_statements = False
+
+    def __init__(self, url, max_product_id):
+        self.url = url.rstrip('/')
+        self.max_product_id = max_product_id
+
+    def session(self, credentials):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        if credentials:
+            page = opener.open(f'{self.url}/login').read().decode()
+            token = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page)
+            data = {'email': credentials[0], 'password': credentials[1]}
+            if token:
+                data['csrf_token'] = token.group(1)
+            response = opener.open(f'{self.url}/login', urllib.parse.urlencode(data).encode())
+            if response.geturl().rstrip('/').endswith('/login'):
+                raise SystemExit(f'Could not log in as {credentials[0]}')
+        return opener
+
+    def get(self, opener, path):
+        try:
+            with opener.open(f'{self.url}{path}') as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def run_endpoint(target, path, credentials, requests, warmup, concurrency, seed):
+    local = threading.local()
+    rng = random.Random(seed)
+    paths = [path.format(product=rng.randint(1, target.max_product_id)) for _ in range(warmup + requests)]
+
+    def one(request_path):
+        if not hasattr(local, 'client'):
+            local.client = target.session(credentials)
+        started = time.perf_counter()
+        status, statements = target.get(local.client, request_path)
+        return (time.perf_counter() - started) * 1000, status, statements
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, paths[:warmup]))
+        started = time.perf_counter()
+        samples = list(pool.map(one, paths[warmup:]))
+        elapsed = time.perf_counter() - started
+
+    timings = [ms for ms, _, _ in samples]
+    errors = sum(1 for _, status, _ in samples if status >= 400)
+    statements = [count for _, _, count in samples if count is not None]
+    return {
+        'path': path,
+        'role': credentials and credentials[0],
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'statements': {
+            'min': min(statements), 'max': max(statements), 'mean': round(statistics.mean(statements), 2),
+        } if statements else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'stmts':>6} {'errors':>6}"
+          + ('   p50 vs baseline' if baseline else ''))
+    for name, row in results.items():
+        statements = row['statements']['mean'] if row['statements'] else '-'
+        line = (f"{name:<18} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                f"{row['throughput_rps']:>8.1f} {statements:>6} {row['errors']:>6}")
+        before = (baseline or {}).get(name)
+        if before:
+            change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line += f"   {before['p50_ms']:>8.2f} -> {change:+.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument('--database', default=os.path.join('instance', 'loadtest.db'),
+                              help='SQLite file or database URL to benchmark in-process')
+    target_group.add_argument('--url', help='benchmark a running server instead, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--requests', type=int, default=100, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--endpoints', nargs='+', metavar='NAME', help='only these endpoints')
+    parser.add_argument('--customer', default='user0@example.com:password123', help='email:password')
+    parser.add_argument('--admin', default='admin@example.com:admin123', help='email:password')
+    parser.add_argument('--max-product-id', type=int, default=1000,
+                        help='product ids to sample with --url (read from the database in-process)')
+    parser.add_argument('--no-cache', action='store_true', help='disable the page and user caches (in-process)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    endpoints = [e for e in ENDPOINTS if not args.endpoints or e[0] in args.endpoints]
+    if not endpoints:
+        parser.error(f"no such endpoint; choose from: {', '.join(e[0] for e in ENDPOINTS)}")
+    credentials = {'customer': tuple(args.customer.split(':', 1)), 'admin': tuple(args.admin.split(':', 1))}
+
+    if args.url:
+        target = ServerTarget(args.url, args.max_product_id)
+    else:
+        if '://' not in args.database and not os.path.exists(args.database):
+            parser.error(f'{args.database} does not exist; create it with benchmarks/generate_data.py')
+        config = {'FRAGMENT_CACHE_BACKEND': 'none', 'USER_CACHE_BACKEND': 'none'} if args.no_cache else {}
+        target = InProcessTarget(args.database, config)
+
+    results = {}
+    for name, role, path in endpoints:
+        results[name] = run_endpoint(target, path, credentials.get(role), args.requests, args.warmup,
+                                     args.concurrency, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['endpoints']
+    print_results(results, baseline)
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': args.url or args.database,
+            'mode': 'server' if args.url else 'in-process',
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'caches': not args.no_cache,
+        },
+        'endpoints': results,
+    }
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    return 1 if any(row['errors'] for row in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
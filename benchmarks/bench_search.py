@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Product search benchmark
+Builds a synthetic catalog in a temporary SQLite database and times ranked
+searches through the same product_search layer the /products route uses.
+
+    python benchmarks/bench_search.py --products 1000000 --backend fts5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import Product
+from app.search import product_search
+
+CATEGORIES = ['football', 'basketball', 'tennis', 'soccer', 'baseball', 'golf',
+              'fitness', 'running', 'swimming', 'cycling', 'other']
+BRANDS = ['Apex', 'Stride', 'Vortex', 'Summit', 'Pulse', 'Titan', 'Nimbus', 'Falcon',
+          'Orbit', 'Rally', 'Zenith', 'Kinetic', 'Momentum', 'Velocity', 'Strato']
+NOUNS = ['Ball', 'Racket', 'Helmet', 'Shoes', 'Gloves', 'Bat', 'Net', 'Goggles', 'Bottle',
+         'Jersey', 'Pads', 'Mat', 'Dumbbell', 'Bag', 'Cap', 'Socks', 'Grip', 'Strings']
+ADJECTIVES = ['Pro', 'Elite', 'Training', 'Tournament', 'Lightweight', 'Carbon',
+              'Premium', 'Junior', 'Indoor', 'Outdoor', 'Classic', 'Ultra']
+
+
+def make_vocabulary(rng, size=5000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+
+
+def generate_products(count, rng, chunk_size=10000):
+    vocabulary = make_vocabulary(rng)
+    for start in range(0, count, chunk_size):
+        rows = []
+        for i in range(start, min(start + chunk_size, count)):
+            rows.append({
+                'name': f'{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+                'description': ' '.join(rng.choices(vocabulary, k=20)),
+                'price': round(rng.uniform(100, 50000), 2),
+                'category': rng.choice(CATEGORIES),
+                'stock_quantity': rng.randint(0, 200),
+            })
+        yield rows
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--backend', choices=['fts5', 'memory'], default='fts5')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=50.0,
+                        help='fail if any query p95 is above this many milliseconds')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'SEARCH_BACKEND': args.backend,
+    })
+
+    with app.test_request_context():
+        db.create_all()
+        started = time.perf_counter()
+        for rows in generate_products(args.products, rng):
+            db.session.execute(db.insert(Product), rows)
+        db.session.commit()
+        print(f"Inserted {args.products} products in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        product_search.rebuild()
+        db.session.commit()
+        print(f"Built {args.backend} index in {time.perf_counter() - started:.1f}s")
+
+        sample = db.session.get(Product, args.products // 2)
+        description_word = sample.description.split()[0]
+        queries = [
+            ('single term', 'helmet', None, 1),
+            ('multi term', 'apex carbon racket', None, 1),
+            ('prefix', 'vort', None, 1),
+            ('description', description_word, None, 1),
+            ('category filter', 'pro ball', 'tennis', 1),
+            ('deep page', 'summit', None, 50),
+            ('broad', 'ba', None, 1),
+        ]
+
+        failed = False
+        print(f"\n{'query':<16} {'hits':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for label, text, category, page in queries:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                results = product_search.paginate(text, page=page, per_page=12, category=category)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.session.expunge_all()
+            p95 = percentile(timings, 95)
+            failed = failed or p95 > args.budget_ms
+            print(f"{label:<16} {results.total:>9} {statistics.median(timings):>8.2f} "
+                  f"{p95:>8.2f} {max(timings):>8.2f}")
+
+    print(f"\nBudget {args.budget_ms:.0f} ms p95: {'FAILED' if failed else 'ok'}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Catalog sort benchmark
+Generates products, orders and reviews with benchmarks/generate_data.py's
+generator, then times the first and a deep page of every catalog sort,
+over the whole catalog, within a category and under random facet
+filters, plus sorted search. The best-rated and best-selling sorts are
+compared with computing the same first page from the reviews and order
+lines instead of the stored columns.
+
+    python benchmarks/bench_sorts.py --products 1000000 --orders 1000000 --samples 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import Product, Order, OrderItem, Review
+from app.facets import CatalogFilters, RATING_OPTIONS, SORTS, catalog_facets
+from app.pagination import KeysetPagination
+from app.search import product_search
+from generate_data import CATEGORIES, ADJECTIVES, Generator
+
+DEEP_PAGE = 20
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def summary(label, samples):
+    ordered = sorted(samples)
+    print(f"{label:<34} p50 {statistics.median(ordered):8.2f} ms   p95 {ordered[int(len(ordered) * 0.95)]:8.2f} ms"
+          f"   max {ordered[-1]:8.2f} ms")
+
+
+def page(filters, cursor=None):
+    sort = filters.ordering
+    return KeysetPagination(filters.apply(Product.query), sort['keys'], per_page=12, cursor=cursor,
+                            descending=sort['descending'], totals=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=None, help='default: one per product')
+    parser.add_argument('--reviews', type=int, default=None, help='default: one per two products')
+    parser.add_argument('--samples', type=int, default=30, help='timed pages per sort and scope')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='spequip-bench-'), 'sorts.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'SQLITE_SYNCHRONOUS': 'OFF'})
+    orders = args.products if args.orders is None else args.orders
+    reviews = args.products // 2 if args.reviews is None else args.reviews
+    with app.app_context():
+        db.create_all()
+        Generator(args.seed, max(1000, reviews // 50), args.products, orders, reviews, 365).run()
+        for label, step in [('ratings', Product.refresh_rating_aggregates), ('sales', Product.refresh_sales),
+                            ('search index', product_search.rebuild)]:
+            ms, _ = timed(step)
+            db.session.commit()
+            print(f"{label:>12}: refreshed in {ms / 1000:6.1f}s")
+    print()
+
+    rng = random.Random(args.seed)
+    with app.test_request_context():
+        bands = len(catalog_facets.price_bands())
+        scopes = {
+            'all': lambda: CatalogFilters(),
+            'category': lambda: CatalogFilters(category=rng.choice(CATEGORIES)),
+            'filtered': lambda: CatalogFilters(category=rng.choice([None, *CATEGORIES]),
+                                               price=rng.choice([None, *range(bands)]),
+                                               in_stock=rng.random() < 0.5,
+                                               min_rating=rng.choice([None, *RATING_OPTIONS])),
+        }
+        for sort in SORTS:
+            for scope, make_filters in scopes.items():
+                first_pages, deep_pages = [], []
+                for _ in range(args.samples):
+                    filters = make_filters()
+                    filters.sort = sort
+                    ms, current = timed(lambda: page(filters))
+                    first_pages.append(ms)
+                    # Walk to a deep page and time only the last step
+                    for _ in range(DEEP_PAGE - 2):
+                        if not current.next_cursor:
+                            break
+                        current = page(filters, current.next_cursor)
+                    if current.next_cursor:
+                        ms, _ = timed(lambda: page(filters, current.next_cursor))
+                        deep_pages.append(ms)
+                    db.session.rollback()
+                summary(f'{sort} / {scope} first page', first_pages)
+                if deep_pages:
+                    summary(f'{sort} / {scope} page {DEEP_PAGE}', deep_pages)
+
+        print()
+        for sort in SORTS:
+            for term in (rng.choice(ADJECTIVES).lower(), 'ball'):
+                samples = [timed(lambda: product_search.paginate(term, per_page=12, sort=SORTS[sort]).items)[0]
+                           for _ in range(max(3, args.samples // 10))]
+                summary(f'search "{term}" / {sort}', samples)
+
+        # What the stored columns save: the same first pages from the source rows
+        print()
+        average = db.func.avg(Review.rating).label('average')
+        samples = [timed(lambda: db.session.execute(
+            db.select(Review.product_id, average).group_by(Review.product_id)
+            .order_by(average.desc(), Review.product_id.desc()).limit(12)).all())[0]
+            for _ in range(3)]
+        summary('rating from reviews', samples)
+        units = db.func.sum(OrderItem.quantity).label('units')
+        samples = [timed(lambda: db.session.execute(
+            db.select(OrderItem.product_id, units).join(Order, Order.id == OrderItem.order_id)
+            .where(Order.status != 'cancelled').group_by(OrderItem.product_id)
+            .order_by(units.desc(), OrderItem.product_id.desc()).limit(12)).all())[0]
+            for _ in range(3)]
+        summary('bestselling from order lines', samples)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
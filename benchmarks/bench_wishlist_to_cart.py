@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Wishlist-to-cart benchmark
+Posts /add-all-to-cart for wishlists of growing size and reports the SQL
+statements and time each request takes. The statement count must not
+depend on the wishlist size.
+
+    python benchmarks/bench_wishlist_to_cart.py --sizes 10 100 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User, Product, CartItem, Wishlist
+
+
+def make_user(app, name, size, products, rng):
+    """A user whose wishlist holds `size` products; some are out of stock or already in the cart."""
+    with app.app_context():
+        user = User(username=name, email=f'{name}@example.com')
+        user.set_password('bench123')
+        db.session.add(user)
+        db.session.flush()
+        expected = 0
+        for product in rng.sample(products, size):
+            db.session.add(Wishlist(user_id=user.id, product_id=product['id']))
+            in_cart = rng.random() < 0.3
+            if in_cart:
+                quantity = rng.randint(1, max(1, product['stock']))
+                db.session.add(CartItem(user_id=user.id, product_id=product['id'], quantity=quantity))
+            # The rules the route applies: one more unit while stock allows
+            if product['stock'] > 0 and (not in_cart or product['stock'] > quantity):
+                expected += 1
+        db.session.commit()
+        cart_units = db.session.query(db.func.sum(CartItem.quantity)).filter_by(user_id=user.id).scalar()
+        return user.id, user.email, cart_units or 0, expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix='spequip-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'WTF_CSRF_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Product), [{
+            'name': f'Product {i}', 'description': 'Benchmark product', 'price': 100 + i,
+            'category': 'other', 'stock_quantity': 0 if i % 10 == 0 else rng.randint(1, 5),
+        } for i in range(max(args.sizes))])
+        db.session.commit()
+        products = [{'id': pid, 'stock': stock} for pid, stock in
+                    db.session.execute(db.select(Product.id, Product.stock_quantity))]
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    counts = set()
+    print(f"{'wishlist':>8} {'added':>6} {'statements':>10} {'p50 ms':>8} {'max ms':>8}")
+    for size in args.sizes:
+        timings = []
+        for attempt in range(args.repeat):
+            user_id, email, cart_before, expected = make_user(
+                app, f'wishlist{size}-{attempt}', size, products, rng)
+            client = app.test_client()
+            client.post('/login', data={'email': email, 'password': 'bench123'})
+            del statements[:]
+            started = time.perf_counter()
+            response = client.post('/add-all-to-cart')
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 302
+            request_statements = len(statements)
+            counts.add(request_statements)
+
+            with app.app_context():
+                cart_after = db.session.query(db.func.sum(CartItem.quantity)) \
+                    .filter_by(user_id=user_id).scalar() or 0
+            assert cart_after - cart_before == expected, \
+                f"added {cart_after - cart_before} units, expected {expected}"
+        print(f"{size:>8} {expected:>6} {request_statements:>10} "
+              f"{statistics.median(timings):>8.2f} {max(timings):>8.2f}")
+
+    constant = len(counts) == 1
+    print(f"\nStatements per request: {sorted(counts)} ({'constant' if constant else 'VARIES'})")
+    return 0 if constant else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator
+Fills a database with a deterministic, arbitrarily large dataset for load
+testing: users, products, orders with their lines, and reviews. Rows are
+written with executemany bulk inserts in chunks, so memory use does not
+depend on the dataset size, and the same --seed always produces the same
+data.
+
+    python benchmarks/generate_data.py --database instance/loadtest.db \\
+        --users 1e6 --products 1e5 --orders 5e6 --reviews 1e6
+
+Every generated user can log in as user<N>@example.com / password123, and
+admin@example.com / admin123 is an admin. Counts accept scientific
+notation (1e6).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import User, Product, Order, OrderItem, Review
+
+CATEGORIES = ['football', 'basketball', 'tennis', 'soccer', 'baseball', 'golf',
+              'fitness', 'running', 'swimming', 'cycling', 'other']
+STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+STATUS_WEIGHTS = [10, 10, 15, 60, 5]
+ADJECTIVES = ['Pro', 'Lite', 'Elite', 'Classic', 'Carbon', 'Junior', 'Speed', 'Ultra', 'Match', 'Training']
+NOUNS = ['Ball', 'Racket', 'Shoes', 'Gloves', 'Bat', 'Helmet', 'Jersey', 'Mat', 'Bottle', 'Bag', 'Net', 'Shorts']
+WORDS = ['durable', 'lightweight', 'breathable', 'professional', 'comfortable', 'grip', 'control',
+         'waterproof', 'premium', 'training', 'outdoor', 'indoor', 'performance', 'balanced']
+PASSWORD = 'password123'
+CHUNK_SIZE = 10000
+
+
+def count(value):
+    """argparse type accepting 1000, 1e6 or 1_000_000."""
+    number = float(value.replace('_', ''))
+    if number < 0 or number != int(number):
+        raise argparse.ArgumentTypeError(f'{value} is not a whole, non-negative count')
+    return int(number)
+
+
+def chunks(total, size=CHUNK_SIZE):
+    for start in range(0, total, size):
+        yield range(start, min(start + size, total))
+
+
+class Generator:
+    """Writes the dataset in chunks; each table uses its own seeded stream,
+    so changing one count does not reshuffle the other tables."""
+
+    def __init__(self, seed, users, products, orders, reviews, days, progress=print):
+        self.seed = seed
+        self.users = users
+        self.products = products
+        self.orders = orders
+        self.reviews = reviews
+        self.days = days
+        self.progress = progress
+        self.now = datetime(2025, 1, 1)  # Fixed, so timestamps repeat between runs too
+        self.prices = []
+
+    def rng(self, table):
+        return random.Random(f'{self.seed}:{table}')
+
+    def moment(self, rng):
+        return self.now - timedelta(seconds=rng.randrange(self.days * 86400))
+
+    def insert(self, model, rows, label):
+        started = time.perf_counter()
+        written = 0
+        for chunk in rows:
+            db.session.execute(db.insert(model), chunk)
+            db.session.commit()
+            written += len(chunk)
+        elapsed = time.perf_counter() - started
+        self.progress(f"{label:>12}: {written:>10,} rows in {elapsed:6.1f}s "
+                      f"({written / elapsed if elapsed else 0:,.0f} rows/s)")
+
+    def run(self):
+        self.insert(User, self.user_rows(), 'users')
+        self.insert(Product, self.product_rows(), 'products')
+        if self.orders:
+            self.write_orders()
+        # At most one review per customer and product
+        self.reviews = min(self.reviews, self.users * self.products)
+        if self.reviews:
+            self.insert(Review, self.review_rows(), 'reviews')
+
+    def user_rows(self):
+        rng = self.rng('users')
+        # Hashing is deliberately slow, so every user shares one hash
+        template = User(username='template')
+        template.set_password(PASSWORD)
+        admin = User(username='admin')
+        admin.set_password('admin123')
+        yield [{'id': 1, 'username': 'admin', 'email': 'admin@example.com', 'is_admin': True,
+                'password_hash': admin.password_hash, 'created_at': self.now - timedelta(days=self.days)}]
+        for ids in chunks(self.users):
+            yield [{'id': i + 2, 'username': f'user{i}', 'email': f'user{i}@example.com', 'is_admin': False,
+                    'password_hash': template.password_hash, 'created_at': self.moment(rng)} for i in ids]
+
+    def product_rows(self):
+        rng = self.rng('products')
+        for ids in chunks(self.products):
+            rows = []
+            for i in ids:
+                price = round(rng.lognormvariate(7.5, 1.0), 2)  # Mostly hundreds to a few thousand
+                self.prices.append(price)
+                roll = rng.random()
+                stock = 0 if roll < 0.05 else rng.randint(1, 10) if roll < 0.2 else rng.randint(11, 500)
+                rows.append({
+                    'id': i + 1,
+                    'name': f'{rng.choice(ADJECTIVES)} {rng.choice(CATEGORIES).title()} {rng.choice(NOUNS)} {i}',
+                    'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))).capitalize() + '.',
+                    'price': price,
+                    'category': rng.choice(CATEGORIES),
+                    'image_url': 'default-product.jpg',
+                    'stock_quantity': stock,
+                    'created_at': self.moment(rng),
+                })
+            yield rows
+
+    def write_orders(self):
+        """Orders and their lines come from one stream, so each total matches
+        its lines; both are written chunk by chunk."""
+        rng = self.rng('orders')
+        started = time.perf_counter()
+        lines_written = 0
+        for ids in chunks(self.orders):
+            orders, lines = [], []
+            for i in ids:
+                order_lines = [{'order_id': i + 1, 'product_id': product_id, 'quantity': rng.randint(1, 3),
+                                'price': self.prices[product_id - 1]}
+                               for product_id in sorted({rng.randrange(self.products) + 1
+                                                         for _ in range(rng.randint(1, 4))})]
+                orders.append({
+                    'id': i + 1,
+                    'user_id': rng.randrange(self.users) + 2 if self.users else 1,
+                    'total_amount': round(sum(line['quantity'] * line['price'] for line in order_lines), 2),
+                    'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                    'created_at': self.moment(rng),
+                })
+                lines.extend(order_lines)
+            db.session.execute(db.insert(Order), orders)
+            db.session.execute(db.insert(OrderItem), lines)
+            db.session.commit()
+            lines_written += len(lines)
+        elapsed = time.perf_counter() - started
+        self.progress(f"{'orders':>12}: {self.orders:>10,} rows and {lines_written:,} lines in {elapsed:6.1f}s "
+                      f"({(self.orders + lines_written) / elapsed if elapsed else 0:,.0f} rows/s)")
+
+    def review_rows(self):
+        rng = self.rng('reviews')
+        seen = set()
+        for ids in chunks(self.reviews):
+            rows = []
+            for _ in ids:
+                # One review per user and product (unique index)
+                while True:
+                    pair = (rng.randrange(self.users) + 2, rng.randrange(self.products) + 1)
+                    if pair not in seen:
+                        seen.add(pair)
+                        break
+                rows.append({'user_id': pair[0], 'product_id': pair[1],
+                             'rating': rng.choices([1, 2, 3, 4, 5], [5, 5, 15, 35, 40])[0],
+                             'comment': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))),
+                             'created_at': self.moment(rng)})
+            yield rows
+
+
+def finish(progress=print):
+    """Rebuild everything derived from the generated rows."""
+    from app.search import product_search
+    from app import metrics, facets
+
+    for label, step in [('ratings', Product.refresh_rating_aggregates),
+                        ('sales', Product.refresh_sales),
+                        ('search index', product_search.rebuild),
+                        ('metrics', metrics.rebuild),
+                        ('facets', facets.rebuild)]:
+        started = time.perf_counter()
+        step()
+        db.session.commit()
+        progress(f"{label:>12}: rebuilt in {time.perf_counter() - started:6.1f}s")
+
+
+def generate(app, users, products, orders=0, reviews=0, seed=42, days=365, reset=False, progress=print):
+    """Create the schema and fill it; the database must be empty unless reset is set."""
+    from app.migrations import upgrade
+
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+        upgrade()
+        if db.session.query(User.id).first() or db.session.query(Product.id).first():
+            raise SystemExit('Database already holds data; pass --reset to replace it')
+        if products < 1 and (orders or reviews):
+            raise SystemExit('Orders and reviews need at least one product')
+        started = time.perf_counter()
+        Generator(seed, users, products, orders, reviews, days, progress).run()
+        finish(progress)
+        progress(f"{'total':>12}: {time.perf_counter() - started:6.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', default=os.path.join('instance', 'loadtest.db'),
+                        help='SQLite file to fill, or a full database URL')
+    parser.add_argument('--users', type=count, default=10000)
+    parser.add_argument('--products', type=count, default=1000)
+    parser.add_argument('--orders', type=count, default=50000)
+    parser.add_argument('--reviews', type=count, default=10000)
+    parser.add_argument('--days', type=int, default=365, help='spread created_at over this many days')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table first')
+    args = parser.parse_args()
+
+    url = args.database if '://' in args.database else f"sqlite:///{os.path.abspath(args.database)}"
+    if url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(url[len('sqlite:///'):]) or '.', exist_ok=True)
+    # Durability does not matter for throwaway data; skipping fsync makes the load much faster
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'SQLITE_SYNCHRONOUS': 'OFF'})
+    generate(app, args.users, args.products, args.orders, args.reviews,
+             seed=args.seed, days=args.days, reset=args.reset)
+    print(f"\nDataset written to {url}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,6 +17,10 @@ def seed_database():
     try:
         from app import create_app, db
         from app.models import User, Product, Order, OrderItem, CartItem, Review, Wishlist
+        from app.catalog_import import import_products
+        from app.migrations import upgrade
+        from app.cache import fragment_cache
+        from app import metrics, facets
     except ImportError as e:
         print(f"Error importing modules: {e}")
         print("Please ensure the application is properly set up and dependencies are installed.")
@@ -31,6 +35,7 @@ def seed_database():
         print("Clearing existing data...")
         db.drop_all()
         db.create_all()
+        upgrade()
         
         # Create admin user
         admin = User(
@@ -253,13 +258,13 @@ def seed_database():
             }
         ]
         
-        products = []
-        for product_data in products_data:
-            product = Product(**product_data)
-            products.append(product)
-            db.session.add(product)
-        
+        # Same batched path as `flask import-products`; it also builds the search index
+        result = import_products(products_data)
+        if result.errors:
+            print(f"Sample products rejected: {result.errors}")
+            return False
         db.session.commit()
+        products = Product.query.order_by(Product.id).all()
         print(f"Created {len(products)} products successfully!")
         
         # Create sample reviews
@@ -279,8 +284,9 @@ def seed_database():
         # Add reviews for products
         for product in products[:10]:  # Review first 10 products
             num_reviews = random.randint(2, 5)
+            reviewers = random.sample(users, num_reviews)  # one review per user
             for _ in range(num_reviews):
-                user = random.choice(users)
+                user = reviewers.pop()
                 review = Review(
                     user_id=user.id,
                     product_id=product.id,
@@ -289,7 +295,10 @@ def seed_database():
                 )
                 db.session.add(review)
         
+        db.session.flush()
+        Product.refresh_rating_aggregates()
         db.session.commit()
+        fragment_cache.bump()  # Drop pages cached from the previous catalog
         print("Sample reviews created successfully!")
         
         # Create sample cart items for demo user
@@ -348,6 +357,14 @@ def seed_database():
         db.session.commit()
         print("Sample orders created successfully!")
         
+        # Seeded rows bypass the routes, so compute the dashboard metrics,
+        # units sold and facet counts once
+        metrics.rebuild()
+        Product.refresh_sales()
+        facets.rebuild()
+        db.session.commit()
+        print("Dashboard metrics computed successfully!")
+        
         print("\nDatabase seeding completed successfully!")
         print("\nSample Login Credentials:")
         print("Admin: admin@spequip.com / admin123")
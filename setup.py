@@ -45,6 +45,10 @@ def setup_application():
         print("Creating database tables...")
         db.create_all()
         print("Database tables created successfully!")
+        
+        # Record the schema version so later migrations start from here
+        from app.migrations import upgrade
+        upgrade()
     
     print("\nSetup completed successfully!")
     print("Run 'python seed_database.py' to populate with sample data.")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Cart API test: the JSON endpoints under /api/cart add, update and remove
+lines, return the changed line with the cart totals, apply batch
+updates all-or-nothing, and answer malformed bodies, batch entries and
+quantities that are not whole numbers with 400 rather than guessing.
+"""
+
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product, CartItem
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_client():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        customer = User(username='customer', email='customer@example.com')
+        customer.set_password('customer123')
+        db.session.add(customer)
+        db.session.add_all([Product(name=f'Product {i}', description='Test product', price=100 * (i + 1),
+                                    category='other', stock_quantity=5) for i in range(3)])
+        db.session.commit()
+    client = app.test_client()
+    return app, client
+
+
+def login(client):
+    client.post('/login', data={'email': 'customer@example.com', 'password': 'customer123'})
+
+
+def test_requires_login():
+    app, client = make_client()
+    response = client.post('/api/cart/items', json={'product_id': 1})
+    assert response.status_code == 401, response.status_code
+    assert response.get_json()['success'] is False
+
+
+def test_add_update_remove():
+    app, client = make_client()
+    login(client)
+
+    response = client.post('/api/cart/items', json={'product_id': 1, 'quantity': 2})
+    assert response.status_code == 201, response.get_json()
+    data = response.get_json()
+    assert data['line']['quantity'] == 2 and data['line']['line_total'] == 200
+    assert data['totals'] == {'count': 1, 'units': 2, 'subtotal': 200, 'tax': 16, 'total': 216}
+
+    data = client.post('/api/cart/items', json={'product_id': 1, 'quantity': 1}).get_json()
+    assert data['line']['quantity'] == 3, 'adding an existing product must add to its line'
+    assert data['totals']['count'] == 1
+
+    response = client.post('/api/cart/items', json={'product_id': 2, 'quantity': 6})
+    assert response.status_code == 400, 'quantity above stock must be refused'
+
+    line_id = data['line']['id']
+    data = client.patch(f'/api/cart/items/{line_id}', json={'quantity': 5}).get_json()
+    assert data['line']['quantity'] == 5 and data['totals']['subtotal'] == 500
+
+    data = client.delete(f'/api/cart/items/{line_id}').get_json()
+    assert data['removed'] == [line_id] and data['totals']['count'] == 0
+    assert client.get('/cart-count').get_json()['count'] == 0
+
+
+def test_batch_update_is_atomic():
+    app, client = make_client()
+    login(client)
+    first = client.post('/api/cart/items', json={'product_id': 1}).get_json()['line']['id']
+    second = client.post('/api/cart/items', json={'product_id': 2}).get_json()['line']['id']
+
+    response = client.post('/api/cart/batch', json={'updates': [
+        {'id': first, 'quantity': 3}, {'id': second, 'quantity': 99},
+    ]})
+    assert response.status_code == 400
+    assert str(second) in response.get_json()['errors']
+    with app.app_context():
+        assert db.session.get(CartItem, first).quantity == 1, 'a failed batch must not change any line'
+
+    data = client.post('/api/cart/batch', json={'updates': [
+        {'id': first, 'quantity': 3}, {'id': second, 'quantity': 0},
+    ]}).get_json()
+    assert [line['quantity'] for line in data['lines']] == [3]
+    assert data['removed'] == [second]
+    assert data['totals'] == {'count': 1, 'units': 3, 'subtotal': 300, 'tax': 24, 'total': 324}
+
+
+def test_rejects_non_object_json():
+    app, client = make_client()
+    login(client)
+    for body in ([{'product_id': 1}], 'product_id', 1):
+        for method, url in (('post', '/api/cart/items'), ('post', '/api/cart/batch')):
+            response = getattr(client, method)(url, json=body)
+            assert response.status_code == 400, (url, body, response.status_code)
+            assert response.get_json()['success'] is False
+    line_id = client.post('/api/cart/items', json={'product_id': 1}).get_json()['line']['id']
+    response = client.patch(f'/api/cart/items/{line_id}', json=[5])
+    assert response.status_code == 400 and response.get_json()['error'] == 'Expected a JSON object'
+    # Form posts still work
+    assert client.post('/api/cart/items', data={'product_id': '2'}).status_code == 201
+
+
+
+def test_batch_rejects_malformed_updates():
+    app, client = make_client()
+    login(client)
+    first = client.post('/api/cart/items', json={'product_id': 1}).get_json()['line']['id']
+    for updates in ([5], ['x'], [[first, 2]], [{'quantity': 'x'}], [{'id': first}], [{'id': 'abc', 'quantity': 1}],
+                    [{'id': 1.5, 'quantity': 1}], [{'id': first, 'quantity': 2}, {'id': first, 'quantity': 0}]):
+        response = client.post('/api/cart/batch', json={'updates': updates})
+        assert response.status_code == 400, (updates, response.status_code)
+        assert response.get_json()['success'] is False
+    with app.app_context():
+        assert db.session.get(CartItem, first).quantity == 1
+
+    # A bad quantity is reported under the line's own id
+    response = client.post('/api/cart/batch', json={'updates': [{'id': str(first), 'quantity': 'x'}]})
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {str(first): 'Quantity must be a whole number'}
+
+
+def test_quantity_must_be_whole():
+    app, client = make_client()
+    login(client)
+    for quantity in (1.7, '1.7', True, 'two', None):
+        response = client.post('/api/cart/items', json={'product_id': 1, 'quantity': quantity})
+        assert response.status_code == 400, (quantity, response.get_json())
+    assert client.post('/api/cart/items', json={'product_id': 1.5}).status_code == 400
+    line = client.post('/api/cart/items', json={'product_id': 1, 'quantity': 2.0}).get_json()['line']
+    assert line['quantity'] == 2
+    assert client.patch(f"/api/cart/items/{line['id']}", json={'quantity': 2.5}).status_code == 400
+    response = client.post('/api/cart/batch', json={'updates': [{'id': line['id'], 'quantity': 1.2}]})
+    assert response.get_json()['errors'] == {str(line['id']): 'Quantity must be a whole number'}
+    with app.app_context():
+        assert db.session.get(CartItem, line['id']).quantity == 2
+
+
+if __name__ == "__main__":
+    print("SpEquip Cart API Test")
+    print("=" * 50)
+    try:
+        test_requires_login()
+        test_add_update_remove()
+        test_batch_update_is_atomic()
+        test_rejects_non_object_json()
+        test_batch_rejects_malformed_updates()
+        test_quantity_must_be_whole()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! The cart API works.")
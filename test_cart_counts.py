@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cart badge test: with the count kept in the session or in process memory,
+the badge on every page and /cart-count show the number of cart lines
+right after adding, removing, moving the wishlist into the cart and
+checking out, even though pages no longer count the cart themselves.
+"""
+
+import re
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product, CartItem, Wishlist
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+BADGE = re.compile(r'cart-counter">\s*(\d+)\s*<')
+
+
+def make_client(store):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'CART_COUNT_STORE': store,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        customer = User(username='customer', email='customer@example.com')
+        customer.set_password('customer123')
+        db.session.add(customer)
+        db.session.add_all([Product(name=f'Product {i}', description='Test product', price=100,
+                                    category='other', stock_quantity=10) for i in range(4)])
+        db.session.flush()
+        db.session.add_all([Wishlist(user_id=customer.id, product_id=3),
+                            Wishlist(user_id=customer.id, product_id=4)])
+        db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'email': 'customer@example.com', 'password': 'customer123'})
+    return app, client
+
+
+def counts(client):
+    """The cart count as /cart-count and the badge on a page report it."""
+    badge = BADGE.search(client.get('/about-us').get_data(as_text=True))
+    return client.get('/cart-count').get_json()['count'], int(badge.group(1))
+
+
+def test_count_follows_cart_changes():
+    for store in ('session', 'memory'):
+        app, client = make_client(store)
+        assert counts(client) == (0, 0), store
+
+        client.post('/add-to-cart', data={'product_id': '1', 'quantity': '1'})
+        assert counts(client) == (1, 1), store
+        # Adding the same product again grows its line, not the count
+        client.post('/add-to-cart', data={'product_id': '1', 'quantity': '2'})
+        assert counts(client) == (1, 1), store
+        client.post('/add-to-cart', data={'product_id': '2', 'quantity': '1'})
+        assert counts(client) == (2, 2), store
+
+        with app.app_context():
+            line = CartItem.query.filter_by(product_id=1).one().id
+        client.get(f'/remove-from-cart/{line}')
+        assert counts(client) == (1, 1), store
+
+        client.post('/add-all-to-cart')
+        assert counts(client) == (3, 3), store
+
+        client.post('/checkout')
+        assert counts(client) == (0, 0), store
+        with app.app_context():
+            assert CartItem.query.count() == 0
+
+
+def test_count_is_per_user():
+    app, client = make_client('memory')
+    client.post('/add-to-cart', data={'product_id': '1', 'quantity': '1'})
+    with app.app_context():
+        other = User(username='other', email='other@example.com')
+        other.set_password('other123')
+        db.session.add(other)
+        db.session.commit()
+    other_client = app.test_client()
+    other_client.post('/login', data={'email': 'other@example.com', 'password': 'other123'})
+    assert counts(other_client) == (0, 0)
+    assert counts(client) == (1, 1)
+
+
+if __name__ == "__main__":
+    print("SpEquip Cart Badge Test")
+    print("=" * 50)
+    try:
+        test_count_follows_cart_changes()
+        test_count_is_per_user()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! The cart badge stays correct.")
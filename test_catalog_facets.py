@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Faceted catalog test: facet counts summed from the facet cells match
+direct COUNT queries for every filter combination, the listing shows the
+matching products, and the write routes keep the cells equal to a full
+rebuild.
+"""
+
+import itertools
+import re
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product
+from app import facets
+from app.facets import CatalogFilters, RATING_OPTIONS, catalog_facets
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False},
+                     instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        rows = [
+            ('tennis', 300, 5, 9, 2), ('tennis', 800, 0, 0, 0), ('tennis', 12000, 2, 14, 3),
+            ('golf', 450, 1, 5, 1), ('golf', 2600, 9, 8, 2), ('running', 999.99, 3, 3, 1),
+            ('running', 1000, 0, 20, 5), ('running', 7000, 4, 4, 2),
+        ]
+        for i, (category, price, stock, rating_sum, rating_count) in enumerate(rows):
+            db.session.add(Product(name=f'Item {i}', description='Test', category=category, price=price,
+                                   stock_quantity=stock, rating_sum=rating_sum, rating_count=rating_count,
+                                   rating_avg=rating_sum / rating_count if rating_count else 0))
+        for name, is_admin in [('admin', True), ('customer', False)]:
+            user = User(username=name, email=f'{name}@example.com', is_admin=is_admin)
+            user.set_password(f'{name}123')
+            db.session.add(user)
+        facets.rebuild()
+        db.session.commit()
+    return app
+
+
+def direct_count(filters):
+    return filters.apply(Product.query).count()
+
+
+def test_counts_match_queries():
+    app = make_app()
+    with app.test_request_context():
+        bands = range(len(catalog_facets.price_bands()))
+        for category, price, in_stock, rating in itertools.product(
+                [None, 'tennis', 'running'], [None, *bands], [False, True], [None, 4, 2]):
+            filters = CatalogFilters(category, price, in_stock, rating)
+            counts = catalog_facets.counts(filters)
+            assert counts['total'] == direct_count(filters), (category, price, in_stock, rating)
+            for name, count in counts['categories'].items():
+                assert count == direct_count(CatalogFilters(name, price, in_stock, rating))
+            for band in bands:
+                assert counts['prices'][band] == direct_count(CatalogFilters(category, band, in_stock, rating))
+            assert counts['in_stock'] == direct_count(CatalogFilters(category, price, True, rating))
+            for option in RATING_OPTIONS:
+                assert counts['ratings'][option] == direct_count(CatalogFilters(category, price, in_stock, option))
+
+
+def test_listing():
+    app = make_app()
+    client = app.test_client()
+    page = client.get('/products?category=running&price=1000-2500&in_stock=1').get_data(as_text=True)
+    assert re.search(r'>\s*0 products found', page), 'Item 6 is out of stock'
+    page = client.get('/products?category=running&price=1000-2500').get_data(as_text=True)
+    assert re.search(r'>\s*1 products found', page) and 'Item 6' in page and 'Item 5' not in page
+    page = client.get('/products?rating=4').get_data(as_text=True)
+    assert 'Item 2' in page and 'Item 6' in page and 'Item 3' in page
+    assert 'Item 5' not in page and 'Item 7' not in page and 'Item 1<' not in page
+
+
+def product_form(**fields):
+    return dict({'name': 'Item', 'description': 'Test product', 'price': 10, 'category': 'other',
+                 'image_url': '', 'stock_quantity': 5}, **fields)
+
+
+def test_write_routes_maintain_cells():
+    app = make_app()
+    client = app.test_client()
+
+    def assert_cells_exact(step):
+        with app.app_context():
+            maintained = sorted(facets.read_cells())
+            facets.rebuild()
+            assert maintained == sorted(facets.read_cells()), step
+            db.session.rollback()
+
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    client.post('/admin/products/add', data=product_form(name='Item 8', category='golf', price=5500))
+    assert_cells_exact('add product')
+    client.post('/admin/products/edit/7', data=product_form(name='Item 6', category='tennis', price=4000,
+                                                            stock_quantity=7))
+    assert_cells_exact('edit product')
+    client.get('/admin/products/delete/2')
+    assert_cells_exact('delete product')
+    with app.app_context():
+        assert Product.query.filter_by(name='Item 8').count() == 1
+        assert db.session.get(Product, 7).category == 'tennis' and db.session.get(Product, 2) is None
+    client.get('/logout')
+
+    client.post('/login', data={'email': 'customer@example.com', 'password': 'customer123'})
+    client.post('/add-review', data={'product_id': '4', 'rating': '3', 'comment': 'Fine'})
+    assert_cells_exact('review')
+    with app.app_context():
+        assert db.session.get(Product, 4).rating_count == 2
+    client.post('/add-to-cart', data={'product_id': '4', 'quantity': '1'})
+    client.post('/checkout')
+    with app.app_context():
+        assert db.session.get(Product, 4).stock_quantity == 0
+    assert_cells_exact('checkout')
+
+    page = client.get('/products?category=golf&in_stock=1').get_data(as_text=True)
+    assert 'Item 3' not in page and 'Item 8' in page
+
+
+if __name__ == "__main__":
+    print("SpEquip Catalog Facet Test")
+    print("=" * 50)
+    try:
+        test_counts_match_queries()
+        test_listing()
+        test_write_routes_maintain_cells()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Facet counts match the catalog.")
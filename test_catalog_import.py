@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Catalog import test: CSV, JSON and NDJSON files add new products, update
+products matched by name, reject rows ProductForm would reject with their
+row numbers, and leave the search index and dashboard metrics up to date.
+An update only touches the image when the row gives a new image_url,
+and then drops the thumbnails made from the old one.
+"""
+
+import io
+import json
+import sys
+import tempfile
+from app import create_app, db, metrics
+from app.models import User, Product
+from app.catalog_import import read_rows, import_products
+from app.search import product_search
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+CSV = """name,description,price,category,image_url,stock_quantity
+Carbon Racket,Light tennis racket,4999,tennis,,12
+Match Ball,Size 5 football,899.50,football,,40
+No Price,Missing a price,,golf,,3
+Bad Category,Unknown category,100,curling,,3
+Carbon Racket,Light tennis racket (new grip),5299,tennis,,8
+"""
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.add(Product(name='Match Ball', description='Old description', price=500,
+                               category='football', stock_quantity=0))
+        db.session.commit()
+    return app
+
+
+def test_csv_import():
+    app = make_app()
+    with app.app_context():
+        result = import_products(read_rows(io.StringIO(CSV), 'csv'), batch_size=2)
+        db.session.commit()
+        assert (result.inserted, result.updated) == (1, 1), result.summary()
+        assert [number for number, _ in result.errors] == [3, 4], result.errors
+        assert 'price' in result.errors[0][1] and 'category' in result.errors[1][1]
+
+        products = {p.name: p for p in Product.query}
+        assert len(products) == 2
+        assert products['Match Ball'].price == 899.5 and products['Match Ball'].stock_quantity == 40
+        assert products['Carbon Racket'].price == 5299, 'the last row for a name must win'
+        assert products['Carbon Racket'].image_url == 'default-product.jpg'
+
+        results = product_search.paginate('racket')
+        assert results.total == 1, 'imported products must be searchable'
+        counters = metrics.read_counters()
+        assert counters['products.total'] == 2 and counters['products.stock.low'] == 1, counters
+
+
+def test_json_formats_and_dry_run():
+    app = make_app()
+    rows = [{'name': 'Yoga Mat', 'description': 'Non-slip', 'price': 1200, 'category': 'fitness',
+             'stock_quantity': 25}]
+    with app.app_context():
+        result = import_products(read_rows(io.StringIO(json.dumps({'products': rows})), 'json'), dry_run=True)
+        db.session.rollback()
+        assert result.inserted == 1 and Product.query.count() == 1, 'a dry run must not save anything'
+
+        ndjson = '\n'.join(json.dumps(row) for row in rows) + '\n'
+        import_products(read_rows(io.StringIO(ndjson), 'ndjson'))
+        db.session.commit()
+        assert Product.query.filter_by(name='Yoga Mat').count() == 1
+
+
+def test_admin_upload():
+    app = make_app()
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    response = client.post('/admin/products/import', data={
+        'file': (io.BytesIO(CSV.encode()), 'catalog.csv'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert '1 added, 1 updated, 2 rows rejected' in page, page
+    with app.app_context():
+        assert Product.query.count() == 2
+
+    response = client.post('/admin/products/import', data={
+        'file': (io.BytesIO(b'name\n'), 'catalog.txt'),
+    }, content_type='multipart/form-data')
+    assert 'Upload a .csv, .json or .ndjson file' in response.get_data(as_text=True)
+
+
+def test_image_updates():
+    app = make_app()
+    with app.app_context():
+        for name, key in (('Kept', 'kept-key'), ('Same', 'same-key'), ('Replaced', 'old-key')):
+            db.session.add(Product(name=name, description='Has thumbnails', price=100, category='other',
+                                   stock_quantity=5, image_url=f'https://img.example.com/{name}.jpg',
+                                   image_key=key))
+        db.session.commit()
+        rows = [
+            # No image_url at all, and a blank one: the image stays
+            {'name': 'Kept', 'description': 'New text', 'price': 120, 'category': 'other', 'stock_quantity': 5},
+            {'name': 'Match Ball', 'description': 'Blank image', 'price': 500, 'category': 'football',
+             'image_url': '', 'stock_quantity': 1},
+            {'name': 'Same', 'description': 'Same image', 'price': 100, 'category': 'other',
+             'image_url': 'https://img.example.com/Same.jpg', 'stock_quantity': 5},
+            {'name': 'Replaced', 'description': 'New image', 'price': 100, 'category': 'other',
+             'image_url': 'https://img.example.com/new.jpg', 'stock_quantity': 5},
+            {'name': 'Fresh', 'description': 'Inserted', 'price': 100, 'category': 'other', 'stock_quantity': 5},
+        ]
+        result = import_products(rows)
+        db.session.commit()
+        assert (result.inserted, result.updated) == (1, 4), result.summary()
+
+        products = {p.name: p for p in Product.query}
+        assert products['Kept'].description == 'New text'
+        assert (products['Kept'].image_url, products['Kept'].image_key) \
+            == ('https://img.example.com/Kept.jpg', 'kept-key')
+        assert products['Match Ball'].image_url == 'default-product.jpg'
+        assert products['Same'].image_key == 'same-key'
+        assert (products['Replaced'].image_url, products['Replaced'].image_key, products['Replaced'].image_pending) \
+            == ('https://img.example.com/new.jpg', None, None)
+        assert products['Fresh'].image_url == 'default-product.jpg'
+
+    # The catalog shows the imported URL, not the old thumbnails
+    page = app.test_client().get('/products').get_data(as_text=True)
+    assert 'https://img.example.com/new.jpg' in page and 'old-key' not in page
+    assert 'kept-key' in page
+
+
+if __name__ == "__main__":
+    print("SpEquip Catalog Import Test")
+    print("=" * 50)
+    try:
+        test_csv_import()
+        test_json_formats_and_dry_run()
+        test_admin_upload()
+        test_image_updates()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Catalog files import in batches.")
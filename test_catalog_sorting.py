@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Catalog sort test: every sort pages through the listing in the right
+order (alone, within a category and under other facets), sorted search
+orders its matches on both search backends, and the stored rating
+average and units sold follow reviews, checkouts and cancellations.
+"""
+
+import html
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Product
+from app import facets
+from app.facets import SORTS
+from app.search import product_search
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app(**config):
+    app = create_app(dict({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False}, **config),
+                     instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        start = datetime(2025, 1, 1)
+        for i in range(30):
+            # Few distinct values, so ties have to be broken by id
+            db.session.add(Product(
+                name=f'{"Racket" if i % 5 == 0 else "Ball"} {i}', description='Test',
+                category='golf' if i % 3 else 'tennis', price=[250, 400, 800, 1200][i % 4],
+                stock_quantity=i % 4, created_at=start + timedelta(days=i % 7),
+                rating_sum=i % 6, rating_count=1 if i % 6 else 0, rating_avg=i % 6,
+                units_sold=(i * 7) % 5,
+            ))
+        for name, is_admin in [('admin', True), ('customer', False)]:
+            user = User(username=name, email=f'{name}@example.com', is_admin=is_admin)
+            user.set_password(f'{name}123')
+            db.session.add(user)
+        facets.rebuild()
+        product_search.rebuild()
+        db.session.commit()
+    return app
+
+
+def expected(app, sort, keep=lambda product: True):
+    with app.app_context():
+        products = [product for product in Product.query.all() if keep(product)]
+        keys = [key.key for key in SORTS[sort]['keys']]
+        products.sort(key=lambda product: [getattr(product, key) for key in keys],
+                      reverse=SORTS[sort]['descending'])
+        return [product.name for product in products]
+
+
+def names(page):
+    return re.findall(r'<h5 class="product-title">(.*?)</h5>', page)
+
+
+def walk(client, url):
+    """Names on every page of a listing, following the Next links."""
+    seen = []
+    while url:
+        page = client.get(url).get_data(as_text=True)
+        seen.extend(names(page))
+        link = re.search(r'href="([^"]+)">\s*Next', page)
+        url = html.unescape(link.group(1)) if link else None
+    return seen
+
+
+def test_sorted_listing():
+    app = make_app()
+    client = app.test_client()
+    for sort in SORTS:
+        assert walk(client, f'/products?sort={sort}') == expected(app, sort), sort
+        assert walk(client, f'/products?sort={sort}&category=golf') == \
+            expected(app, sort, lambda product: product.category == 'golf'), sort
+        assert walk(client, f'/products?sort={sort}&in_stock=1&price=0-500') == \
+            expected(app, sort, lambda product: product.stock_quantity > 0 and product.price < 500), sort
+        assert walk(client, f'/products?sort={sort}&rating=4') == \
+            expected(app, sort, lambda product: product.rating_avg >= 4), sort
+
+    page = client.get('/products?sort=price_desc').get_data(as_text=True)
+    assert 'Sort: Price: High to Low' in page
+    assert 'Sort: Featured' in client.get('/products?sort=bogus').get_data(as_text=True)
+
+
+def test_sorted_search():
+    for backend in ('fts5', 'memory'):
+        app = make_app(SEARCH_BACKEND=backend)
+        client = app.test_client()
+        for sort in SORTS:
+            found = []
+            for page in (1, 2, 3):
+                found.extend(names(client.get(f'/products?search=ball&sort={sort}&page={page}')
+                                   .get_data(as_text=True)))
+            assert found == expected(app, sort, lambda product: product.name.startswith('Ball')), \
+                (backend, sort)
+            found = names(client.get(f'/products?search=ball&sort={sort}&category=tennis')
+                          .get_data(as_text=True))
+            assert found == expected(app, sort, lambda product: product.name.startswith('Ball')
+                                     and product.category == 'tennis'), (backend, sort)
+
+
+def test_aggregates_maintained():
+    app = make_app()
+    client = app.test_client()
+
+    def product(id):
+        with app.app_context():
+            return db.session.get(Product, id)
+
+    client.post('/login', data={'email': 'customer@example.com', 'password': 'customer123'})
+    client.post('/add-review', data={'product_id': '4', 'rating': '5', 'comment': 'Great'})
+    assert (product(4).rating_count, product(4).rating_avg) == (2, 4.0)
+    sold = product(4).units_sold
+    client.post('/add-to-cart', data={'product_id': '4', 'quantity': '2'})
+    client.post('/checkout')
+    assert product(4).units_sold == sold + 2
+    client.get('/logout')
+
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    client.post('/admin/orders/1/update-status', data={'status': 'cancelled'})
+    assert product(4).units_sold == sold
+    client.post('/admin/orders/1/update-status', data={'status': 'shipped'})
+    assert product(4).units_sold == sold + 2
+    client.post('/admin/orders/1/update-status', data={'status': 'delivered'})
+    assert product(4).units_sold == sold + 2
+
+    with app.app_context():
+        # The fixture's units are made up; recomputed, only the real order counts
+        Product.refresh_sales()
+        assert db.session.get(Product, 4).units_sold == 2
+        assert Product.query.filter(Product.units_sold > 0).count() == 1
+        Product.refresh_rating_aggregates()
+        assert db.session.get(Product, 4).rating_avg == 5.0
+
+
+if __name__ == "__main__":
+    print("SpEquip Catalog Sorting Test")
+    print("=" * 50)
+    try:
+        test_sorted_listing()
+        test_sorted_search()
+        test_aggregates_maintained()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Every sort orders the catalog.")
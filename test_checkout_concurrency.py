@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Stress test: hundreds of concurrent checkouts competing for limited stock
+must never oversell, and every failed checkout must leave no trace.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from app import create_app, db
+from app.models import User, Product, Order, OrderItem, CartItem
+from app.checkout import place_order, OutOfStockError
+
+BUYERS = 300
+STOCK = 100
+
+
+def make_app(workdir):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'checkout.db')}",
+        'CHECKOUT_MAX_ATTEMPTS': 50,
+    }, instance_path=workdir)
+    with app.app_context():
+        db.create_all()
+        limited = Product(name='Limited Edition Ball', description='Only a few left',
+                          price=1000, category='other', stock_quantity=STOCK)
+        plentiful = Product(name='Water Bottle', description='Plenty in stock',
+                            price=100, category='other', stock_quantity=BUYERS * 10)
+        db.session.add_all([limited, plentiful])
+        db.session.flush()
+        for i in range(BUYERS):
+            user = User(username=f'buyer{i}', email=f'buyer{i}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            # Every buyer wants 1-2 limited items plus a bottle
+            db.session.add(CartItem(user_id=user.id, product_id=limited.id, quantity=1 + i % 2))
+            db.session.add(CartItem(user_id=user.id, product_id=plentiful.id, quantity=1))
+        db.session.commit()
+    return app
+
+
+def test_concurrent_checkouts_never_oversell():
+    workdir = tempfile.mkdtemp(prefix='spequip-checkout-')
+    try:
+        app = make_app(workdir)
+        with app.app_context():
+            user_ids = [user.id for user in User.query.all()]
+
+        barrier = threading.Barrier(len(user_ids))
+        outcomes = {'placed': 0, 'out_of_stock': 0, 'errors': []}
+        lock = threading.Lock()
+
+        def buy(user_id):
+            with app.app_context():
+                barrier.wait()
+                try:
+                    place_order(user_id)
+                    result = 'placed'
+                except OutOfStockError:
+                    result = 'out_of_stock'
+                except Exception as e:
+                    with lock:
+                        outcomes['errors'].append(repr(e))
+                    return
+                finally:
+                    db.session.remove()
+                with lock:
+                    outcomes[result] += 1
+
+        threads = [threading.Thread(target=buy, args=(user_id,)) for user_id in user_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print(f"Placed {outcomes['placed']} orders, {outcomes['out_of_stock']} rejected for stock")
+        assert not outcomes['errors'], outcomes['errors'][:3]
+        assert outcomes['placed'] + outcomes['out_of_stock'] == BUYERS
+
+        with app.app_context():
+            limited = Product.query.filter_by(name='Limited Edition Ball').first()
+            plentiful = Product.query.filter_by(name='Water Bottle').first()
+            sold = db.session.query(db.func.sum(OrderItem.quantity)) \
+                .filter_by(product_id=limited.id).scalar() or 0
+            bottles = db.session.query(db.func.sum(OrderItem.quantity)) \
+                .filter_by(product_id=plentiful.id).scalar() or 0
+
+            assert limited.stock_quantity >= 0, 'stock went negative'
+            assert sold == STOCK - limited.stock_quantity, 'order items do not match stock taken'
+            assert Order.query.count() == outcomes['placed']
+            # Rejected checkouts must roll back their bottle reservation too
+            assert bottles == outcomes['placed']
+            assert plentiful.stock_quantity == BUYERS * 10 - bottles
+            # Successful checkouts empty the cart, rejected ones keep it
+            assert CartItem.query.count() == 2 * outcomes['out_of_stock']
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    print("SpEquip Concurrent Checkout Stress Test")
+    print("=" * 50)
+    try:
+        test_concurrent_checkouts_never_oversell()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! No overselling under concurrent checkouts.")
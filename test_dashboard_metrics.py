@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Dashboard metrics test: the counters and per-user order summaries the
+write routes maintain must match a full recompute from the source tables
+after registrations, product edits, checkouts, status changes and admin
+toggles.
+"""
+
+import sys
+import tempfile
+from app import create_app, db, metrics
+from app.models import User, Product, UserOrderSummary
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.flush()
+        metrics.rebuild()
+        db.session.commit()
+    return app
+
+
+def login(app, email, password):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    return client
+
+
+def snapshot(app):
+    with app.app_context():
+        return dict(metrics.read_counters()), metrics.read_daily(3)
+
+
+def summaries(app):
+    with app.app_context():
+        return {row.user_id: (row.order_count, round(row.total_spent, 2), row.last_order_at)
+                for row in UserOrderSummary.query}
+
+
+def product_form(name, stock):
+    return {'name': name, 'description': 'Test product', 'price': 50,
+            'category': 'other', 'image_url': '', 'stock_quantity': stock}
+
+
+def test_incremental_counters_match_rebuild():
+    app = make_app()
+    admin = login(app, 'admin@example.com', 'admin123')
+    for name, stock in [('Ball', 30), ('Bat', 5), ('Net', 2), ('Glove', 12)]:
+        admin.post('/admin/products/add', data=product_form(name, stock))
+    with app.app_context():
+        ids = {p.name: p.id for p in Product.query}
+
+    admin.post(f"/admin/products/edit/{ids['Glove']}", data=product_form('Glove', 8))
+    admin.get(f"/admin/products/delete/{ids['Bat']}")
+
+    customer = app.test_client()
+    customer.post('/register', data={'username': 'customer', 'email': 'customer@example.com',
+                                     'password': 'customer123', 'password2': 'customer123'})
+    customer = login(app, 'customer@example.com', 'customer123')
+    customer.post('/add-to-cart', data={'product_id': ids['Net'], 'quantity': 2})
+    customer.post('/add-to-cart', data={'product_id': ids['Ball'], 'quantity': 1})
+    customer.post('/checkout')
+    customer.post('/add-to-cart', data={'product_id': ids['Ball'], 'quantity': 3})
+    customer.post('/checkout')
+
+    with app.app_context():
+        customer_id = User.query.filter_by(username='customer').first().id
+    assert summaries(app)[customer_id][:2] == (2, 300.0), summaries(app)
+    admin.post('/admin/orders/1/update-status', data={'status': 'cancelled'})
+    assert summaries(app)[customer_id][:2] == (2, 150.0), summaries(app)
+    admin.post('/admin/orders/2/update-status', data={'status': 'shipped'})
+    user_summaries = summaries(app)
+    assert user_summaries[customer_id][:2] == (2, 150.0), user_summaries
+    admin.post(f'/admin/users/{customer_id}/toggle-admin')
+
+    counters, daily = snapshot(app)
+    assert counters['products.total'] == 3, counters
+    assert counters['products.stock.out'] == 1 and counters['products.stock.low'] == 1, counters
+    assert counters['orders.total'] == 2 and counters['orders.status.cancelled'] == 1, counters
+    assert counters['users.admins'] == 2 and counters['users.customers'] == 0, counters
+    assert daily[0]['orders'] == 2 and daily[0]['revenue'] == 150 and daily[0]['new_users'] == 2, daily
+
+    with app.app_context():
+        metrics.rebuild()
+        db.session.commit()
+    rebuilt = snapshot(app)
+    # Counters that were driven to zero are kept; a rebuild simply omits them
+    assert {k: v for k, v in counters.items() if v} == rebuilt[0], (counters, rebuilt[0])
+    assert daily == rebuilt[1], (daily, rebuilt[1])
+    assert summaries(app) == user_summaries, (summaries(app), user_summaries)
+
+
+def test_dashboard_reads_counters():
+    app = make_app()
+    admin = login(app, 'admin@example.com', 'admin123')
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    admin.get('/admin')  # Warm the user cache
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = admin.get('/admin')
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    assert not [s for s in statements if 'count(' in s.lower()], statements
+
+
+if __name__ == "__main__":
+    print("SpEquip Dashboard Metrics Test")
+    print("=" * 50)
+    try:
+        test_incremental_counters_match_rebuild()
+        test_dashboard_reads_counters()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Dashboard counters stay in step with the data.")
@@ -4,12 +4,39 @@ Test script to verify that product deletion now works properly without Integrity
 """
 
 from app import create_app, db
-from app.models import Product, Review, CartItem, Wishlist, OrderItem
+from app.models import User, Order, Product, Review, CartItem, Wishlist, OrderItem
 import sys
+import tempfile
+
+def make_app():
+    """App over a throwaway instance folder, seeded with a reviewed product and an ordered one"""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///spequip.db'},
+                     instance_path=tempfile.mkdtemp(prefix='spequip-instance-'))
+    with app.app_context():
+        db.create_all()
+        user = User(username='customer', email='customer@example.com', password_hash='x')
+        reviewed = Product(name='Reviewed Racket', description='Has reviews', price=500,
+                           category='tennis', stock_quantity=5)
+        ordered = Product(name='Ordered Ball', description='Has orders', price=100,
+                          category='tennis', stock_quantity=5)
+        db.session.add_all([user, reviewed, ordered])
+        db.session.flush()
+        order = Order(user_id=user.id, total_amount=100)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add_all([
+            Review(user_id=user.id, product_id=reviewed.id, rating=4, comment='Solid'),
+            Review(user_id=user.id, product_id=ordered.id, rating=5, comment='Bouncy'),
+            CartItem(user_id=user.id, product_id=reviewed.id, quantity=1),
+            Wishlist(user_id=user.id, product_id=reviewed.id),
+            OrderItem(order_id=order.id, product_id=ordered.id, quantity=1, price=100),
+        ])
+        db.session.commit()
+    return app
 
 def test_product_deletion():
     """Test product deletion scenarios"""
-    app = create_app()
+    app = make_app()
     
     with app.app_context():
         print("Testing Product Deletion Scenarios...")
@@ -63,7 +90,7 @@ def test_product_deletion():
 
 def test_cascade_relationships():
     """Test that cascade deletes work properly"""
-    app = create_app()
+    app = make_app()
     
     with app.app_context():
         print("\nTesting Cascade Relationships...")
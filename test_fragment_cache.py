@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Fragment cache backend test: a file or server database gets a cache
+shared by every process, so a CLI command's invalidation reaches the
+running workers; databases sharing a cache directory never share pages;
+and a command run with the per-process memory cache says its change
+cannot reach the servers.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from app import create_app, db
+from app.cache import fragment_cache
+from app.models import Product
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app(**config):
+    return create_app(dict({'WTF_CSRF_ENABLED': False}, **config), instance_path=INSTANCE_PATH)
+
+
+def test_default_backend():
+    assert make_app(SQLALCHEMY_DATABASE_URI='sqlite://').config['FRAGMENT_CACHE_BACKEND'] == 'memory'
+    workdir = tempfile.mkdtemp(prefix='spequip-fragments-')
+    try:
+        app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'shop.db')}",
+                       FRAGMENT_CACHE_DIR=os.path.join(workdir, 'cache'))
+        assert app.config['FRAGMENT_CACHE_BACKEND'] == 'filesystem'
+        with app.app_context():
+            assert fragment_cache.is_shared()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_cli_reaches_running_workers():
+    workdir = tempfile.mkdtemp(prefix='spequip-fragments-')
+    try:
+        cache_dir = os.path.join(workdir, 'cache')
+        web, cli = [make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'shop.db')}",
+                             FRAGMENT_CACHE_DIR=cache_dir) for _ in range(2)]
+        other = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'other.db')}",
+                         FRAGMENT_CACHE_DIR=cache_dir)
+        with web.app_context():
+            db.create_all()
+            db.session.add(Product(name='Ball', description='Test', price=10, category='other', stock_quantity=5))
+            db.session.commit()
+            before = fragment_cache.generation()
+            assert fragment_cache.memoize('count', lambda: 'web') == 'web'
+        with other.app_context():
+            # Same directory, another database: nothing cached by `web` is read
+            assert fragment_cache.memoize('count', lambda: 'other') == 'other'
+
+        for command in (['clear-fragment-cache'], ['rebuild-facets']):
+            result = cli.test_cli_runner().invoke(args=command)
+            assert result.exit_code == 0 and 'Warning' not in result.output, result.output
+            with web.app_context():
+                assert fragment_cache.generation() > before
+                before = fragment_cache.generation()
+                assert fragment_cache.memoize('count', lambda: 'fresh') == 'fresh'
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_memory_backend_warns():
+    app = make_app(SQLALCHEMY_DATABASE_URI='sqlite://')
+    with app.app_context():
+        db.create_all()
+    for command in (['clear-fragment-cache'], ['rebuild-facets']):
+        result = app.test_cli_runner().invoke(args=command)
+        assert result.exit_code == 0
+        assert "FRAGMENT_CACHE_BACKEND is 'memory'" in result.stderr, result.output
+
+    app = make_app(SQLALCHEMY_DATABASE_URI='sqlite://', FRAGMENT_CACHE_BACKEND='none')
+    assert 'Warning' not in app.test_cli_runner().invoke(args=['clear-fragment-cache']).output
+
+
+if __name__ == "__main__":
+    print("SpEquip Fragment Cache Test")
+    print("=" * 50)
+    try:
+        test_default_backend()
+        test_cli_reaches_running_workers()
+        test_memory_backend_warns()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Catalog changes reach every process.")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+HTTP compression and conditional GET test: pages and streamed exports
+are sent with the encoding the browser prefers and decode to the same
+bytes, the info pages answer a repeated request with 304 Not Modified,
+and an anonymous catalog page is answered with 304 before anything is
+rendered or queried, until the catalog changes. That shortcut is only
+taken with a fragment cache shared by every process, so a change made by
+another worker is never hidden.
+"""
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+from werkzeug.http import generate_etag
+from app import create_app, db, facets
+from app.cache import fragment_cache
+from app.models import User, Product, Order
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+INFO_PAGES = ['/help-center', '/shipping-info', '/returns', '/about-us', '/careers',
+              '/privacy-policy', '/terms-of-service']
+
+
+def make_app(**config):
+    app = create_app(dict({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False}, **config),
+                     instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        for i in range(20):
+            db.session.add(Product(name=f'Ball {i}', description='Test product', price=100 + i,
+                                   category='other', stock_quantity=5))
+        db.session.flush()
+        for i in range(300):
+            db.session.add(Order(user_id=admin.id, total_amount=100 + i, status='delivered'))
+        db.session.commit()
+    return app
+
+
+def count_statements(app, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        return func(), statements
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_negotiated_encoding():
+    app = make_app()
+    client = app.test_client()
+    plain = client.get('/help-center')
+    assert 'Content-Encoding' not in plain.headers and 'Accept-Encoding' in plain.headers['Vary']
+
+    response = client.get('/help-center', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+    assert int(response.headers['Content-Length']) == len(response.data) < len(plain.data) / 2
+
+    response = client.get('/help-center', headers={'Accept-Encoding': 'gzip;q=1.0, br;q=0.5'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    if brotli is not None:
+        response = client.get('/help-center', headers={'Accept-Encoding': 'gzip, deflate, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data) == plain.data
+    response = client.get('/help-center', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+
+    app = make_app(COMPRESS_MIN_SIZE=10 ** 6)
+    response = app.test_client().get('/help-center', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_export():
+    app = make_app(COMPRESS_STREAM_FLUSH=1000)
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    plain = client.get('/admin/orders/export.csv').data
+    response = client.get('/admin/orders/export.csv', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    assert response.is_streamed
+    assert gzip.decompress(response.data) == plain and plain.count(b'\n') == 301
+
+
+def test_info_pages_not_modified():
+    app = make_app()
+    for login in (False, True):
+        client = app.test_client()
+        if login:
+            client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+        for url in INFO_PAGES:
+            first = client.get(url)
+            etag, weak = first.get_etag()
+            assert first.status_code == 200 and etag and weak, url
+            assert 'no-cache' in first.headers['Cache-Control']
+            # One validator for every encoding
+            for encoding in ('identity', 'gzip'):
+                again = client.get(url, headers={'If-None-Match': first.headers['ETag'],
+                                                 'Accept-Encoding': encoding})
+                assert again.status_code == 304 and not again.data, (url, encoding)
+                assert 'Content-Encoding' not in again.headers
+            assert client.get(url, headers={'If-None-Match': 'W/"stale"'}).status_code == 200
+
+
+def test_catalog_not_modified_before_rendering():
+    cache_dir = tempfile.mkdtemp(prefix='spequip-fragments-')
+    try:
+        check_catalog_not_modified(make_app(FRAGMENT_CACHE_BACKEND='filesystem', FRAGMENT_CACHE_DIR=cache_dir))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def check_catalog_not_modified(app):
+    client = app.test_client()
+    for url in ('/', '/products', '/products?sort=price_desc&page=2'):
+        first = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert first.status_code == 200 and first.headers['Content-Encoding'] == 'gzip'
+        assert first.headers['Last-Modified']
+        again, statements = count_statements(app, lambda: client.get(
+            url, headers={'If-None-Match': first.headers['ETag'], 'Accept-Encoding': 'gzip'}))
+        assert again.status_code == 304 and not statements, (url, statements)
+
+    with app.app_context():
+        fragment_cache.bump()
+    assert client.get('/products', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+    # Logged in, the rendered page is hashed instead
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    first = client.get('/products')
+    assert 'Last-Modified' not in first.headers
+    assert client.get('/products', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    client.post('/add-to-cart', data={'product_id': '1', 'quantity': '1'})
+    # The cart badge changed, so the page did too
+    assert client.get('/products', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+
+def test_catalog_bumped_by_another_process():
+    workdir = tempfile.mkdtemp(prefix='spequip-fragments-')
+    try:
+        config = dict(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'shop.db')}",
+                      FRAGMENT_CACHE_BACKEND='filesystem', FRAGMENT_CACHE_DIR=os.path.join(workdir, 'cache'))
+        web = make_app(**config)
+        cli = create_app(dict({'WTF_CSRF_ENABLED': False}, **config),
+                         instance_path=INSTANCE_PATH)  # e.g. flask import-products
+        client = web.test_client()
+        etag = client.get('/products').headers['ETag']
+        with cli.app_context():
+            db.session.execute(db.update(Product).values(name='Renamed ball'))
+            facets.rebuild()
+            db.session.commit()
+            fragment_cache.bump()
+        response = client.get('/products', headers={'If-None-Match': etag})
+        assert response.status_code == 200 and b'Renamed ball' in response.data
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_process_local_cache_hashes_the_page():
+    # Another worker's bump never reaches this process's generation, so
+    # it must not vouch for the page
+    client = make_app(FRAGMENT_CACHE_BACKEND='memory').test_client()
+    first = client.get('/products')
+    assert first.get_etag() == (generate_etag(first.data), True)
+    assert 'Last-Modified' not in first.headers
+    assert client.get('/products', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+if __name__ == "__main__":
+    print("SpEquip HTTP Compression Test")
+    print("=" * 50)
+    try:
+        test_negotiated_encoding()
+        test_streamed_export()
+        test_info_pages_not_modified()
+        test_catalog_not_modified_before_rendering()
+        test_catalog_bumped_by_another_process()
+        test_process_local_cache_hashes_the_page()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Pages are compressed and revalidated.")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Background job test: a job is stored only if the transaction that
+enqueued it commits, an idempotency key adds it once, a failing job is
+retried with a growing delay and then marked failed, a job left running
+by a dead worker is taken over once its lease runs out (and the old
+worker can no longer record a result for it), and several
+worker processes run each job exactly once. An image uploaded in eager
+mode is resized before the response.
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Product, Job
+from app.jobs import job, jobs
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+JOBS = 200
+failures_left = {}
+
+
+@job('test.restock')
+def restock(product_id):
+    db.session.execute(db.update(Product).where(Product.id == product_id)
+                       .values(stock_quantity=Product.stock_quantity + 1))
+
+
+@job('test.flaky')
+def flaky(name):
+    if failures_left.get(name, 0):
+        failures_left[name] -= 1
+        raise ValueError(f'{name} is not ready')
+
+
+def make_app(products=1, **config):
+    app = create_app(dict({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False}, **config),
+                     instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        for i in range(products):
+            db.session.add(Product(name=f'Ball {i}', description='Test', price=10, category='other',
+                                   stock_quantity=0))
+        db.session.commit()
+    return app
+
+
+def job_row(key):
+    return db.session.execute(db.select(Job).where(Job.idempotency_key == key)).scalar_one()
+
+
+def test_enqueue_is_transactional():
+    app = make_app()
+    with app.app_context():
+        jobs.enqueue('test.restock', {'product_id': 1})
+        db.session.rollback()
+        assert Job.query.count() == 0
+
+        assert jobs.enqueue('test.restock', {'product_id': 1}, key='restock:1')
+        db.session.commit()
+        assert not jobs.enqueue('test.restock', {'product_id': 1}, key='restock:1')
+        db.session.commit()
+        assert Job.query.count() == 1
+
+        try:
+            jobs.enqueue('test.missing')
+        except LookupError:
+            pass
+        else:
+            raise AssertionError('enqueued a job nothing can run')
+
+        assert jobs.work(until_idle=True) == 1
+        assert db.session.get(Product, 1).stock_quantity == 1
+        assert job_row('restock:1').status == 'done'
+        # Finished jobs keep their key until purged
+        assert not jobs.enqueue('test.restock', {'product_id': 1}, key='restock:1')
+
+
+def test_retry_then_fail():
+    app = make_app(JOBS_RETRY_BACKOFF=10)
+    with app.app_context():
+        failures_left.update(soon=1, never=5)
+        jobs.enqueue('test.flaky', {'name': 'soon'}, key='soon')
+        jobs.enqueue('test.flaky', {'name': 'never'}, key='never', max_attempts=3)
+        db.session.commit()
+
+        waits = []
+        for attempt in (1, 2, 3):
+            jobs.work(until_idle=True)
+            never = job_row('never')
+            assert never.attempts == attempt and 'not ready' in never.last_error
+            if never.status == 'queued':
+                waits.append((never.run_at - datetime.utcnow()).total_seconds())
+                # Make the retry due now instead of waiting
+                never.run_at = datetime.utcnow()
+                job_row('soon').run_at = datetime.utcnow()
+                db.session.commit()
+        assert [round(wait) for wait in waits] == [10, 20], waits
+        assert job_row('never').status == 'failed' and job_row('never').finished_at
+        assert job_row('soon').status == 'done' and job_row('soon').attempts == 2
+        assert jobs.counts() == {'done': 1, 'failed': 1}
+
+        job_row('never').finished_at = datetime.utcnow() - timedelta(days=8)
+        db.session.commit()
+        assert jobs.purge() == 1
+        db.session.commit()
+        assert jobs.counts() == {'done': 1}
+
+
+def test_abandoned_job_is_taken_over():
+    app = make_app(JOBS_LEASE=60)
+    with app.app_context():
+        jobs.enqueue('test.restock', {'product_id': 1}, key='restock:1')
+        db.session.commit()
+        # A worker claims the job and dies before finishing it
+        assert jobs.claim('dead-worker')
+        assert jobs.work(worker='live-worker', until_idle=True) == 0
+
+        job_row('restock:1').locked_at = datetime.utcnow() - timedelta(seconds=61)
+        db.session.commit()
+        assert jobs.work(worker='live-worker', until_idle=True) == 1
+        row = job_row('restock:1')
+        assert (row.status, row.locked_by, row.attempts) == ('done', 'live-worker', 2)
+        assert db.session.get(Product, 1).stock_quantity == 1
+
+
+def test_failure_after_takeover_is_ignored():
+    app = make_app(JOBS_LEASE=60)
+    with app.app_context():
+        failures_left['slow'] = 1
+        jobs.enqueue('test.flaky', {'name': 'slow'}, key='slow')
+        db.session.commit()
+        stale = jobs.claim('slow-worker')
+        job_row('slow').locked_at = datetime.utcnow() - timedelta(seconds=61)
+        db.session.commit()
+        taken_over = jobs.claim('live-worker')
+        assert taken_over and jobs.claim('third-worker') is None
+
+        # The first worker fails late; the job is no longer its to requeue
+        assert not jobs.execute(stale, 'slow-worker')
+        row = job_row('slow')
+        assert (row.status, row.locked_by, row.last_error) == ('running', 'live-worker', None)
+        assert jobs.execute(taken_over, 'live-worker')
+        assert job_row('slow').status == 'done'
+
+
+def test_workers_run_each_job_once():
+    workdir = tempfile.mkdtemp(prefix='spequip-jobs-')
+    try:
+        app = make_app(products=JOBS, SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'jobs.db')}",
+                       JOBS_POLL_INTERVAL=0.05)
+        with app.app_context():
+            for product_id in range(1, JOBS + 1):
+                jobs.enqueue('test.restock', {'product_id': product_id}, key=f'restock:{product_id}')
+            db.session.commit()
+
+        jobs.run_workers(app, 4, until_idle=True)
+
+        with app.app_context():
+            assert jobs.counts() == {'done': JOBS}, jobs.counts()
+            stock = dict(db.session.execute(db.select(Product.stock_quantity, db.func.count())
+                                            .group_by(Product.stock_quantity)).all())
+            assert stock == {1: JOBS}, stock
+            assert Job.query.filter(Job.attempts != 1).count() == 0
+            workers = db.session.execute(db.select(db.func.count(Job.locked_by.distinct()))).scalar()
+            print(f"{JOBS} jobs run by {workers} worker processes")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_eager_image_upload():
+    if Image is None:
+        print("Pillow is not installed; skipping")
+        return
+    app = make_app(JOBS_EAGER=True, IMAGE_DIR=tempfile.mkdtemp(prefix='spequip-images-'), IMAGE_WIDTHS=(160,))
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 300), 'green').save(buffer, 'PNG')
+    response = client.post('/admin/products/edit/1', content_type='multipart/form-data', data={
+        'name': 'Ball 0', 'description': 'Test', 'price': 10, 'category': 'other', 'image_url': '',
+        'stock_quantity': 5, 'image_file': (io.BytesIO(buffer.getvalue()), 'ball.png'),
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        product = db.session.get(Product, 1)
+        assert product.image_key and product.image_pending is None
+        assert Job.query.one().status == 'done'
+        assert not os.listdir(os.path.join(app.config['IMAGE_DIR'], 'uploads'))
+
+
+if __name__ == "__main__":
+    print("SpEquip Background Job Test")
+    print("=" * 50)
+    try:
+        test_enqueue_is_transactional()
+        test_retry_then_fail()
+        test_abandoned_job_is_taken_over()
+        test_failure_after_takeover_is_ignored()
+        test_workers_run_each_job_once()
+        test_eager_image_upload()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Every job ran once, or failed after its retries.")
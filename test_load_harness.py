@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Load-testing harness test: benchmarks/generate_data.py writes the
+requested number of rows, the same seed gives the same data, the
+derived columns and tables match the generated rows, and generated users
+can log in; benchmarks/bench_routes.py drives every endpoint against
+that database without errors and reports timings and statement counts.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product, Order, OrderItem, Review
+from benchmarks.generate_data import count, generate
+from benchmarks.bench_routes import ENDPOINTS, InProcessTarget, run_endpoint, print_results
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+SIZES = dict(users=30, products=20, orders=60, reviews=40)
+
+
+def make_app(path):
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'WTF_CSRF_ENABLED': False},
+                      instance_path=INSTANCE_PATH)
+
+
+def fill(path, seed=42, reset=False):
+    app = make_app(path)
+    generate(app, seed=seed, reset=reset, progress=lambda line: None, **SIZES)
+    return app
+
+
+def snapshot(app):
+    with app.app_context():
+        return (
+            db.session.execute(db.select(User.email, User.created_at).order_by(User.id)).all(),
+            db.session.execute(db.select(Product.name, Product.price, Product.stock_quantity)
+                               .order_by(Product.id)).all(),
+            db.session.execute(db.select(Order.user_id, Order.total_amount, Order.status)
+                               .order_by(Order.id)).all(),
+            db.session.execute(db.select(Review.user_id, Review.product_id, Review.rating)
+                               .order_by(Review.id)).all(),
+        )
+
+
+def test_count_argument():
+    assert [count(value) for value in ('0', '1000', '1e3', '1_000')] == [0, 1000, 1000, 1000]
+    for value in ('-1', '2.5', '1e-1'):
+        try:
+            count(value)
+        except argparse.ArgumentTypeError:
+            continue
+        raise AssertionError(f'{value} accepted')
+
+
+def test_generated_dataset():
+    workdir = tempfile.mkdtemp(prefix='spequip-loadtest-')
+    try:
+        app = fill(os.path.join(workdir, 'first.db'))
+        with app.app_context():
+            # The admin comes on top of the generated users
+            assert User.query.count() == SIZES['users'] + 1
+            assert Product.query.count() == SIZES['products'] and Order.query.count() == SIZES['orders']
+            assert Review.query.count() == SIZES['reviews']
+            assert db.session.query(Review.user_id, Review.product_id).distinct().count() == SIZES['reviews']
+            for order in Order.query:
+                lines = OrderItem.query.filter_by(order_id=order.id).all()
+                assert lines and round(sum(line.price * line.quantity for line in lines), 2) == order.total_amount
+
+            stored = [(product.rating_sum, product.rating_count, product.units_sold) for product in Product.query]
+            Product.refresh_rating_aggregates()
+            Product.refresh_sales()
+            assert [(product.rating_sum, product.rating_count, product.units_sold)
+                    for product in Product.query] == stored
+            db.session.rollback()
+
+        client = app.test_client()
+        for email, password in (('user0@example.com', 'password123'), ('admin@example.com', 'admin123')):
+            assert client.post('/login', data={'email': email, 'password': password}).status_code == 302
+            client.get('/logout')
+
+        assert snapshot(fill(os.path.join(workdir, 'second.db'))) == snapshot(app)
+        assert snapshot(fill(os.path.join(workdir, 'third.db'), seed=7)) != snapshot(app)
+
+        # A filled database is only replaced on request
+        try:
+            fill(os.path.join(workdir, 'first.db'))
+        except SystemExit as e:
+            assert 'already holds data' in str(e)
+        else:
+            raise AssertionError('a filled database was written to again')
+        assert snapshot(fill(os.path.join(workdir, 'first.db'), reset=True)) == snapshot(app)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_route_harness():
+    workdir = tempfile.mkdtemp(prefix='spequip-loadtest-')
+    try:
+        path = os.path.join(workdir, 'loadtest.db')
+        fill(path)
+        target = InProcessTarget(path, {}, instance_path=INSTANCE_PATH)
+        credentials = {'customer': ('user0@example.com', 'password123'),
+                       'admin': ('admin@example.com', 'admin123')}
+        results = {name: run_endpoint(target, endpoint, credentials.get(role), requests=4, warmup=1,
+                                      concurrency=2, seed=1)
+                   for name, role, endpoint in ENDPOINTS}
+        for name, row in results.items():
+            assert row['errors'] == 0, (name, row)
+            assert row['requests'] == 4 and 0 < row['p50_ms'] <= row['p95_ms'] <= row['p99_ms'] <= row['max_ms']
+            assert row['statements'] is not None, name
+        # Cached pages may issue none, but the counts are real
+        assert results['orders']['statements']['min'] >= 1, results['orders']
+        json.dumps(results)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            print_results(results, baseline=results)
+        lines = output.getvalue().splitlines()
+        assert len(lines) == len(ENDPOINTS) + 1 and all('+0%' in line for line in lines[1:]), lines
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    print("SpEquip Load-Testing Harness Test")
+    print("=" * 50)
+    try:
+        test_count_argument()
+        test_generated_dataset()
+        test_route_harness()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! The generator and route harness work.")
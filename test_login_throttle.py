@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Login hardening test: hashes made with old parameters are replaced on the
+next successful login, repeated failures for an account from one client,
+or from one client IP, are turned away with 429 before any password is
+hashed (the client IP read from X-Forwarded-For behind a trusted proxy),
+and a full hashing pool answers logins and sign-ups with 503 instead of
+queueing without bound.
+"""
+
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app(**config):
+    app = create_app(dict({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'LOGIN_MAX_FAILURES_PER_EMAIL': 3,
+        'LOGIN_MAX_FAILURES_PER_IP': 5,
+    }, **config), instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        for name in ('alice', 'bob', 'carol'):
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password(f'{name}123')
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def login(client, name, password=None, email=None, **kwargs):
+    return client.post('/login', data={'email': email or f'{name}@example.com',
+                                       'password': password or f'{name}123'}, **kwargs)
+
+
+def client_at(app, address):
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = address
+    return client
+
+
+def test_rehash_on_login():
+    app = make_app()
+    with app.app_context():
+        assert User.query.filter_by(username='alice').one().password_hash.startswith('pbkdf2:sha256:1000$')
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+    client = app.test_client()
+    assert login(client, 'alice').status_code == 302
+    with app.app_context():
+        alice = User.query.filter_by(username='alice').one()
+        assert alice.password_hash.startswith('pbkdf2:sha256:2000$'), alice.password_hash
+        assert not alice.password_needs_rehash() and alice.check_password('alice123')
+    client.get('/logout')
+    assert login(client, 'alice').status_code == 302
+
+
+def test_failures_are_throttled_before_hashing():
+    app = make_app()
+    client = app.test_client()
+    checks = []
+    original = User.check_password
+    User.check_password = lambda self, password: checks.append(self.id) or original(self, password)
+    try:
+        for _ in range(3):
+            assert login(client, 'alice', 'wrong').status_code == 200
+        assert len(checks) == 3
+        response = login(client, 'alice')
+        assert response.status_code == 429 and int(response.headers['Retry-After']) > 0
+        assert 'Too many failed login attempts' in response.get_data(as_text=True)
+        assert len(checks) == 3, 'a throttled login must not hash'
+
+        # Other accounts are fine until the IP itself runs out of attempts
+        assert login(client, 'bob').status_code == 302
+        client.get('/logout')
+        for _ in range(2):
+            login(client, 'carol', 'wrong')
+        assert login(client, 'carol').status_code == 429
+    finally:
+        User.check_password = original
+
+
+def test_throttle_is_per_client():
+    app = make_app()
+    attacker = client_at(app, '203.0.113.9')
+    for email in ('alice@example.com', 'Alice@Example.com', 'ALICE@EXAMPLE.COM'):
+        assert login(attacker, 'alice', 'wrong', email=email).status_code == 200
+    assert login(attacker, 'alice').status_code == 429
+    # Alice herself, on another address, is not locked out
+    assert login(client_at(app, '198.51.100.7'), 'alice').status_code == 302
+
+
+def test_client_address_behind_proxy():
+    def attempts(app):
+        client = client_at(app, '10.0.0.2')  # The proxy
+        codes = []
+        for address in ('203.0.113.9', '203.0.113.9', '203.0.113.9', '198.51.100.7'):
+            codes.append(login(client, 'alice', 'wrong' if len(codes) < 3 else None,
+                               headers={'X-Forwarded-For': address}).status_code)
+            client.get('/logout')
+        return codes
+
+    # Without ProxyFix every visitor is the proxy, so alice is locked out
+    assert attempts(make_app()) == [200, 200, 200, 429]
+    assert attempts(make_app(PROXY_FIX_X_FOR=1)) == [200, 200, 200, 302]
+
+
+def test_full_pool_is_rejected():
+    app = make_app(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    slots = app.extensions['passwords']['slots']
+    signup = {'username': 'dave', 'email': 'dave@example.com', 'password': 'dave1234',
+              'password2': 'dave1234'}
+    slots.acquire()
+    try:
+        assert login(app.test_client(), 'alice').status_code == 503
+        response = app.test_client().post('/register', data=signup)
+        assert response.status_code == 503 and b'could not create your account' in response.data
+        with app.app_context():
+            assert User.query.filter_by(username='dave').count() == 0
+    finally:
+        slots.release()
+    assert login(app.test_client(), 'alice').status_code == 302
+    assert app.test_client().post('/register', data=signup).status_code == 302
+
+
+if __name__ == "__main__":
+    print("SpEquip Login Throttle Test")
+    print("=" * 50)
+    try:
+        test_rehash_on_login()
+        test_failures_are_throttled_before_hashing()
+        test_throttle_is_per_client()
+        test_client_address_behind_proxy()
+        test_full_pool_is_rejected()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Logins are throttled and hashes upgraded.")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Regression test: the order history pages must load orders, items and
+products in a fixed number of statements, however many orders are shown,
+and the admin user list must show order counts without loading orders.
+Keyset pages refuse sort keys that can be NULL.
+"""
+
+from contextlib import contextmanager
+import re
+from app import create_app, db, metrics
+from app.models import User, Product, Order, OrderItem, Review
+from app.pagination import KeysetPagination
+from sqlalchemy.exc import IntegrityError
+import sys
+import tempfile
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+# Statements allowed per page: user load, cart badge, (count,) orders, items
+MAX_STATEMENTS = 6
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        # Count on every page so both runs issue the same statements
+        'PAGINATION_TOTALS': 'exact',
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        customer = User(username='customer', email='customer@example.com')
+        customer.set_password('customer123')
+        db.session.add_all([admin, customer])
+
+        products = [Product(name=f'Product {i}', description='Test product', price=100 + i,
+                            category='other', stock_quantity=10) for i in range(5)]
+        db.session.add_all(products)
+        db.session.commit()
+    return app
+
+
+def add_orders(app, count, username='customer'):
+    with app.app_context():
+        customer = User.query.filter_by(username=username).first()
+        products = Product.query.all()
+        for _ in range(count):
+            order = Order(user_id=customer.id, total_amount=0)
+            db.session.add(order)
+            db.session.flush()
+            for product in products[:3]:
+                db.session.add(OrderItem(order_id=order.id, product_id=product.id,
+                                         quantity=1, price=product.price))
+        # Orders added here bypass checkout, so recompute the per-user summaries
+        metrics.rebuild()
+        db.session.commit()
+
+
+@contextmanager
+def count_statements(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def page_statements(app, email, password, url, page=None):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    with count_statements(app) as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    if page is not None:
+        page.append(response.get_data(as_text=True))
+    return len(statements)
+
+
+def check_page(email, password, url):
+    app = make_app()
+    add_orders(app, 2)
+    few = page_statements(app, email, password, url)
+    add_orders(app, 8)
+    many = page_statements(app, email, password, url)
+    print(f"{url}: {few} statements with 2 orders, {many} with 10 orders")
+    assert many == few, f"{url} issues more statements as orders grow ({few} -> {many})"
+    assert many <= MAX_STATEMENTS, f"{url} issued {many} statements (limit {MAX_STATEMENTS})"
+
+
+def test_orders_page_statement_count():
+    check_page('customer@example.com', 'customer123', '/orders')
+
+
+def test_admin_orders_page_statement_count():
+    check_page('admin@example.com', 'admin123', '/admin/orders')
+
+
+def test_orders_page_is_paginated():
+    app = make_app()
+    add_orders(app, 12)
+    pages = []
+    page_statements(app, 'customer@example.com', 'customer123', '/orders', pages)
+    assert len(re.findall(r'<strong>Order #\d+</strong>', pages[0])) == 10
+    assert '12 orders' in pages[0] and 'Next' in pages[0]
+
+
+def test_pagination_keys_are_not_null():
+    # A NULL key never matches the cursor comparison, so its row would
+    # vanish after page 1: such keys are refused, and the keys in use
+    # cannot be NULL
+    app = make_app()
+    with app.app_context():
+        try:
+            KeysetPagination(Review.query, [Review.created_at, Review.id])
+        except ValueError as e:
+            assert 'created_at' in str(e)
+        else:
+            raise AssertionError('a nullable key was accepted')
+
+        customer = User.query.filter_by(username='customer').first()
+        try:
+            db.session.execute(db.insert(Order.__table__).values(user_id=customer.id, total_amount=0,
+                                                                 created_at=None))
+        except IntegrityError:
+            db.session.rollback()
+        else:
+            raise AssertionError('an order was stored without created_at')
+
+
+def test_admin_users_page_statement_count():
+    app = make_app()
+    add_orders(app, 2)
+    few = page_statements(app, 'admin@example.com', 'admin123', '/admin/users')
+    with app.app_context():
+        for i in range(12):
+            user = User(username=f'buyer{i}', email=f'buyer{i}@example.com', password_hash='x')
+            db.session.add(user)
+        db.session.commit()
+    for i in range(12):
+        add_orders(app, 1 + i % 3, username=f'buyer{i}')
+    pages = []
+    many = page_statements(app, 'admin@example.com', 'admin123', '/admin/users', pages)
+    print(f"/admin/users: {few} statements with 2 users, {many} with a full page of buyers")
+    assert many == few, f"/admin/users issues more statements as users and orders grow ({few} -> {many})"
+    assert many <= MAX_STATEMENTS, f"/admin/users issued {many} statements (limit {MAX_STATEMENTS})"
+    # buyer11 is newest, with 3 orders
+    assert re.search(r'buyer11</strong>.*?<strong>3</strong>', pages[0], re.S)
+
+
+if __name__ == "__main__":
+    print("SpEquip Order Page Query Count Test")
+    print("=" * 50)
+    try:
+        test_orders_page_statement_count()
+        test_admin_orders_page_statement_count()
+        test_orders_page_is_paginated()
+        test_pagination_keys_are_not_null()
+        test_admin_users_page_statement_count()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Order pages use a fixed number of queries.")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Product image test: an uploaded image is resized by a background job
+into WebP and JPEG thumbnails with content-hashed names, pages offer them through srcset,
+the files are served with a one-year immutable cache header, and the
+bulk command resizes local images in a process pool. Needs Pillow.
+"""
+
+import io
+import os
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product
+from app.images import variant_name
+from app.jobs import jobs
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'IMAGE_DIR': tempfile.mkdtemp(prefix='spequip-images-'),
+        'IMAGE_WIDTHS': (160, 640),
+        'IMAGE_WORKERS': 2,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.add(Product(name='Ball', description='Test product', price=10, category='other',
+                               stock_quantity=5))
+        db.session.commit()
+    return app
+
+
+def image_bytes(size=(1200, 800), color='orange', fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def product_form(**extra):
+    return dict({'name': 'Ball', 'description': 'Test product', 'price': 10, 'category': 'other',
+                 'image_url': '', 'stock_quantity': 5}, **extra)
+
+
+def test_upload_makes_thumbnails():
+    if Image is None:
+        print("Pillow is not installed; skipping")
+        return
+    app = make_app()
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    response = client.post('/admin/products/edit/1', data=product_form(image_file=(io.BytesIO(image_bytes()), 'ball.png')),
+                           content_type='multipart/form-data')
+    assert response.status_code == 302, response.get_data(as_text=True)
+
+    with app.app_context():
+        # Resized by a background job; the product keeps its old image until it has run
+        product = db.session.get(Product, 1)
+        assert product.image_pending and product.image_key is None
+        assert jobs.work(until_idle=True) == 1
+        db.session.expire_all()
+        assert product.image_pending is None
+        key = product.image_key
+        assert key and product.image_url.endswith(variant_name(key, 640, 'jpeg')), product.image_url
+        for width in (160, 640):
+            for fmt in ('webp', 'jpeg'):
+                assert os.path.exists(os.path.join(app.config['IMAGE_DIR'], variant_name(key, width, fmt)))
+        with Image.open(os.path.join(app.config['IMAGE_DIR'], variant_name(key, 160, 'webp'))) as small:
+            assert small.size == (160, 107), small.size
+
+    page = client.get('/product/1').get_data(as_text=True)
+    assert f'{variant_name(key, 160, "webp")} 160w' in page and 'type="image/webp"' in page
+
+    response = client.get(f'/media/products/{variant_name(key, 160, "jpeg")}')
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    assert 'immutable' in response.headers['Cache-Control'] and 'max-age=31536000' in response.headers['Cache-Control']
+    response.close()
+
+    response = client.post('/admin/products/edit/1', data=product_form(image_file=(io.BytesIO(b'not an image'), 'x.png')),
+                           content_type='multipart/form-data')
+    assert 'Not a readable image' in response.get_data(as_text=True)
+
+
+def test_bulk_command():
+    if Image is None:
+        print("Pillow is not installed; skipping")
+        return
+    app = make_app()
+    source_dir = tempfile.mkdtemp(prefix='spequip-sources-')
+    with app.app_context():
+        for i, color in enumerate(['red', 'green', 'blue']):
+            path = os.path.join(source_dir, f'{color}.jpg')
+            with open(path, 'wb') as f:
+                f.write(image_bytes(color=color, fmt='JPEG'))
+            db.session.add(Product(name=f'Local {i}', description='Test', price=1, category='other',
+                                   stock_quantity=1, image_url=path))
+        db.session.add(Product(name='Remote', description='Test', price=1, category='other',
+                               stock_quantity=1, image_url='https://example.com/remote.jpg'))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['process-product-images'])
+    assert result.exit_code == 0, result.output
+    assert 'Thumbnails made for 3 products' in result.output, result.output
+    with app.app_context():
+        keys = {p.name: p.image_key for p in Product.query}
+        assert all(keys[f'Local {i}'] for i in range(3)) and keys['Remote'] is None, keys
+        assert len(set(keys.values()) - {None}) == 3, 'different images must get different names'
+
+
+if __name__ == "__main__":
+    print("SpEquip Product Image Test")
+    print("=" * 50)
+    try:
+        test_upload_makes_thumbnails()
+        test_bulk_command()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Product images are served as thumbnails.")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Product search test: name matches outrank category and description
+matches, ranked results come in one fixed order so walking the pages of
+a query returns every match exactly once (whether or not the query has
+more matches than SEARCH_RANK_WINDOW ranks at once, in which case older
+matches follow the newest ones), and the index
+follows products added, edited and deleted through the admin pages. The
+FTS5 table is created with the schema, never by a search.
+"""
+
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product
+from app.search import FTS5Backend, InvertedIndexBackend, product_search
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+MATCHES = 60
+
+
+def make_app(**config):
+    app = create_app(dict({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False}, **config),
+                     instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        for i in range(MATCHES):
+            # A few names mention the term, the rest only their descriptions
+            name = f'Rally Racket {i}' if i % 7 == 0 else f'Grip {i}'
+            db.session.add(Product(name=name, description=f'Tournament racket number {i}',
+                                   price=100 + i, category='tennis', stock_quantity=5))
+        db.session.add(Product(name='Goggles', description='Anti-fog', price=50, category='swimming',
+                               stock_quantity=5))
+        db.session.commit()
+        product_search.rebuild()
+        db.session.commit()
+    return app
+
+
+def walk_pages(text, per_page=12):
+    ids, page = [], 1
+    while True:
+        pagination = product_search.paginate(text, page=page, per_page=per_page)
+        ids += [product.id for product in pagination.items]
+        if not pagination.has_next:
+            return ids, pagination.total
+        page += 1
+
+
+def test_pages_cover_every_match():
+    for backend in ('fts5', 'memory'):
+        for window in (20, MATCHES, 5000):
+            app = make_app(SEARCH_BACKEND=backend, SEARCH_RANK_WINDOW=window)
+            with app.app_context():
+                ids, total = walk_pages('racket')
+                assert total == MATCHES and len(ids) == MATCHES, (backend, window, total, len(ids))
+                assert len(set(ids)) == MATCHES, (backend, window)
+                # Name matches outrank description matches within the ranked set
+                names = [db.session.get(Product, pid).name for pid in ids[:3]]
+                assert all(name.startswith('Rally') for name in names), (backend, window, names)
+
+
+def test_rank_window_boundary():
+    # FTS5 ranks only the newest SEARCH_RANK_WINDOW matches; older ones follow
+    # them, ranked among themselves, even when they are better matches
+    app = make_app(SEARCH_BACKEND='fts5', SEARCH_RANK_WINDOW=20)
+    with app.app_context():
+        newest = MATCHES - 20
+        for per_page in (12, 7, 20):
+            ids, total = walk_pages('racket', per_page=per_page)
+            assert total == MATCHES and len(set(ids)) == MATCHES, (per_page, total, len(ids))
+            assert set(ids[:20]) == set(range(newest + 1, MATCHES + 1)), (per_page, ids)
+            for part in (ids[:20], ids[20:]):
+                names = [db.session.get(Product, pid).name for pid in part]
+                rally = sum(name.startswith('Rally') for name in names)
+                assert rally and all(name.startswith('Rally') for name in names[:rally]), (per_page, names)
+
+
+def test_ranking():
+    for backend in ('fts5', 'memory'):
+        app = make_app(SEARCH_BACKEND=backend)
+        with app.app_context():
+            for name, description, category in [('Swim Cap', 'Silicone', 'swimming'),
+                                                 ('Kickboard', 'Foam board for swimming drills', 'other'),
+                                                 ('Towel', 'Microfibre', 'swimming')]:
+                product = Product(name=name, description=description, price=10, category=category,
+                                  stock_quantity=1)
+                db.session.add(product)
+                db.session.flush()
+                product_search.index_product(product)
+            db.session.commit()
+            names = [product.name for product in product_search.paginate('swim').items]
+            # Name, then category, then description matches
+            assert names[0] == 'Swim Cap' and names[-1] == 'Kickboard', (backend, names)
+            assert [product.name for product in product_search.paginate('swim cap').items] == ['Swim Cap']
+            assert [product.name for product in product_search.paginate('swim', category='other').items] \
+                == ['Kickboard']
+
+
+def test_index_follows_admin_changes():
+    for backend in ('fts5', 'memory'):
+        app = make_app(SEARCH_BACKEND=backend)
+        with app.app_context():
+            admin = User(username='admin', email='admin@example.com', is_admin=True)
+            admin.set_password('admin123')
+            db.session.add(admin)
+            db.session.commit()
+        client = app.test_client()
+        client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+
+        def found(text):
+            with app.app_context():
+                return [product.name for product in product_search.paginate(text).items]
+
+        form = {'name': 'Velocity Kite', 'description': 'Stunt kite', 'price': 40, 'category': 'other',
+                'image_url': '', 'stock_quantity': 3}
+        assert client.post('/admin/products/add', data=form).status_code == 302
+        assert found('velocity') == ['Velocity Kite'], backend
+        with app.app_context():
+            kite = Product.query.filter_by(name='Velocity Kite').one().id
+
+        response = client.post(f'/admin/products/edit/{kite}', data=dict(form, name='Zephyr Kite'))
+        assert response.status_code == 302
+        assert found('velocity') == [] and found('zephyr') == ['Zephyr Kite'], backend
+
+        assert client.get(f'/admin/products/delete/{kite}').status_code == 302
+        assert found('zephyr') == [] and found('kite') == [], backend
+
+
+def test_table_created_with_schema():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        assert FTS5Backend.table_exists()
+        # Choosing the backend only reads the schema: it neither commits nor
+        # rolls back the caller's transaction
+        db.session.add(Product(name='Pending', description='Uncommitted', price=1, category='other'))
+        db.session.flush()
+        assert isinstance(product_search.backend, FTS5Backend)
+        assert Product.query.count() == 1
+        db.session.rollback()
+        assert Product.query.count() == 0
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        # A database that was never created or upgraded falls back to the in-memory index
+        db.session.execute(db.text('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, '
+                                   'description TEXT, category TEXT)'))
+        assert isinstance(product_search.backend, InvertedIndexBackend)
+        db.session.commit()
+        result = app.test_cli_runner().invoke(args=['rebuild-search-index'])
+        assert result.exit_code == 0 and FTS5Backend.table_exists(), result.output
+
+
+if __name__ == "__main__":
+    print("SpEquip Product Search Test")
+    print("=" * 50)
+    try:
+        test_pages_cover_every_match()
+        test_rank_window_boundary()
+        test_ranking()
+        test_index_follows_admin_changes()
+        test_table_created_with_schema()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Search is ranked, paged and kept up to date.")
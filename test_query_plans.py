@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Query plan test: drive every route in routes.py, then run EXPLAIN QUERY PLAN
+on each statement it issued and fail on filtered full table scans or on
+sorts that an index should have served.
+"""
+
+import re
+import sys
+import tempfile
+from datetime import datetime
+from urllib.parse import quote
+from app import create_app, db, facets
+from app.models import User, Product, Order, OrderItem, CartItem, Review, Wishlist
+from app.pagination import encode_cursor
+from app.search import product_search
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+# Statements that cannot use a B-tree index by design
+EXEMPT = [
+    ('sqlite_master', 'schema lookups by the search index setup'),
+    ('product_search', 'full-text search is served by the FTS5 index'),
+    ('LIKE', 'admin substring search over usernames/emails'),
+]
+
+BAD_PLAN = re.compile(r'^SCAN (?!.*\bUSING\b)(?!.*VIRTUAL TABLE)|USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        customer = User(username='customer', email='customer@example.com')
+        customer.set_password('customer123')
+        db.session.add_all([admin, customer])
+        products = [Product(name=f'Tennis Ball {i}', description='Bright yellow ball', price=100 + i,
+                            category='tennis' if i % 2 else 'golf', stock_quantity=50)
+                    for i in range(6)]
+        db.session.add_all(products)
+        db.session.flush()
+        order = Order(user_id=customer.id, total_amount=100)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=order.id, product_id=products[0].id, quantity=1, price=100))
+        db.session.add(CartItem(user_id=customer.id, product_id=products[1].id, quantity=1))
+        db.session.add(Wishlist(user_id=customer.id, product_id=products[2].id))
+        db.session.add(Review(user_id=admin.id, product_id=products[1].id, rating=5, comment='Great'))
+        Product.refresh_rating_aggregates()
+        Product.refresh_sales()
+        facets.rebuild()
+        product_search.rebuild()
+        db.session.commit()
+    return app
+
+
+def capture_statements(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def cursor_urls(app, *pages):
+    """Listing URLs with page tokens that walk forwards and backwards."""
+    urls = []
+    with app.test_request_context():
+        for url, key in pages:
+            for direction in ('next', 'prev'):
+                separator = '&' if '?' in url else '?'
+                urls.append(f"{url}{separator}cursor={quote(encode_cursor(key, direction))}")
+    return urls
+
+
+def exercise_routes(app):
+    client = app.test_client()
+
+    def get(url, status=200):
+        response = client.get(url)
+        assert response.status_code == status, (url, response.status_code)
+
+    def post(url, data=None, status=302):
+        response = client.post(url, data=data)
+        assert response.status_code == status, (url, response.status_code)
+
+    for url in ['/', '/products', '/products?category=tennis', '/products?search=ball',
+                '/products?price=0-500&rating=4', '/product/2', '/about-us']:
+        get(url)
+    for url in cursor_urls(app, ('/products', [3]), ('/products?category=tennis', [3])):
+        get(url)
+    # Every sort, alone, within a category and under other facets
+    sort_keys = {'newest': datetime.utcnow(), 'price_asc': 103.0, 'price_desc': 103.0,
+                 'rating': 4.0, 'bestselling': 1}
+    for sort, key in sort_keys.items():
+        for url in [f'/products?sort={sort}', f'/products?sort={sort}&category=tennis',
+                    f'/products?sort={sort}&in_stock=1', f'/products?sort={sort}&price=0-500',
+                    f'/products?sort={sort}&category=golf&rating=4']:
+            get(url)
+            for cursor_url in cursor_urls(app, (url, [key, 3])):
+                get(cursor_url)
+        get(f'/products?sort={sort}&search=ball')
+
+    post('/login', {'email': 'customer@example.com', 'password': 'customer123'})
+    for url in ['/', '/cart', '/cart-count', '/wishlist', '/orders']:
+        get(url)
+    post('/add-to-cart', {'product_id': '4', 'quantity': '1'})
+    get('/add-to-wishlist/5', status=302)
+    post('/add-review', {'product_id': '2', 'rating': '4', 'comment': 'Nice'})
+    post('/add-all-to-cart')
+    get('/remove-from-wishlist/1', status=302)
+    get('/remove-from-cart/1', status=302)
+    post('/checkout')
+    get('/logout', status=302)
+
+    post('/login', {'email': 'admin@example.com', 'password': 'admin123'})
+    for url in ['/admin', '/admin/products', '/admin/orders', '/admin/users',
+                '/admin/users?search=cust', '/admin/products/edit/3', '/admin/profiler']:
+        get(url)
+    now = datetime.utcnow()
+    for url in cursor_urls(app, ('/admin/products', [3]), ('/admin/orders', [now, 1]),
+                           ('/admin/users', [now, 2])):
+        get(url)
+    post('/admin/orders/1/update-status', {'status': 'shipped'})
+    post('/admin/users/2/toggle-admin')
+    get('/admin/products/delete/6', status=302)
+
+
+def test_routes_use_indexes():
+    app = make_app()
+    statements = capture_statements(app)
+    exercise_routes(app)
+
+    problems = []
+    checked = set()
+    with app.app_context():
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            if statement in checked or any(text in statement for text, _ in EXEMPT):
+                continue
+            checked.add(statement)
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            bad = [row[-1] for row in plan if BAD_PLAN.search(row[-1])]
+            # A page read in rowid order stops after LIMIT matches, like a
+            # walk of any other index in the page's order
+            bad = [line for line in bad
+                   if not (re.search(rf'ORDER BY {line[5:]}\.id (ASC|DESC)\s+LIMIT', statement)
+                           and re.fullmatch(r'SCAN \w+', line))]
+            # Reading a whole table is fine when nothing filters it (listings, totals)
+            if bad and not re.search(r'\bWHERE\b', statement) and all('TEMP B-TREE' not in line for line in bad):
+                continue
+            if bad:
+                problems.append(f"{' '.join(statement.split())}\n    -> {'; '.join(bad)}")
+
+    print(f"Checked {len(checked)} distinct statements")
+    assert len(checked) > 20, 'routes were not exercised'
+    assert not problems, 'Statements without a usable index:\n' + '\n'.join(problems)
+
+
+if __name__ == "__main__":
+    print("SpEquip Query Plan Test")
+    print("=" * 50)
+    try:
+        test_routes_use_indexes()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Every filtered query uses an index.")
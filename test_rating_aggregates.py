@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Rating aggregate test: a review updates the rating sum, count and average
+stored on its product, a repeated review changes nothing, the stored
+values match a recompute from the reviews table, and the listing pages
+show them without reading any reviews.
+"""
+
+import re
+import sys
+import tempfile
+from app import create_app, db, facets
+from app.models import User, Product, Wishlist
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+LISTINGS = ['/', '/products', '/products?sort=rating', '/products?rating=4', '/wishlist']
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        for name in ('alice', 'bob'):
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password(f'{name}123')
+            db.session.add(user)
+        db.session.add_all([Product(name=name, description='Test product', price=100, category='other',
+                                    stock_quantity=5) for name in ('Racket', 'Shuttle', 'Net')])
+        db.session.flush()
+        db.session.add_all([Wishlist(user_id=1, product_id=1), Wishlist(user_id=1, product_id=2)])
+        facets.rebuild()
+        db.session.commit()
+    return app
+
+
+def login(app, name):
+    client = app.test_client()
+    client.post('/login', data={'email': f'{name}@example.com', 'password': f'{name}123'})
+    return client
+
+
+def review(client, product_id, rating):
+    return client.post('/add-review', data={'product_id': str(product_id), 'rating': str(rating),
+                                            'comment': 'Tested'}, follow_redirects=True)
+
+
+def aggregates(app):
+    with app.app_context():
+        return {product.id: (product.rating_sum, product.rating_count, product.rating_avg)
+                for product in Product.query}
+
+
+def test_reviews_update_aggregates():
+    app = make_app()
+    alice, bob = login(app, 'alice'), login(app, 'bob')
+    assert b'Review added successfully' in review(alice, 1, 4).data
+    review(bob, 1, 5)
+    review(bob, 2, 3)
+    assert aggregates(app) == {1: (9, 2, 4.5), 2: (3, 1, 3.0), 3: (0, 0, 0.0)}
+
+    assert b'already reviewed' in review(alice, 1, 1).data
+    assert aggregates(app)[1] == (9, 2, 4.5)
+
+    stored = aggregates(app)
+    with app.app_context():
+        Product.refresh_rating_aggregates()
+        db.session.commit()
+    assert aggregates(app) == stored
+
+
+def test_listings_read_stored_aggregates():
+    app = make_app()
+    alice, bob = login(app, 'alice'), login(app, 'bob')
+    review(alice, 1, 4)
+    review(bob, 1, 5)
+    review(bob, 2, 3)
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        pages = {url: alice.get(url) for url in LISTINGS}
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert all(page.status_code == 200 for page in pages.values())
+    assert not [sql for sql in statements if re.search(r'\breview\b', sql)], statements
+
+    catalog = pages['/products'].get_data(as_text=True)
+    assert re.search(r'Racket</h5>.*?\(2\)', catalog, re.S) and re.search(r'Net</h5>.*?\(0\)', catalog, re.S)
+    best = pages['/products?sort=rating'].get_data(as_text=True)
+    assert best.index('>Racket</h5>') < best.index('>Shuttle</h5>') < best.index('>Net</h5>')
+    four_up = pages['/products?rating=4'].get_data(as_text=True)
+    assert '>Racket</h5>' in four_up and '>Shuttle</h5>' not in four_up
+
+
+if __name__ == "__main__":
+    print("SpEquip Rating Aggregate Test")
+    print("=" * 50)
+    try:
+        test_reviews_update_aggregates()
+        test_listings_read_stored_aggregates()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Listings read the stored ratings.")
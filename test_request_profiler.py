@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Request profiler test: with PROFILER_ENABLED every response carries a
+Server-Timing header with the database, template and total time, the
+same numbers are logged as one JSON line, and /admin/profiler lists the
+endpoint. With it off no header is added.
+"""
+
+import json
+import logging
+import re
+import sys
+import tempfile
+from app import create_app, db, facets
+from app.models import User, Product
+from app.profiler import logger
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+TIMING = re.compile(r'^db;dur=(?P<db>[\d.]+);desc="(?P<queries>\d+) queries", '
+                    r'tpl;dur=(?P<tpl>[\d.]+), total;dur=(?P<total>[\d.]+)$')
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def make_app(**config):
+    app = create_app(dict({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'WTF_CSRF_ENABLED': False}, **config),
+                     instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.add_all([Product(name=f'Ball {i}', description='Test product', price=100 + i,
+                                    category='other', stock_quantity=5) for i in range(5)])
+        facets.rebuild()
+        db.session.commit()
+    return app
+
+
+def test_server_timing_header():
+    app = make_app(PROFILER_ENABLED=True)
+    records = Records()
+    logger.addHandler(records)
+    try:
+        response = app.test_client().get('/products')
+    finally:
+        logger.removeHandler(records)
+    assert response.status_code == 200
+    timing = TIMING.match(response.headers['Server-Timing'])
+    assert timing, response.headers['Server-Timing']
+    assert int(timing['queries']) > 0 and float(timing['tpl']) > 0
+    assert float(timing['total']) >= float(timing['db'])
+
+    logged = [json.loads(line) for line in records.lines if line.startswith('{')]
+    assert len(logged) == 1, records.lines
+    assert logged[0]['endpoint'] == 'main.products' and logged[0]['status'] == 200
+    assert logged[0]['query_count'] == int(timing['queries'])
+    assert logged[0]['slowest'] and len(logged[0]['slowest']) <= app.config['PROFILER_SLOW_QUERIES']
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    page = client.get('/admin/profiler')
+    assert page.status_code == 200 and b'main.products' in page.data
+
+
+def test_disabled():
+    app = make_app(PROFILER_ENABLED=False)
+    response = app.test_client().get('/products')
+    assert response.status_code == 200 and 'Server-Timing' not in response.headers
+
+
+if __name__ == "__main__":
+    print("SpEquip Request Profiler Test")
+    print("=" * 50)
+    try:
+        test_server_timing_header()
+        test_disabled()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Requests report their timings.")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Static asset test: CSS and JS are minified and written under content-hashed
+names with gzip/brotli siblings, pages link to the hashed names, and the
+files are served with the accepted encoding and an immutable cache header.
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+from app import create_app
+from app.assets import minify_css, minify_js
+
+
+def make_app(instance_path=None):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=instance_path or tempfile.mkdtemp(prefix='spequip-instance-'))
+
+
+def test_minifiers_keep_meaning():
+    css = minify_css('/* header */\na > b ,\nc {\n  content: "a  { b }";\n  color: red;\n}\n')
+    assert css == 'a>b,c{content: "a  { b }";color: red}', css
+    js = minify_js('// note\nfunction f() {\n    /* block\n       comment */\n    return `a\n    b`;\n}\n')
+    assert js == 'function f() {\nreturn `a\n    b`;\n}\n', repr(js)
+
+
+def test_build_and_serve():
+    app = make_app()
+    manifest = app.extensions['assets']['manifest']
+    entry = manifest['css/style.css']
+    assert app.config['ASSETS_DIR'] == os.path.join(app.instance_path, 'assets')
+    assert entry['file'].startswith('css/style.') and entry['minified'] < entry['size'], entry
+    path = os.path.join(app.config['ASSETS_DIR'], entry['file'])
+    with open(path, 'rb') as f, open(path + '.gz', 'rb') as g:
+        assert gzip.decompress(g.read()) == f.read()
+
+    client = app.test_client()
+    page = client.get('/about-us').get_data(as_text=True)
+    assert f"/assets/{entry['file']}" in page and f"/assets/{manifest['js/main.js']['file']}" in page
+
+    response = client.get(f"/assets/{entry['file']}", headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200 and response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css' and 'Accept-Encoding' in response.headers['Vary']
+    cache_control = response.headers['Cache-Control']
+    assert 'immutable' in cache_control and 'max-age=31536000' in cache_control, cache_control
+    response.close()
+
+    response = client.get(f"/assets/{entry['file']}", headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers and b'{' in response.get_data()
+    response.close()
+
+    # A second app over the same directory reuses the build
+    mtime = os.path.getmtime(path)
+    assert make_app(app.instance_path).extensions['assets']['manifest'] == manifest
+    assert os.path.getmtime(path) == mtime
+
+
+def test_debug_links_plain_files():
+    app = make_app()
+    app.debug = True
+    page = app.test_client().get('/about-us').get_data(as_text=True)
+    assert '/static/css/style.css' in page
+
+
+if __name__ == "__main__":
+    print("SpEquip Static Asset Test")
+    print("=" * 50)
+    try:
+        test_minifiers_keep_meaning()
+        test_build_and_serve()
+        test_debug_links_plain_files()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Static assets are fingerprinted and cached.")
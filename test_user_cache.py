@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+User cache test: once a user is logged in, info pages must be served
+without touching the database, and toggling admin rights must take
+effect on the user's very next request, in every worker process.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app(backend='memory', uri='sqlite://', create=True):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'WTF_CSRF_ENABLED': False,
+        'USER_CACHE_BACKEND': backend,
+        'USER_CACHE_DIR': tempfile.mkdtemp(prefix='spequip-user-cache-'),
+    }, instance_path=INSTANCE_PATH)
+    if not create:
+        return app
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        customer = User(username='customer', email='customer@example.com')
+        customer.set_password('customer123')
+        db.session.add_all([admin, customer])
+        db.session.commit()
+    return app
+
+
+def login(app, email, password):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    return client
+
+
+def statements_for(app, client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, f"{url} returned {response.status_code}"
+    return statements
+
+
+def check_info_pages(backend):
+    app = make_app(backend)
+    client = login(app, 'customer@example.com', 'customer123')
+    client.get('/about-us')  # Fills the cart badge cache
+    for url in ['/about-us', '/help-center', '/shipping-info']:
+        statements = statements_for(app, client, url)
+        assert not statements, f"{url} ({backend}) issued {len(statements)} statements: {statements}"
+
+
+def check_toggle_admin(backend):
+    app = make_app(backend)
+    admin = login(app, 'admin@example.com', 'admin123')
+    customer = login(app, 'customer@example.com', 'customer123')
+    with app.app_context():
+        customer_id = User.query.filter_by(username='customer').first().id
+
+    assert customer.get('/admin').status_code == 302
+    admin.post(f'/admin/users/{customer_id}/toggle-admin')
+    assert customer.get('/admin').status_code == 200, 'granted admin rights were not picked up'
+    admin.post(f'/admin/users/{customer_id}/toggle-admin')
+    assert customer.get('/admin').status_code == 302, 'revoked admin rights were still cached'
+
+
+def test_revoked_in_another_worker():
+    # Two processes on one database, each with its own memory cache
+    workdir = tempfile.mkdtemp(prefix='spequip-user-cache-')
+    try:
+        uri = f"sqlite:///{os.path.join(workdir, 'shop.db')}"
+        first = make_app('memory', uri)
+        second = make_app('memory', uri, create=False)
+        with first.app_context():
+            db.session.add(User(username='editor', email='editor@example.com', is_admin=True,
+                                password_hash=User.query.filter_by(username='admin').one().password_hash))
+            db.session.commit()
+            editor_id = User.query.filter_by(username='editor').one().id
+        editor = login(second, 'editor@example.com', 'admin123')
+        assert editor.get('/admin').status_code == 200  # Cached as an admin in the second process
+
+        login(first, 'admin@example.com', 'admin123').post(f'/admin/users/{editor_id}/toggle-admin')
+        assert editor.get('/admin').status_code == 302, 'rights revoked by another worker were still cached'
+        assert editor.get('/admin/users').status_code == 302
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_info_pages_skip_database():
+    check_info_pages('memory')
+    check_info_pages('filesystem')
+
+
+def test_toggle_admin_invalidates_cache():
+    check_toggle_admin('memory')
+    check_toggle_admin('filesystem')
+
+
+if __name__ == "__main__":
+    print("SpEquip User Cache Test")
+    print("=" * 50)
+    try:
+        test_info_pages_skip_database()
+        test_toggle_admin_invalidates_cache()
+        test_revoked_in_another_worker()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Logged-in users are served from the cache.")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Wishlist-to-cart test: "Add all to cart" puts one unit of every in-stock
+wishlist product into the cart, adds a unit to lines already there while
+stock allows, skips what is sold out, leaves other users' carts alone,
+and issues the same number of statements whatever the wishlist size.
+"""
+
+import sys
+import tempfile
+from app import create_app, db
+from app.models import User, Product, CartItem, Wishlist
+
+INSTANCE_PATH = tempfile.mkdtemp(prefix='spequip-instance-')
+
+
+def make_app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+    }, instance_path=INSTANCE_PATH)
+    with app.app_context():
+        db.create_all()
+        for name in ('customer', 'other'):
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password(f'{name}123')
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def add_product(name, stock):
+    product = Product(name=name, description='Test product', price=100, category='other', stock_quantity=stock)
+    db.session.add(product)
+    db.session.flush()
+    return product.id
+
+
+def login(app, name):
+    client = app.test_client()
+    client.post('/login', data={'email': f'{name}@example.com', 'password': f'{name}123'})
+    return client
+
+
+def cart(user_id):
+    return {item.product_id: item.quantity for item in CartItem.query.filter_by(user_id=user_id)}
+
+
+def test_add_all_to_cart():
+    app = make_app()
+    with app.app_context():
+        customer, other = [user.id for user in User.query.order_by(User.id)]
+        fresh = add_product('Fresh', 5)
+        sold_out = add_product('Sold out', 0)
+        in_cart = add_product('In cart', 5)
+        at_stock = add_product('At stock', 3)
+        for product_id in (fresh, sold_out, in_cart, at_stock):
+            db.session.add(Wishlist(user_id=customer, product_id=product_id))
+        db.session.add_all([CartItem(user_id=customer, product_id=in_cart, quantity=1),
+                            CartItem(user_id=customer, product_id=at_stock, quantity=3),
+                            CartItem(user_id=other, product_id=fresh, quantity=2)])
+        db.session.commit()
+
+    client = login(app, 'customer')
+    response = client.post('/add-all-to-cart', follow_redirects=True)
+    assert response.status_code == 200 and b'2 items added to cart from wishlist' in response.data
+    with app.app_context():
+        assert cart(customer) == {fresh: 1, in_cart: 2, at_stock: 3}
+        assert cart(other) == {fresh: 2}
+        assert Wishlist.query.filter_by(user_id=customer).count() == 4
+    assert client.get('/cart-count').get_json()['count'] == 3
+
+    # Again: only the line still below its stock grows
+    client.post('/add-all-to-cart')
+    with app.app_context():
+        assert cart(customer) == {fresh: 2, in_cart: 3, at_stock: 3}
+
+    response = login(app, 'other').post('/add-all-to-cart', follow_redirects=True)
+    assert b'Your wishlist is empty' in response.data
+
+
+def test_statements_do_not_grow_with_wishlist():
+    app = make_app()
+    with app.app_context():
+        customer, other = [user.id for user in User.query.order_by(User.id)]
+        for user_id, size in ((customer, 5), (other, 50)):
+            for i in range(size):
+                product_id = add_product(f'Product {user_id}-{i}', i % 4)
+                db.session.add(Wishlist(user_id=user_id, product_id=product_id))
+                if i % 3 == 0:
+                    db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=1))
+        db.session.commit()
+        engine = db.engine
+
+    issued = []
+    for name in ('customer', 'other'):
+        client = login(app, name)
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            assert client.post('/add-all-to-cart').status_code == 302
+        finally:
+            db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        issued.append(len(statements))
+    assert issued[0] == issued[1], issued
+
+
+if __name__ == "__main__":
+    print("SpEquip Wishlist-to-Cart Test")
+    print("=" * 50)
+    try:
+        test_add_all_to_cart()
+        test_statements_do_not_grow_with_wishlist()
+    except AssertionError as e:
+        print(f"\n💥 {e}")
+        sys.exit(1)
+    print("\n🎉 All tests passed! Wishlists move into the cart in a fixed number of statements.")